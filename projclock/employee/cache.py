@@ -0,0 +1,77 @@
+import copy
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from utils.cache import LRUCache
+
+
+class EmployeeCache(LRUCache):
+    """
+    Cache of the employees resolved from the jwt token, keyed by user id,
+    so authenticated requests do not query the database
+    """
+
+    def get(self, user_id, loader):
+        """
+        Returns:
+            Employee: a copy of the cached employee so requests never share an instance
+        """
+        return copy.copy(super().get(user_id, loader))
+
+    def invalidate(self, user):
+        """
+        Drop the cached entry of the given employee
+        """
+        super().invalidate(lambda user_id, cached: user_id == user.pk)
+
+
+employee_cache = EmployeeCache(
+    maxsize=getattr(settings, 'EMPLOYEE_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'EMPLOYEE_CACHE_TTL', 300),
+)
+
+
+def token_state_key(user_id):
+    return f'employee:token-state:{user_id}'
+
+
+def load_token_state(user_id):
+    """the (token version, is active) of the employee in the database, None once it is deleted"""
+    from employee.models import Employee
+    return Employee.objects.filter(pk=user_id).values_list('token_version', 'is_active').first()
+
+
+def get_token_state(user_id, loader=load_token_state):
+    """
+    Get the (token version, is active) of the employee from the django cache
+    shared by the server processes, so a revocation or a deactivation in any
+    of them is seen by all, calling loader(user_id) when it is missing
+
+    Returns:
+        tuple: (token version, is active), None when the employee was deleted
+    """
+    state = cache.get(token_state_key(user_id))
+    if state is None:
+        state = loader(user_id)
+        # add only, the state stored by a committed change is never overwritten by an older read
+        cache.add(token_state_key(user_id), state, timeout=getattr(settings, 'EMPLOYEE_CACHE_TTL', 300))
+    return state
+
+
+def invalidate_employee(user):
+    """
+    Drop the employee from this process cache and its token state from the
+    shared cache now, and once the current transaction is committed store the
+    committed token state, so a state read before the commit never stays cached
+    """
+    employee_cache.invalidate(user)
+    cache.delete(token_state_key(user.pk))
+
+    def store_committed_state():
+        employee_cache.invalidate(user)
+        state = load_token_state(user.pk)
+        if state is None:
+            cache.delete(token_state_key(user.pk))
+        else:
+            cache.set(token_state_key(user.pk), state, timeout=getattr(settings, 'EMPLOYEE_CACHE_TTL', 300))
+    transaction.on_commit(store_committed_state)
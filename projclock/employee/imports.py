@@ -0,0 +1,153 @@
+import csv
+import io
+import json
+import logging
+from collections import defaultdict
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from employee.models import Employee, EmployeeImportJob
+from employee.serializers import EmployeeImportItemSerializer
+from utils.jobs import JobRunner
+
+IMPORT_FORMATS = ('csv', 'json')
+UNIQUE_FIELDS = ('username', 'email')
+
+# hashing a password is deliberately slow, the passwords of an import are hashed by EMPLOYEE_IMPORT_WORKERS processes
+password_hashers = JobRunner('EMPLOYEE_IMPORT_WORKERS')
+# the imports submitted to the endpoint run out of the request, in EMPLOYEE_IMPORT_JOBS_WORKERS processes
+import_runner = JobRunner('EMPLOYEE_IMPORT_JOBS_WORKERS', default_workers=1)
+
+logger = logging.getLogger(__name__)
+
+
+class EmployeeImportError(Exception):
+    """the rows of an import failing validation, nothing was imported"""
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} invalid rows')
+        self.errors = errors
+
+
+def read_employee_rows(content, import_format):
+    """
+    Parse a csv file with a username,email,password[,is_staff] header or a
+    json list of objects with the same keys. Empty csv cells are left out.
+
+    Raises:
+        ValueError: the content is not a csv or json list of employees
+    """
+    if import_format == 'csv':
+        return [
+            {key: value for key, value in row.items() if key is not None and value not in ('', None)}
+            for row in csv.DictReader(io.StringIO(content))
+        ]
+    rows = json.loads(content)
+    if not isinstance(rows, list):
+        raise ValueError('Expected a json list of employees.')
+    return rows
+
+
+def validate_employee_rows(rows, chunk_size=500):
+    """
+    Validate every row, then the uniqueness of the usernames and emails
+    within the file and against the employees already registered, with one
+    query per field and chunk of values
+
+    Raises:
+        EmployeeImportError: with the errors of each invalid row, numbered from 1
+
+    Returns:
+        list: the validated data of the rows
+    """
+    errors = defaultdict(dict)
+    valid = {}
+    for number, row in enumerate(rows, start=1):
+        serializer = EmployeeImportItemSerializer(data=row)
+        if serializer.is_valid():
+            valid[number] = serializer.validated_data
+        else:
+            errors[number].update(serializer.errors)
+
+    for field in UNIQUE_FIELDS:
+        first_rows = {}
+        for number, data in valid.items():
+            first = first_rows.setdefault(data[field], number)
+            if first != number:
+                errors[number].setdefault(field, []).append(f'Duplicate of row {first}.')
+        values = list(first_rows)
+        for start in range(0, len(values), chunk_size):
+            registered = Employee.objects.filter(**{f'{field}__in': values[start:start + chunk_size]}).values_list(field, flat=True)
+            for value in registered:
+                errors[first_rows[value]].setdefault(field, []).append(f'An employee with this {field} is already registered.')
+
+    if errors:
+        raise EmployeeImportError([{'row': number, **errors[number]} for number in sorted(errors)])
+    return list(valid.values())
+
+
+def import_employees(rows, batch_size=1000, dry_run=False, in_workers=True):
+    """
+    Create the employees of the rows all at once, or none of them when a row
+    is invalid. The passwords are hashed, in the worker processes unless
+    in_workers is false, before the transaction inserting the employees with
+    bulk_create is opened, so the database is only locked for the inserts.
+
+    Raises:
+        EmployeeImportError: when a row is invalid or clashes with another employee
+
+    Returns:
+        list: the created employees, unsaved for a dry run
+    """
+    validated = validate_employee_rows(rows)
+    employees = [Employee(username=data['username'], email=data['email'], is_staff=data['is_staff']) for data in validated]
+    if dry_run or not employees:
+        return employees
+    passwords = [data['password'] for data in validated]
+    if in_workers:
+        workers = password_hashers.workers or 1
+        passwords = password_hashers.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4)))
+    else:
+        passwords = [make_password(password) for password in passwords]
+    for employee, password in zip(employees, passwords):
+        employee.password = password
+    try:
+        with transaction.atomic():
+            return Employee.objects.bulk_create(employees, batch_size=batch_size)
+    except IntegrityError:
+        # an employee registered while the passwords were hashed
+        raise EmployeeImportError([{'row': None, 'non_field_errors': [
+            'An employee registered during the import clashes with the file, import it again.']}])
+
+
+def run_import_job(job_id):
+    """
+    Import the rows of a pending job, run by import_runner in a worker
+    process which hashes the passwords in password_hashers. The job is claimed
+    with a conditional update so it is never run twice, its rows are emptied
+    once it ran and a failure is recorded on the job rather than raised
+    """
+    claimed = EmployeeImportJob.objects.filter(pk=job_id, status=EmployeeImportJob.PENDING).update(
+        status=EmployeeImportJob.RUNNING, started_at=timezone.now(), updated_at=timezone.now())
+    if not claimed:
+        return
+    rows = EmployeeImportJob.objects.filter(pk=job_id).values_list('rows', flat=True).get()
+    try:
+        created = import_employees(rows)
+    except EmployeeImportError as error:
+        EmployeeImportJob.objects.filter(pk=job_id).update(
+            status=EmployeeImportJob.FAILED, rows=[], errors=error.errors, finished_at=timezone.now(),
+            updated_at=timezone.now())
+        return
+    except Exception as error:
+        logger.exception('employee import job %s failed', job_id)
+        EmployeeImportJob.objects.filter(pk=job_id).update(
+            status=EmployeeImportJob.FAILED, rows=[], errors=[{'row': None, 'non_field_errors': [str(error)]}],
+            finished_at=timezone.now(), updated_at=timezone.now())
+        return
+    finally:
+        # imports are rare, the hashing processes are not kept idle between them
+        password_hashers.shutdown()
+    EmployeeImportJob.objects.filter(pk=job_id).update(
+        status=EmployeeImportJob.DONE, rows=[], created=len(created), finished_at=timezone.now(),
+        updated_at=timezone.now())
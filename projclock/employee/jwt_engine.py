@@ -1,11 +1,36 @@
 import jwt
 from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
 from rest_framework.authentication import (get_authorization_header, BaseAuthentication)
 from rest_framework import exceptions
 from employee.models import Employee
+from employee.cache import employee_cache, get_token_state
+from employee.tokens import ACCESS_TOKEN, decode_token
+
+# the Employee fields of the access token claims
+CLAIM_FIELDS = {'id': 'user_id', 'username': 'username', 'email': 'email', 'is_staff': 'is_staff',
+                'is_active': 'is_active', 'token_version': 'ver'}
+
+
+def employee_from_claims(payload):
+    """
+    Build the employee from the claims of an access token without a query,
+    as if loaded with only(); reading any other field loads it from the database
+    """
+    claims = {field: payload[claim] for field, claim in CLAIM_FIELDS.items()}
+    values = [claims[field.attname] for field in Employee._meta.concrete_fields if field.attname in claims]
+    return Employee.from_db(DEFAULT_DB_ALIAS, list(claims), values)
+
+
+def load_employee(user_id):
+    """load the employee, sharing its token state with the other processes at the same time"""
+    user = Employee.objects.get(pk=user_id)
+    get_token_state(user_id, lambda user_id: (user.token_version, user.is_active))
+    return user
+
 
 class JwtAuthentication(BaseAuthentication):
-    
+
     def authenticate(self, request):
         '''
         implementation authenication method to authenticate users token
@@ -22,25 +47,40 @@ class JwtAuthentication(BaseAuthentication):
             raise exceptions.AuthenticationFailed('Token not valid')
         # get the token which is in the second index after it was splited
         token = auth_data[1]
-        
-        # decode the jwt token in other to get the user
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms='HS256')
-            # the the username from the decoded jwt
-            username = payload['username']
-            user = Employee.objects.get(username=username)
+        user, payload = self.authenticate_token(token)
+        return (user, token)
 
-            return (user, token)
+    def authenticate_token(self, token, token_type=ACCESS_TOKEN):
+        '''
+        authenticate the user of a token of the given type
 
+        Returns:
+            tuple: (user, claims of the token)
+        '''
+        # decode the jwt token in other to get the user
+        try:
+            payload = decode_token(token, token_type)
+            if getattr(settings, 'JWT_AUTH_MODE', 'database') == 'stateless':
+                user = employee_from_claims(payload)
+            else:
+                # resolve the user from the in process cache, only hitting the db on a miss
+                user = employee_cache.get(payload['user_id'], load_employee)
+                # the cached employee may lag behind a change in another process, its token state is shared
+                state = get_token_state(user.pk)
+                if state is None:
+                    raise Employee.DoesNotExist
+                user.token_version, user.is_active = state
 
         except jwt.ExpiredSignatureError as ex:
             raise exceptions.AuthenticationFailed('Token has expired')
-        
-        except jwt.DecodeError as ex:
+
+        except (jwt.InvalidTokenError, KeyError) as ex:
             raise exceptions.AuthenticationFailed('Token is invalid try loging in again')
-        
+
         except Employee.DoesNotExist as no_user:
             raise exceptions.AuthenticationFailed('User does not exist, are you sure this account belong to you?')
 
-
-        return super().authenticate(request)
\ No newline at end of file
+        # the token version is bumped to revoke the tokens issued before
+        if not user.is_active or user.token_version != payload['ver']:
+            raise exceptions.AuthenticationFailed('Token has been revoked, log in again')
+        return (user, payload)
@@ -0,0 +1,46 @@
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from employee.imports import IMPORT_FORMATS, EmployeeImportError, import_employees, password_hashers, read_employee_rows
+
+
+class Command(BaseCommand):
+    help = ('Register the employees of a csv file (username,email,password[,is_staff] header) or a json list, '
+            'all of them or none when a row is invalid. The passwords are hashed in a pool of worker processes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='csv or json file of the employees')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, default=None, help='format of the file, from its extension by default')
+        parser.add_argument('--workers', type=int, default=None, help='processes hashing the passwords, EMPLOYEE_IMPORT_WORKERS by default')
+        parser.add_argument('--batch-size', type=int, default=1000, help='employees inserted per query')
+        parser.add_argument('--dry-run', action='store_true', help='validate the employees without registering them')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        import_format = options['format'] or path.suffix.lstrip('.').lower()
+        if import_format not in IMPORT_FORMATS:
+            raise CommandError('Pass --format csv or --format json for a file without a .csv or .json extension')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        try:
+            rows = read_employee_rows(path.read_text(encoding='utf-8-sig'), import_format)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Can not read {path}: {error}')
+
+        workers = {} if options['workers'] is None else {'EMPLOYEE_IMPORT_WORKERS': options['workers']}
+        try:
+            with override_settings(**workers):
+                employees = import_employees(rows, batch_size=options['batch_size'], dry_run=options['dry_run'])
+        except EmployeeImportError as error:
+            for row_errors in error.errors:
+                row = row_errors.pop('row')
+                for field, messages in row_errors.items():
+                    self.stderr.write(f"row {row}: {field}: {' '.join(str(message) for message in messages)}")
+            raise CommandError(f'{len(error.errors)} invalid rows, no employee was imported')
+        finally:
+            password_hashers.shutdown()
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'{len(employees)} employees are valid, none was imported'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Imported {len(employees)} employees'))
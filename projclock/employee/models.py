@@ -1,11 +1,10 @@
-from datetime import datetime, timedelta
-import jwt
-from django.conf import settings
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.db import models
+from django.db.models import F
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import (PermissionsMixin, UserManager, AbstractBaseUser)
+from employee.tokens import ACCESS_TOKEN, REFRESH_TOKEN, STREAM_TOKEN, encode_token
 from utils.models import ModelTracker
 
 
@@ -53,17 +52,71 @@ class Employee(AbstractBaseUser, PermissionsMixin, ModelTracker):
     is_active = models.BooleanField(_('active'), default=True, help_text='Designated whether this user should be treated as active')
     date_joined = models.DateTimeField(_('date joined'), default=timezone.now)
     email_verified = models.BooleanField(_('email_verified'), default=False,)
+    token_version = models.PositiveIntegerField(_('token version'), default=0, help_text='Bumped to revoke every token issued to this user')
     objects = ManageUser()
 
     EMAIL_FIELD = 'email'  
     USERNAME_FIELD: str = 'email'
     REQUIRED_FIELDS = ['username']
 
+    @property
+    def token_claims(self):
+        """the claims the api needs, so requests can be authenticated without loading the employee"""
+        return {
+            'user_id': self.pk,
+            'username': self.username,
+            'email': self.email,
+            'is_staff': self.is_staff,
+            'is_active': self.is_active,
+            'ver': self.token_version,
+        }
+
     @property
     def token(self):
-        token = jwt.encode({
-            'username': self.username, 
-            'email': self.email, 
-            'exp': datetime.utcnow()+ timedelta(hours=24)}, 
-            settings.SECRET_KEY, algorithm='HS256')
-        return token
\ No newline at end of file
+        """Short lived access token carrying the claims of the employee"""
+        return encode_token(ACCESS_TOKEN, self.token_claims)
+
+    def stream_token(self, project_id):
+        """
+        Token of the activity events stream of one project, sent in the query
+        string by browsers whose EventSource can not send an Authorization
+        header, so it only lives JWT_STREAM_TOKEN_LIFETIME seconds
+        """
+        return encode_token(STREAM_TOKEN, dict(self.token_claims, project=project_id))
+
+    @property
+    def refresh_token(self):
+        """Long lived token exchanged for new access tokens at api/token/refresh"""
+        return encode_token(REFRESH_TOKEN, {'user_id': self.pk, 'ver': self.token_version})
+
+    def revoke_tokens(self):
+        """
+        Invalidate every token issued to the employee so far by bumping its
+        token version, saving drops it from the authentication cache
+        """
+        self.token_version = F('token_version') + 1
+        self.save(update_fields=['token_version'])
+        self.refresh_from_db(fields=['token_version'])
+
+
+class EmployeeImportJob(ModelTracker):
+    """
+    A bulk import of employees run in the background by employee.imports, the
+    admin polls its status. The rows hold the passwords in clear until the job
+    ran, they are emptied whether it succeeded or failed
+    """
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUSES = [(PENDING, 'pending'), (RUNNING, 'running'), (DONE, 'done'), (FAILED, 'failed')]
+
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(to=Employee, on_delete=models.CASCADE)
+    rows = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    created = models.PositiveIntegerField(default=0)
+    # the errors of each invalid row, as returned by a rejected import
+    errors = models.JSONField(default=list)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.id} : {self.user_id} : {self.status}"
@@ -2,6 +2,7 @@ from datetime import datetime
 from rest_framework import permissions
 from employee.models import Employee
 from tracker.models import Project, ProjectActivity
+from tracker.cache import is_project_member
 
 
 
@@ -31,15 +32,10 @@ class IsProjectMember(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        # Write permissions are only allowed to the owner of the snippet.
-        data = request.data
-        project = Project.objects.filter(id=data['project']).prefetch_related('members')
-        members = []
-        for member in project:
-            member_list = member.members.all()[:]
-            for member in member_list:
-                members.append(member.id)
-        return request.user.id in  members
+        # Write permissions are only allowed to members of the project, obj is the
+        # project the activity is created for, or the project id sent in the request.
+        project_id = obj.pk if isinstance(obj, Project) else request.data.get('project')
+        return is_project_member(request.user.id, project_id)
 
 class IsCurrentUser(permissions.BasePermission):
     """
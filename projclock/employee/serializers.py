@@ -1,8 +1,9 @@
 from rest_framework import serializers
-from employee.models import Employee
+from employee.models import Employee, EmployeeImportJob
+from utils.instrumentation import TimedSerializerMixin
 
 
-class RegisterApiViewSerializer(serializers.ModelSerializer):
+class RegisterApiViewSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(max_length=125, min_length=5, write_only=True)
 
 
@@ -13,12 +14,50 @@ class RegisterApiViewSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         return Employee.objects.create_user(**validated_data)
 
-class LoginApiViewSerializer(serializers.ModelSerializer):
+class EmployeeImportItemSerializer(serializers.Serializer):
+    """
+    one employee of a bulk import, validated like a registration, the
+    uniqueness of the username and email is checked for the whole file at once
+    """
+    username = serializers.CharField(max_length=150, validators=[Employee.username_validator])
+    email = serializers.EmailField()
+    password = serializers.CharField(max_length=125, min_length=5)
+    is_staff = serializers.BooleanField(default=False)
+
+    def validate_username(self, value):
+        return Employee.normalize_username(value)
+
+    def validate_email(self, value):
+        return Employee.objects.normalize_email(value)
+
+class EmployeeImportJobSerializer(serializers.ModelSerializer):
+    """the status of an import job, its rows are never sent back"""
+
+    class Meta:
+        model = EmployeeImportJob
+        fields = ('id', 'status', 'created', 'errors', 'created_at', 'started_at', 'finished_at')
+        read_only_fields = fields
+
+class LoginApiViewSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
 
 
     class Meta:
         model = Employee
-        fields = ('email', 'password', 'token', 'is_staff')
+        fields = ('email', 'password', 'token', 'refresh_token', 'is_staff')
+
+        read_only_fields = ['token', 'refresh_token']
+
+
+class TokenRefreshSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+
+class RevokeTokensSerializer(serializers.Serializer):
+    """the employee whose tokens are revoked, admins may revoke the tokens of anyone"""
+    user = serializers.IntegerField(required=False)
+
 
-        read_only_fields = ['token']
\ No newline at end of file
+class RequestMetricsQuerySerializer(serializers.Serializer):
+    """query parameters of the request metrics endpoint"""
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from employee.cache import invalidate_employee
+from employee.models import Employee
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def invalidate_cached_employee(sender, instance, **kwargs):
+    """
+    Drop the employee from the authentication caches whenever it is saved
+    (which covers deactivation and revocation) or deleted
+    """
+    invalidate_employee(instance)
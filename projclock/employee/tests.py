@@ -1,7 +1,23 @@
 from rest_framework.test import APITestCase
 from rest_framework import status
-from django.urls import reverse
-from employee.models import Employee
+import json
+import jwt
+import tempfile
+from io import StringIO
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from employee.models import Employee, EmployeeImportJob
+from employee.imports import run_import_job
+from employee.cache import employee_cache, get_token_state, token_state_key
+from tracker.models import Project
+from utils.instrumentation import RequestMetricsMiddleware, route_stats
 
 
 class TestEmployeeModelUseCase(APITestCase):
@@ -62,4 +78,303 @@ class TestEmployeeUseCase(APITestCase):
         }
         self.client.post(reverse("register"), account_creation_data, format='json')
         response = self.client.post(reverse("login"), login_data, format='json')
-        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+
+class TestEmployeeCacheUseCase(APITestCase):
+    """test case class to test the cache of authenticated employees"""
+
+    def setUp(self):
+        employee_cache.clear()
+        cache.clear()
+        account_creation_data = {
+            'username': 'admin',
+            'password': 'admin',
+            'email': 'admin@user.com',
+            'is_staff': 1
+        }
+        login_data = {
+            'email': 'admin@user.com',
+            'password': 'admin'
+        }
+        self.client.post(reverse("register"), account_creation_data, format='json')
+        response = self.client.post(reverse("login"), login_data, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['token']}")
+
+    def test_authenticated_requests_hit_the_cache(self):
+        """only the first authenticated request should query the employee"""
+        self.client.get(reverse('user'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('user'))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(employee_cache.stats()['hits'], 1)
+        self.assertEqual(employee_cache.stats()['misses'], 1)
+
+    def test_saving_employee_invalidates_the_cache(self):
+        """deactivating an employee should drop it from the cache"""
+        self.client.get(reverse('user'))
+        user = Employee.objects.get(username='admin')
+        user.is_active = False
+        user.save()
+        self.assertEqual(employee_cache.stats()['size'], 0)
+        with self.assertNumQueries(1):
+            self.client.get(reverse('user'))
+
+    def test_cache_stats_endpoint(self):
+        """admins should be able to read the cache counters"""
+        response = self.client.get(reverse('auth_cache_stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['misses'], 1)
+
+
+class TestJwtTokensUseCase(APITestCase):
+    """test case class to test the access and refresh tokens and their revocation"""
+
+    def setUp(self):
+        employee_cache.clear()
+        cache.clear()
+        self.admin = Employee.objects.create_user('admin', 'admin@user.com', 'admin', is_staff=True)
+        self.user = Employee.objects.create_user('user', 'user@user.com', 'user')
+
+    def test_login_returns_short_lived_tokens_with_claims(self):
+        response = self.client.post(reverse("login"), {'email': 'admin@user.com', 'password': 'admin'}, format='json')
+        claims = jwt.decode(response.data['token'], settings.SECRET_KEY, algorithms=['HS256'])
+        self.assertEqual({key: claims[key] for key in ('user_id', 'is_staff', 'is_active', 'ver', 'type')},
+                         {'user_id': self.admin.pk, 'is_staff': True, 'is_active': True, 'ver': 0, 'type': 'access'})
+        self.assertEqual(claims['exp'] - claims['iat'], settings.JWT_ACCESS_TOKEN_LIFETIME)
+        self.assertIn('refresh_token', response.data)
+
+    def test_refresh_token_is_exchanged_for_an_access_token(self):
+        response = self.client.post(reverse('token_refresh'), {'refresh': self.user.refresh_token}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['token']}")
+        self.assertEqual(self.client.get(reverse('user')).data['user']['username'], 'user')
+        # an access token is not a refresh token and the other way around
+        response = self.client.post(reverse('token_refresh'), {'refresh': self.user.token}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        # the authentication sends no WWW-Authenticate header, the rest framework answers 403
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.user.refresh_token}")
+        self.assertEqual(self.client.get(reverse('user')).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_revoked_tokens_are_refused(self):
+        token, refresh_token = self.user.token, self.user.refresh_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.client.get(reverse('user'))
+        response = self.client.post(reverse('revoke_tokens'))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.get(reverse('user'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data['detail'], 'Token has been revoked, log in again')
+        response = self.client.post(reverse('token_refresh'), {'refresh': refresh_token}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.user.refresh_from_db()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.user.token}")
+        self.assertEqual(self.client.get(reverse('user')).status_code, status.HTTP_202_ACCEPTED)
+
+    def test_revocation_in_another_process_is_refused(self):
+        """the employee cached by this process should not keep a token revoked by another one alive"""
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.user.token}")
+        self.assertEqual(self.client.get(reverse('user')).status_code, status.HTTP_202_ACCEPTED)
+        # what the process revoking the tokens writes, without touching the cache of this one
+        Employee.objects.filter(pk=self.user.pk).update(token_version=F('token_version') + 1)
+        cache.delete(token_state_key(self.user.pk))
+        response = self.client.get(reverse('user'))
+        self.assertEqual(response.data['detail'], 'Token has been revoked, log in again')
+
+    def test_token_state_read_before_the_commit_is_replaced_on_commit(self):
+        """a token version read by another request before the revocation commits should not stay cached"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.revoke_tokens()
+            # another request reads the committed version meanwhile
+            get_token_state(self.user.pk, lambda user_id: (0, True))
+        self.assertEqual(get_token_state(self.user.pk), (1, True))
+
+    def test_only_admins_revoke_the_tokens_of_others(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.user.token}")
+        response = self.client.post(reverse('revoke_tokens'), {'user': self.admin.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.admin.token}")
+        response = self.client.post(reverse('revoke_tokens'), {'user': self.user.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(Employee.objects.get(pk=self.user.pk).token_version, 1)
+
+    def test_expired_and_old_tokens_are_refused(self):
+        with override_settings(JWT_ACCESS_TOKEN_LIFETIME=-1):
+            self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.user.token}")
+        self.assertEqual(self.client.get(reverse('user')).data['detail'], 'Token has expired')
+        old = jwt.encode({'username': 'user', 'email': 'user@user.com'}, settings.SECRET_KEY, algorithm='HS256')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {old}")
+        self.assertEqual(self.client.get(reverse('user')).data['detail'], 'Token is invalid try loging in again')
+
+    @override_settings(JWT_AUTH_MODE='stateless')
+    def test_stateless_mode_builds_the_user_from_the_claims(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.admin.token}")
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('auth_cache_stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['size'], 0)
+        response = self.client.get(reverse('user'))
+        self.assertEqual(response.data['user'], {'id': self.admin.pk, 'username': 'admin', 'email': 'admin@user.com', 'is_staff': True})
+
+
+class TestRequestMetricsUseCase(APITestCase):
+    """test case class to test the per request sql and timing metrics"""
+
+    def setUp(self):
+        route_stats.clear()
+        self.admin = Employee.objects.create_user('admin', 'admin@user.com', 'admin', is_staff=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.admin.token}")
+
+    def test_response_reports_server_timing(self):
+        """every response should carry its database, serializer and view time"""
+        response = self.client.get(reverse('user'))
+        self.assertRegex(response['Server-Timing'],
+                         r'^db;dur=[\d.]+;desc="\d+ queries", serializer;dur=[\d.]+, view;dur=[\d.]+$')
+
+    def test_repeated_queries_are_flagged_as_n_plus_one(self):
+        """a view running the same query for every project should be flagged"""
+        projects = [Project.objects.create(title=f'project {index}', technology={}) for index in range(6)]
+
+        def list_members(request):
+            request.resolver_match = resolve(reverse('list_projects'))
+            for project in projects:
+                list(project.members.all())
+            return HttpResponse()
+
+        response = RequestMetricsMiddleware(list_members)(RequestFactory().get(reverse('list_projects')))
+        self.assertIn('n-plus-one;desc="1 repeated queries"', response['Server-Timing'])
+
+        response = self.client.get(reverse('request_metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        flagged = response.data['n_plus_one'][0]
+        self.assertEqual(flagged['route'], 'list_projects')
+        self.assertEqual(flagged['n_plus_one_requests'], 1)
+        self.assertEqual(flagged['repeated_queries'][0]['count'], 6)
+        self.assertEqual(response.data['most_queries'][0]['route'], 'list_projects')
+        self.assertGreaterEqual(response.data['most_queries'][0]['max_queries'], 6)
+
+    def test_project_listing_is_not_flagged(self):
+        """the members of the listed projects are prefetched in one query"""
+        for index in range(6):
+            Project.objects.create(title=f'project {index}', technology={}).members.add(self.admin)
+        response = self.client.get(reverse('list_projects'))
+        self.assertNotIn('n-plus-one', response['Server-Timing'])
+
+    def test_metrics_endpoint_is_admin_only(self):
+        """employees should not read the metrics of the other routes"""
+        user = Employee.objects.create_user('user', 'user@user.com', 'user')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {user.token}")
+        response = self.client.get(reverse('request_metrics'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_metrics_endpoint_validates_limit(self):
+        response = self.client.get(reverse('request_metrics'), {'limit': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(EMPLOYEE_IMPORT_WORKERS=0, EMPLOYEE_IMPORT_JOBS_WORKERS=0)
+class TestEmployeeImportUseCase(APITestCase):
+    """test case to test the bulk employee import, the jobs run and hash the passwords in the test process"""
+
+    def setUp(self):
+        self.admin = Employee.objects.create_user('admin', 'admin@user.com', 'admin', is_staff=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.admin.token}")
+
+    def test_import_creates_employees_who_can_login(self):
+        rows = [
+            {'username': 'ana', 'email': 'ana@user.com', 'password': 'anapassword'},
+            {'username': 'ben', 'email': 'ben@USER.com', 'password': 'benpassword', 'is_staff': True},
+        ]
+        response = self.client.post(reverse('import_employees'), rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual((response.data['status'], response.data['created']), ('done', 2))
+        response = self.client.get(reverse('import_job', kwargs={'pk': response.data['id']}))
+        self.assertEqual((response.data['status'], response.data['created'], response.data['errors']), ('done', 2, []))
+        self.assertNotIn('rows', response.data)
+        self.assertEqual(EmployeeImportJob.objects.get().rows, [])
+        self.assertEqual(list(Employee.objects.filter(username__in=['ana', 'ben']).values_list('email', 'is_staff').order_by('id')),
+                         [('ana@user.com', False), ('ben@user.com', True)])
+        response = self.client.post(reverse('login'), {'email': 'ana@user.com', 'password': 'anapassword'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+    def test_import_rejects_the_whole_file_with_the_errors_of_each_row(self):
+        rows = [
+            {'username': 'ana', 'email': 'ana@user.com', 'password': 'anapassword'},
+            {'username': 'ana', 'email': 'admin@user.com', 'password': 'anapassword'},
+            {'username': 'carl', 'email': 'not an email', 'password': 'carlpassword'},
+        ]
+        response = self.client.post(reverse('import_employees'), rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = {row.pop('row'): row for row in response.data['errors']}
+        self.assertEqual(errors[2]['username'], ['Duplicate of row 1.'])
+        self.assertEqual(errors[2]['email'], ['An employee with this email is already registered.'])
+        self.assertIn('email', errors[3])
+        self.assertEqual(Employee.objects.count(), 1)
+
+    def test_import_of_a_csv_file(self):
+        content = b'username,email,password,is_staff\r\nana,ana@user.com,anapassword,\r\nben,ben@user.com,benpassword,true\r\n'
+        upload = SimpleUploadedFile('employees.csv', content, content_type='text/csv')
+        response = self.client.post(reverse('import_employees') + '?dry_run=true', {'file': upload}, format='multipart')
+        self.assertEqual(response.data, {'valid': 2})
+        self.assertEqual(Employee.objects.count(), 1)
+        upload = SimpleUploadedFile('employees.csv', content, content_type='text/csv')
+        response = self.client.post(reverse('import_employees'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(list(Employee.objects.filter(is_staff=True).values_list('username', flat=True).order_by('id')), ['admin', 'ben'])
+        upload = SimpleUploadedFile('employees.xml', b'<employees/>')
+        response = self.client.post(reverse('import_employees'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(EMPLOYEE_IMPORT_JOBS_WORKERS=1)
+    def test_import_runs_in_the_background_once_committed(self):
+        rows = [{'username': 'ana', 'email': 'ana@user.com', 'password': 'anapassword'}]
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(reverse('import_employees'), rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'pending')
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(Employee.objects.filter(username='ana').exists())
+        # what the worker runs once the pool is handed the job
+        run_import_job(response.data['id'])
+        job = EmployeeImportJob.objects.get(pk=response.data['id'])
+        self.assertEqual((job.status, job.created, job.rows), ('done', 1, []))
+        self.assertTrue(Employee.objects.get(username='ana').check_password('anapassword'))
+
+    @override_settings(EMPLOYEE_IMPORT_JOBS_WORKERS=1)
+    def test_import_clashing_with_a_later_registration_fails_and_drops_the_rows(self):
+        rows = [{'username': 'ana', 'email': 'ana@user.com', 'password': 'anapassword'}]
+        with self.captureOnCommitCallbacks():
+            response = self.client.post(reverse('import_employees'), rows, format='json')
+        Employee.objects.create_user('ana', 'ana@other.com', 'anapassword')
+        run_import_job(response.data['id'])
+        response = self.client.get(reverse('import_job', kwargs={'pk': response.data['id']}))
+        self.assertEqual(response.data['status'], 'failed')
+        self.assertEqual(response.data['errors'], [{'row': 1, 'username': ['An employee with this username is already registered.']}])
+        self.assertEqual(EmployeeImportJob.objects.get().rows, [])
+
+    def test_import_endpoint_takes_a_limited_number_of_employees(self):
+        rows = [{'username': f'user{index}', 'email': f'user{index}@user.com', 'password': 'password'} for index in range(10001)]
+        response = self.client.post(reverse('import_employees'), rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('import_employees command', response.data['non_field_errors'][0])
+
+    def test_import_is_admin_only(self):
+        job = EmployeeImportJob.objects.create(user=self.admin)
+        user = Employee.objects.create_user('user', 'user@user.com', 'user')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {user.token}")
+        response = self.client.post(reverse('import_employees'), [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(reverse('import_job', kwargs={'pk': job.id}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_command_hashes_the_passwords_in_worker_processes(self):
+        rows = [{'username': f'user{index}', 'email': f'user{index}@user.com', 'password': f'password{index}'} for index in range(4)]
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as employees:
+            json.dump(rows, employees)
+            employees.flush()
+            out = StringIO()
+            call_command('import_employees', employees.name, workers=2, stdout=out)
+            self.assertIn('Imported 4 employees', out.getvalue())
+            with self.assertRaisesMessage(CommandError, '4 invalid rows'):
+                call_command('import_employees', employees.name, stdout=out, stderr=StringIO())
+        self.assertTrue(Employee.objects.get(username='user3').check_password('password3'))
@@ -0,0 +1,39 @@
+import time
+import jwt
+from django.conf import settings
+
+ACCESS_TOKEN, REFRESH_TOKEN, STREAM_TOKEN = 'access', 'refresh', 'stream'
+ALGORITHM = 'HS256'
+# setting holding the lifetime in seconds of each type of token
+LIFETIME_SETTINGS = {
+    ACCESS_TOKEN: 'JWT_ACCESS_TOKEN_LIFETIME',
+    REFRESH_TOKEN: 'JWT_REFRESH_TOKEN_LIFETIME',
+    STREAM_TOKEN: 'JWT_STREAM_TOKEN_LIFETIME',
+}
+
+
+def encode_token(token_type, claims):
+    """
+    Sign the claims as a token of the given type, expiring after
+    JWT_ACCESS_TOKEN_LIFETIME, JWT_REFRESH_TOKEN_LIFETIME or
+    JWT_STREAM_TOKEN_LIFETIME seconds
+    """
+    lifetime = getattr(settings, LIFETIME_SETTINGS[token_type])
+    now = int(time.time())
+    return jwt.encode(dict(claims, type=token_type, iat=now, exp=now + lifetime), settings.SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_token(token, token_type):
+    """
+    Verify the signature, expiry and type of a token, the tokens issued
+    before the claims were added are rejected as invalid
+
+    Raises:
+        jwt.ExpiredSignatureError: the token has expired
+        jwt.InvalidTokenError: any other invalid token
+    """
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM],
+                         options={'require': ['exp', 'type', 'user_id', 'ver']})
+    if payload['type'] != token_type:
+        raise jwt.InvalidTokenError(f'Expected an {token_type} token')
+    return payload
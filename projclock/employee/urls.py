@@ -3,6 +3,12 @@ from employee import views
 
 urlpatterns = [
     path('register/', views.RegisterApiView.as_view(), name='register'),
+    path('employees/import', views.EmployeeImportApiView.as_view(), name='import_employees'),
+    path('employees/import/<int:pk>', views.EmployeeImportJobApiView.as_view(), name='import_job'),
     path('login/', views.LoginApiView.as_view(), name='login'),
-    path('user/', views.AuthUserApiView.as_view(), name='user')
+    path('token/refresh', views.TokenRefreshApiView.as_view(), name='token_refresh'),
+    path('token/revoke', views.RevokeTokensApiView.as_view(), name='revoke_tokens'),
+    path('user/', views.AuthUserApiView.as_view(), name='user'),
+    path('auth/cache/stats', views.AuthCacheStatsApiView.as_view(), name='auth_cache_stats'),
+    path('metrics/requests', views.RequestMetricsApiView.as_view(), name='request_metrics'),
 ]
\ No newline at end of file
@@ -1,7 +1,16 @@
+import jwt
 from django.contrib.auth import authenticate
-from rest_framework.generics import GenericAPIView
+from rest_framework.generics import GenericAPIView, RetrieveAPIView
 from rest_framework import (response, status, permissions)
-from employee.serializers import RegisterApiViewSerializer, LoginApiViewSerializer
+from employee.serializers import (RegisterApiViewSerializer, LoginApiViewSerializer, RequestMetricsQuerySerializer,
+                                  EmployeeImportItemSerializer, EmployeeImportJobSerializer, TokenRefreshSerializer,
+                                  RevokeTokensSerializer)
+from employee.cache import employee_cache
+from employee.models import Employee, EmployeeImportJob
+from employee.tokens import REFRESH_TOKEN, decode_token
+from employee.imports import (IMPORT_FORMATS, EmployeeImportError, import_employees, import_runner, read_employee_rows,
+                              run_import_job)
+from utils.instrumentation import route_stats
 
 # Create your api views here.
 class RegisterApiView(GenericAPIView):
@@ -33,6 +42,86 @@ class RegisterApiView(GenericAPIView):
             return response.Response(serializer.data, status=status.HTTP_201_CREATED)
         return response.Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class EmployeeImportApiView(GenericAPIView):
+    '''
+    Register employees in bulk from a json list or an uploaded csv or json file, all of them or none when a row is
+    invalid. The rows are validated in the request, then imported by a background job, which hashes the passwords,
+    about 0.1 second each, in EMPLOYEE_IMPORT_WORKERS processes, poll it with import_job.
+    permission_classes = "IsAuthenticated" :user is logged in , "IsAdminUser" : user is admin
+    Post: /api/employees/import?dry_run=true   (dry_run only validates the employees)
+    [{"username": "ab", "email": "ab@email.com", "password": "ab@email.com", "is_staff": false}, ...]
+    or multipart with a "file" ending in .csv (username,email,password,is_staff header) or .json
+
+    response (202):
+    {
+    "id": 3,
+    "status": "pending",
+    "created": 0,
+    "errors": [],
+    ...
+    }
+    response (400):
+    {
+    "errors": [{"row": 2, "email": ["An employee with this email is already registered."]}]
+    }
+    '''
+    permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
+    serializer_class = EmployeeImportItemSerializer
+    max_employees = 10000
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is not None:
+            import_format = upload.name.rsplit('.', 1)[-1].lower()
+            if import_format not in IMPORT_FORMATS:
+                return response.Response({'file': ['Upload a .csv or .json file.']}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                rows = read_employee_rows(upload.read().decode('utf-8-sig'), import_format)
+            except ValueError as error:
+                return response.Response({'file': [str(error)]}, status=status.HTTP_400_BAD_REQUEST)
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            return response.Response({'non_field_errors': ['Send a list of employees or a csv or json file.']},
+                                     status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.max_employees:
+            return response.Response({'non_field_errors': [f'At most {self.max_employees} employees can be imported at once, use the import_employees command for more.']},
+                                     status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = request.query_params.get('dry_run') in ('1', 'true', 'True')
+        try:
+            employees = import_employees(rows, dry_run=True)
+        except EmployeeImportError as error:
+            return response.Response({'errors': error.errors}, status=status.HTTP_400_BAD_REQUEST)
+        if dry_run:
+            return response.Response({'valid': len(employees)}, status=status.HTTP_200_OK)
+        job = EmployeeImportJob.objects.create(user=request.user, rows=rows)
+        # queued once the job is committed, or run right away when EMPLOYEE_IMPORT_JOBS_WORKERS is 0
+        import_runner.submit(run_import_job, job.id)
+        job.refresh_from_db()
+        return response.Response(EmployeeImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+class EmployeeImportJobApiView(RetrieveAPIView):
+    '''
+    Retrive the status of an employee import, one of pending, running, done (with the number of employees created)
+    or failed (with the errors of the rows, e.g. an employee registered since the rows were validated).
+    permission_classes = "IsAuthenticated" :user is logged in , "IsAdminUser" : user is admin
+    Get: /api/employees/import/3
+    response:
+    {
+    "id": 3,
+    "status": "done",
+    "created": 2,
+    "errors": [],
+    "created_at": "2022-01-01T10:00:00Z",
+    "started_at": "2022-01-01T10:00:00Z",
+    "finished_at": "2022-01-01T10:00:01Z"
+    }
+    '''
+    permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
+    serializer_class = EmployeeImportJobSerializer
+    queryset = EmployeeImportJob.objects.all()
+
 class LoginApiView(GenericAPIView):
     authentication_classes = []
     serializer_class = LoginApiViewSerializer
@@ -47,6 +136,65 @@ class LoginApiView(GenericAPIView):
             return response.Response(serializer.data, status=status.HTTP_202_ACCEPTED)
         return response.Response({'message': 'Bad login credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
+class TokenRefreshApiView(GenericAPIView):
+    '''
+    Exchange a refresh token for a new access token, and a new refresh token. Refused once the tokens of the
+    user are revoked or the user is deactivated.
+    Post: /api/token/refresh
+    {
+    "refresh": "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9..."
+    }
+
+    response:
+    {
+    "token": "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9...",
+    "refresh_token": "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9..."
+    }
+    '''
+    authentication_classes = []
+    serializer_class = TokenRefreshSerializer
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            payload = decode_token(serializer.validated_data['refresh'], REFRESH_TOKEN)
+        except jwt.ExpiredSignatureError:
+            return response.Response({'message': 'Refresh token has expired, log in again'}, status=status.HTTP_401_UNAUTHORIZED)
+        except jwt.InvalidTokenError:
+            return response.Response({'message': 'Refresh token is invalid'}, status=status.HTTP_401_UNAUTHORIZED)
+        # read from the database, a refresh is rare and the new tokens carry the claims of the stored employee
+        user = Employee.objects.filter(pk=payload['user_id'], is_active=True, token_version=payload['ver']).first()
+        if user is None:
+            return response.Response({'message': 'Refresh token has been revoked, log in again'}, status=status.HTTP_401_UNAUTHORIZED)
+        return response.Response({'token': user.token, 'refresh_token': user.refresh_token}, status=status.HTTP_200_OK)
+
+class RevokeTokensApiView(GenericAPIView):
+    '''
+    Revoke every access and refresh token issued to the logged in user, or to another user for admins, e.g. to
+    log out everywhere. With JWT_AUTH_MODE = 'stateless' the access tokens are accepted until they expire.
+    permission_classes = "IsAuthenticated" :user is logged in
+    Post: /api/token/revoke
+    {
+    "user": 4     // optional, admins only
+    }
+    response: 204 No Content
+    '''
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = RevokeTokensSerializer
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user_id = serializer.validated_data.get('user', request.user.pk)
+        if user_id != request.user.pk and not request.user.is_staff:
+            return response.Response({'message': 'Only admins can revoke the tokens of another user'}, status=status.HTTP_403_FORBIDDEN)
+        user = Employee.objects.filter(pk=user_id).first()
+        if user is None:
+            return response.Response({'user': [f'Unknown user {user_id}']}, status=status.HTTP_400_BAD_REQUEST)
+        user.revoke_tokens()
+        return response.Response(status=status.HTTP_204_NO_CONTENT)
+
 class AuthUserApiView(GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -54,4 +202,53 @@ class AuthUserApiView(GenericAPIView):
         user = request.user
 
         serializer = RegisterApiViewSerializer(user)
-        return response.Response({'user': serializer.data}, status=status.HTTP_202_ACCEPTED)
\ No newline at end of file
+        return response.Response({'user': serializer.data}, status=status.HTTP_202_ACCEPTED)
+
+class AuthCacheStatsApiView(GenericAPIView):
+    """
+    Return the size and hit/miss counters of the authenticated employee cache.
+    permission_classes = "IsAuthenticated" :user is logged in, "IsAdminUser" : user is admin
+    Endpoint GET api/auth/cache/stats
+    response:
+    {
+    "size": 12,
+    "maxsize": 1024,
+    "ttl": 300,
+    "hits": 5310,
+    "misses": 14
+    }
+    """
+    permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
+
+    def get(self, request):
+        return response.Response(employee_cache.stats(), status=status.HTTP_200_OK)
+
+class RequestMetricsApiView(GenericAPIView):
+    """
+    Return the routes with the slowest requests, the routes running the most
+    sql queries and the routes flagged with N+1 queries, aggregated over the
+    last REQUEST_METRICS_WINDOW requests of every url name of this process.
+    permission_classes = "IsAuthenticated" :user is logged in, "IsAdminUser" : user is admin
+    Endpoint GET api/metrics/requests?limit=10
+    response:
+    {
+    "slowest": [{"route": "list_projects", "requests": 120, "mean_ms": 431.2, "p95_ms": 502.7, "max_ms": 516.7,
+                 "mean_db_ms": 301.5, "mean_serializer_ms": 98.3, "mean_queries": 101.0, "max_queries": 101,
+                 "n_plus_one_requests": 120, "repeated_queries": [{"sql": "SELECT ...", "count": 100}]}],
+    "most_queries": [...],
+    "n_plus_one": [...]
+    }
+    """
+    permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
+
+    def get(self, request):
+        query = RequestMetricsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        limit = query.validated_data['limit']
+        summary = route_stats.summary()
+        return response.Response({
+            'slowest': sorted(summary, key=lambda route: -route['mean_ms'])[:limit],
+            'most_queries': sorted(summary, key=lambda route: -route['mean_queries'])[:limit],
+            'n_plus_one': sorted((route for route in summary if route['n_plus_one_requests']),
+                                 key=lambda route: -route['n_plus_one_requests'])[:limit],
+        }, status=status.HTTP_200_OK)
@@ -3,6 +3,10 @@ ASGI config for projclock project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Requests to /api/events/ are long lived server sent event streams, they are
+answered by tracker.events instead of going through the Django handler, which
+can not stream without blocking the event loop.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
 """
@@ -13,4 +17,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'projclock.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from tracker.events import activity_events_application  # noqa: E402 the apps must be loaded first
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'].startswith('/api/events/'):
+        return await activity_events_application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'utils.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'utils.replicas.PrimaryStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'projclock.urls'
@@ -85,6 +87,31 @@ DATABASES = {
     }
 }
 
+# closed activities moved out of the activity table by the archive_activities command are kept in this database,
+# add e.g. 'archive': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'archive.sqlite3'} and name it here
+# to keep the history out of the main database file
+ACTIVITY_ARCHIVE_DATABASE = 'default'
+
+# read only replicas of the default database, aliases of DATABASES, the analytics and activity listing endpoints read
+# from them, e.g. 'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'replica.sqlite3'}
+# locally the SQLite replicas are refreshed with python manage.py sync_sqlite_replicas
+DATABASE_REPLICAS = []
+REPLICA_STICKY_SECONDS = 5  # a user reads from the primary for this long after a write
+
+DATABASE_ROUTERS = ['tracker.routers.ActivityArchiveRouter', 'utils.replicas.ReplicaRouter']
+
+# shared by every process of the server, the project versions of tracker.cache, the replica stickiness of
+# utils.replicas and the token versions of employee.cache are kept in it, a file based cache
+# needs no other service, point it to e.g. redis or memcached when the processes run on several hosts
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -137,3 +164,47 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination'
 
 }
+
+# tokens issued by employee.tokens, 'database' authenticates with the employee loaded from the database (or the cache
+# below) and checks its token version and active flag against the django cache shared by the processes, which every
+# change of the employee updates once committed, so revoked tokens and deactivated users are refused at once by every
+# process. 'stateless' builds the user from the claims of
+# the access token without any query, revocations then take effect when the access tokens expire
+JWT_AUTH_MODE = 'database'
+JWT_ACCESS_TOKEN_LIFETIME = 15 * 60  # seconds
+JWT_REFRESH_TOKEN_LIFETIME = 7 * 24 * 60 * 60  # seconds
+JWT_STREAM_TOKEN_LIFETIME = 60  # seconds, tokens of the activity events streams sent in the query string
+
+# in process cache of the employees resolved by employee.jwt_engine.JwtAuthentication, the TTL also bounds how long
+# their token versions are kept in the django cache
+EMPLOYEE_CACHE_SIZE = 1024
+EMPLOYEE_CACHE_TTL = 300  # seconds
+
+# in process cache of the (user, project) memberships checked by employee.permissions.IsProjectMember
+MEMBERSHIP_CACHE_SIZE = 4096
+MEMBERSHIP_CACHE_TTL = 60  # seconds
+
+# allow at most one running activity per user, enforced by a unique partial index created with the tables
+SINGLE_RUNNING_ACTIVITY = False
+
+# reports computed in the background by tracker.reports, in a pool of spawned worker processes
+REPORT_JOBS_WORKERS = 2  # 0 computes the reports in the request submitting them
+REPORT_JOBS_DIR = BASE_DIR / 'reports'  # result files of the reports
+
+# processes the imports hash the passwords in, 0 hashes them in the importing process
+EMPLOYEE_IMPORT_WORKERS = 4
+# processes running the imports submitted to api/employees/import, 0 runs them in the request
+EMPLOYEE_IMPORT_JOBS_WORKERS = 1
+
+# server sent events of tracker.events, served by the ASGI application only
+ACTIVITY_EVENTS_QUEUE_SIZE = 100  # events buffered per subscriber before its stream is ended
+ACTIVITY_EVENTS_HEARTBEAT = 15  # seconds between keepalive comments
+
+# per request sql and timing metrics of utils.instrumentation.RequestMetricsMiddleware
+REQUEST_METRICS_WINDOW = 1000  # requests per url name the aggregates are computed over
+REQUEST_METRICS_N_PLUS_ONE_THRESHOLD = 5  # runs of an identical query in one request flagged as N+1
+
+# in process cache of the responses of the project read endpoints, keyed by the project versions they show
+PROJECT_RESPONSE_CACHE_BACKEND = 'utils.cache.LRUCache'  # any class with the LRUCache interface
+PROJECT_RESPONSE_CACHE_SIZE = 1024
+PROJECT_RESPONSE_CACHE_TTL = 300  # seconds
@@ -1,8 +1,10 @@
 from django.contrib import admin
-from .models import Project, ProjectActivity
+from .models import Project, ProjectActivity, ProjectActivityRollup, ReportJob
 
 
 # Register your models here.
 
 admin.site.register(Project)
 admin.site.register(ProjectActivity)
+admin.site.register(ProjectActivityRollup)
+admin.site.register(ReportJob)
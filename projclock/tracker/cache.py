@@ -0,0 +1,133 @@
+import time
+from datetime import date
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.module_loading import import_string
+from rest_framework.response import Response
+from tracker.models import Project
+from utils.cache import LRUCache
+from utils.conditional import ConditionalListMixin
+
+# (user id, project id) -> whether the user is a member of the project
+membership_cache = LRUCache(
+    maxsize=getattr(settings, 'MEMBERSHIP_CACHE_SIZE', 4096),
+    ttl=getattr(settings, 'MEMBERSHIP_CACHE_TTL', 60),
+)
+
+# key holding the versions of the projects a response shows -> response data of the project read endpoints
+project_response_cache = import_string(getattr(settings, 'PROJECT_RESPONSE_CACHE_BACKEND', 'utils.cache.LRUCache'))(
+    maxsize=getattr(settings, 'PROJECT_RESPONSE_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'PROJECT_RESPONSE_CACHE_TTL', 300),
+)
+
+ALL_PROJECTS = 'all'
+
+
+def is_project_member(user_id, project_id):
+    """
+    Check if the user is a member of the project with a single EXISTS on
+    the members through table, the answer is cached for a short while
+    """
+    return membership_cache.get((user_id, project_id), lambda key: Project.members.through.objects.filter(
+        employee_id=key[0], project_id=key[1]).exists())
+
+
+def invalidate_membership(predicate):
+    """
+    Drop the cached memberships matching predicate(user id, project id), now
+    and again once the current transaction is committed, so a membership
+    read before the commit does not stay cached
+    """
+    def invalidate():
+        membership_cache.invalidate(lambda key, member: predicate(*key))
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+def invalidate_project_membership(project_id):
+    invalidate_membership(lambda user_id, member_project_id: member_project_id == project_id)
+
+
+def invalidate_user_membership(user_id):
+    invalidate_membership(lambda member_user_id, project_id: member_user_id == user_id)
+
+
+def project_version_key(project_id):
+    return f'tracker:project-version:{project_id}'
+
+
+def get_project_versions(*project_ids):
+    """
+    Get the global version of the projects followed by the version of each
+    project. The versions live in the django cache, shared by the processes
+    of the server, so every process sees the same ones. A missing version,
+    never set or evicted, starts from the current time so it never repeats an
+    old one.
+
+    Returns:
+        tuple: (global version, version of project_ids[0], ...)
+    """
+    keys = [project_version_key(ALL_PROJECTS)] + [project_version_key(project_id) for project_id in project_ids]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, time.time_ns(), timeout=None)
+        versions.update(cache.get_many(missing))
+    return tuple(versions[key] for key in keys)
+
+
+def bump_project_versions(project_ids):
+    """
+    Bump the global version and the version of each project, now and again
+    once the current transaction is committed, so a response read before the
+    commit is never cached under the new versions
+    """
+    keys = [project_version_key(ALL_PROJECTS)] + [project_version_key(project_id) for project_id in project_ids]
+
+    def bump():
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                # no version yet, the next read starts a new one
+                pass
+    bump()
+    transaction.on_commit(bump)
+
+
+def project_response_key(name, *parts, project_id=None):
+    """
+    Key of a cached project response, made of the versions it depends on:
+    the global version for listings, the project version for a single project.
+    is_completed depends on the current date, so the date is part of the key.
+    """
+    if project_id is None:
+        versions = get_project_versions()
+    else:
+        versions = get_project_versions(project_id)[1:]
+    return (name, date.today().isoformat(), versions) + parts
+
+
+class ProjectResponseCacheMixin(ConditionalListMixin):
+    """
+    Serve the response data and the ETag validator of a
+    list view from project_response_cache. The permissions are checked
+    before, only the data is cached, and the key returned by
+    get_response_cache_key holds the project versions it shows, so a change
+    of the projects is never served stale.
+    """
+
+    def get_response_cache_key(self):
+        raise NotImplementedError
+
+    def get_validator_state(self):
+        return project_response_cache.get(
+            ('validators',) + self.get_response_cache_key(), lambda key: super(ProjectResponseCacheMixin, self).get_validator_state())
+
+    def get_list_response(self, request, *args, **kwargs):
+        data = project_response_cache.get(
+            self.get_response_cache_key(),
+            lambda key: super(ProjectResponseCacheMixin, self).get_list_response(request, *args, **kwargs).data)
+        return Response(data)
@@ -0,0 +1,140 @@
+import asyncio
+import io
+import json
+import re
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections, connections, transaction
+from rest_framework import exceptions
+from employee.jwt_engine import JwtAuthentication
+from employee.tokens import STREAM_TOKEN
+from tracker.cache import is_project_member
+from tracker.serializers import ProjectActivitySerializer
+from utils.broker import Broker
+
+EVENTS_PATH = re.compile(r'^/api/events/project/(?P<project>\d+)$')
+
+# project id -> start, create, stop, update and delete events of its activities
+activity_broker = Broker(queue_size=getattr(settings, 'ACTIVITY_EVENTS_QUEUE_SIZE', 100))
+
+
+def publish_activity_event(kind, activity):
+    """
+    Publish an activity event to the subscribers of its project once the
+    current transaction is committed, so nobody sees a rolled back change.
+    The activity is serialized right away, publish deletions before deleting.
+    """
+    if not activity_broker.subscriber_count(activity.project_id):
+        return
+    event = {'event': kind, 'activity': ProjectActivitySerializer(activity).data}
+    transaction.on_commit(lambda: activity_broker.publish(activity.project_id, event))
+
+
+def authorize(request, project_id):
+    """
+    Authenticate the jwt token of the request and check the user may follow
+    the project. The EventSource of browsers can not send an Authorization
+    header, they send a stream token of the project in ?token= instead
+
+    Returns:
+        int: 200 when allowed, otherwise the http status to answer with
+    """
+    try:
+        if 'token' in request.GET:
+            user, payload = JwtAuthentication().authenticate_token(request.GET['token'], STREAM_TOKEN)
+            if payload['project'] != project_id:
+                return 403
+        else:
+            user = JwtAuthentication().authenticate(request)[0]
+    except exceptions.AuthenticationFailed:
+        return 401
+    if not (user.is_staff or is_project_member(user.id, project_id)):
+        return 403
+    return 200
+
+
+async def send_status(send, status_code, detail):
+    body = json.dumps({'detail': detail}).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status_code, 'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def run_in_worker_thread(func):
+    """
+    Run a blocking function of this raw ASGI application in the shared
+    thread pool. It is not served by Django's ASGIHandler, so a thread
+    sensitive call would wait for the single main sync thread. Every worker
+    thread has its own database connection, closed once the call is done.
+    """
+    def call_and_close(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            for connection in connections.all():
+                connection.close()
+    return sync_to_async(call_and_close, thread_sensitive=False)
+
+
+async def activity_events_application(scope, receive, send):
+    """
+    ASGI application streaming the activity events of a project as server sent events.
+    requires the token of a member of the project or of an admin
+    Endpoint GET api/events/project/1
+    Authorization: Bearer <token>
+    or, from a browser EventSource, GET api/events/project/1?token=<token of api/project/1/events/token>
+    Response (text/event-stream):
+        event: start
+        data: {"id": 4, "is_running": true, "duration": "0:00:00", "duration_seconds": 0, "description": "", "start_time": "...", "end_time": null, "project": 1, "user": 2}
+
+    a comment line is sent every ACTIVITY_EVENTS_HEARTBEAT seconds to keep the connection open, the stream
+    ends when the client is too slow to keep up, the client should then reconnect and reload the activities
+    """
+    match = EVENTS_PATH.match(scope['path'])
+    if match is None or scope['method'] != 'GET':
+        return await send_status(send, 404, 'Not found.')
+    project_id = int(match.group('project'))
+
+    request = ASGIRequest(scope, io.BytesIO())
+    status_code = await run_in_worker_thread(authorize)(request, project_id)
+    if status_code == 401:
+        return await send_status(send, 401, 'Authentication credentials were not provided or are invalid.')
+    if status_code == 403:
+        return await send_status(send, 403, 'You are not a member of this project.')
+
+    subscription = activity_broker.subscribe(project_id)
+    disconnected = asyncio.ensure_future(receive())
+    next_event = None
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        await send({'type': 'http.response.body', 'body': b': connected\n\n', 'more_body': True})
+
+        heartbeat = getattr(settings, 'ACTIVITY_EVENTS_HEARTBEAT', 15)
+        while True:
+            if subscription.overflowed:
+                await send({'type': 'http.response.body', 'body': b'event: overflow\ndata: {}\n\n', 'more_body': False})
+                return
+            next_event = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait({next_event, disconnected}, timeout=heartbeat, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                if disconnected.result()['type'] == 'http.disconnect':
+                    return
+                # ignore any request body and keep listening for the disconnect
+                disconnected = asyncio.ensure_future(receive())
+            if next_event not in done:
+                next_event.cancel()
+                await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                continue
+            event = next_event.result()
+            message = f"event: {event['event']}\ndata: {json.dumps(event['activity'])}\n\n"
+            await send({'type': 'http.response.body', 'body': message.encode('utf-8'), 'more_body': True})
+    finally:
+        subscription.close()
+        for task in (next_event, disconnected):
+            if task is not None and not task.done():
+                task.cancel()
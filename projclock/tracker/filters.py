@@ -0,0 +1,52 @@
+from datetime import date
+from django.db.models import Q, Value
+from django.db.models.functions import Lower
+from django_filters import rest_framework as filters
+from tracker.models import Project, ProjectActivity, technology_name_expression
+
+
+class ProjectActivityFilter(filters.FilterSet):
+    """
+    Filters of the activity listing, always applied on top of the activities
+    of the current user so they are answered from the user indexes:
+    start_time ranges by activity_user_start_idx, project by
+    activity_user_project_idx and running by activity_running_user_idx.
+    ?start_time_after=2022-01-01T00:00:00Z&start_time_before=2022-02-01T00:00:00Z&project=3&running=false
+    """
+    start_time = filters.IsoDateTimeFromToRangeFilter()
+    # end_time is not indexed, it narrows the rows reached through the user indexes
+    end_time = filters.IsoDateTimeFromToRangeFilter()
+    project = filters.NumberFilter(field_name='project_id')
+    running = filters.BooleanFilter(field_name='end_time', lookup_expr='isnull')
+
+    class Meta:
+        model = ProjectActivity
+        fields = ('start_time', 'end_time', 'project', 'running')
+
+
+class ProjectFilter(filters.FilterSet):
+    """
+    Filters of the project listings, start_date ranges are answered by
+    project_start_date_idx and end_date ranges and completed by
+    project_end_date_idx. technology matches the "technology" key of the
+    technology JSON, case insensitive, answered by project_technology_idx.
+    ?start_date_after=2022-01-01&end_date_before=2022-12-31&completed=false&technology=python
+    """
+    start_date = filters.DateFromToRangeFilter()
+    end_date = filters.DateFromToRangeFilter()
+    completed = filters.BooleanFilter(method='filter_completed')
+    technology = filters.CharFilter(method='filter_technology')
+
+    class Meta:
+        model = Project
+        fields = ('start_date', 'end_date', 'completed', 'technology')
+
+    def filter_completed(self, queryset, name, value):
+        # Project.is_completed, a project ending today is still running
+        if value:
+            return queryset.filter(end_date__lt=date.today())
+        return queryset.filter(Q(end_date__isnull=True) | Q(end_date__gte=date.today()))
+
+    def filter_technology(self, queryset, name, value):
+        # the indexed expression, an iexact lookup on the key would not use the index
+        return queryset.alias(technology_name=technology_name_expression()).filter(technology_name=Lower(Value(value)))
@@ -0,0 +1,73 @@
+from datetime import datetime, time, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+from tracker.models import ArchivedProjectActivity, ProjectActivity
+from tracker.routers import archive_database
+
+
+class Command(BaseCommand):
+    help = ('Move the activities closed before a cutoff out of the activity table into the archive, '
+            'ACTIVITY_ARCHIVE_DATABASE, in batches. The rollups already hold their time, the analytics '
+            'add the archived activities to the others')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', type=datetime.fromisoformat, default=None,
+                            help='archive the activities closed before this date (YYYY-MM-DD)')
+        parser.add_argument('--days', type=int, default=365, help='archive the activities closed more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=1000, help='activities moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='count the activities to archive without moving them')
+        parser.add_argument('--vacuum', action='store_true', help='give the freed pages of an SQLite database back to the file system')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        if options['before'] is not None:
+            cutoff = timezone.make_aware(datetime.combine(options['before'].date(), time.min))
+        else:
+            cutoff = timezone.now() - timedelta(days=options['days'])
+
+        closed = ProjectActivity.objects.filter(end_time__lt=cutoff)
+        if options['dry_run']:
+            self.stdout.write(f'{closed.count()} activities closed before {cutoff.isoformat()} would be archived')
+            return
+
+        archived, last_id = 0, 0
+        while True:
+            moved, last_id = self.archive_batch(closed, last_id, options['batch_size'])
+            if not moved:
+                break
+            archived += moved
+            self.stdout.write(f'archived {archived} activities', ending='\r')
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} activities closed before {cutoff.isoformat()} into the {archive_database()} database'))
+
+        connection = connections['default']
+        if options['vacuum'] and archived and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+
+    def archive_batch(self, closed, last_id, batch_size):
+        """
+        Copy the next batch of closed activities into the archive and delete
+        them, walking the primary key so every batch starts where the last
+        one ended. With a separate archive database the archive commits
+        first, a crash in between leaves the batch in both tables rather
+        than in none
+
+        Returns:
+            tuple: (activities moved, id of the last one)
+        """
+        with transaction.atomic(), transaction.atomic(using=archive_database()):
+            rows = list(closed.filter(pk__gt=last_id).with_duration().order_by('pk').values(
+                'id', 'description', 'project_id', 'user_id', 'start_time', 'end_time', 'duration_seconds',
+                'created_at', 'updated_at')[:batch_size])
+            if not rows:
+                return 0, last_id
+            ids = [row['id'] for row in rows]
+            ArchivedProjectActivity.objects.bulk_create(
+                [ArchivedProjectActivity(activity_id=row['id'], **{key: value for key, value in row.items() if key != 'id'})
+                 for row in rows],
+                batch_size=500)
+            ProjectActivity.objects.filter(pk__in=ids).delete()
+            return len(rows), ids[-1]
@@ -0,0 +1,273 @@
+import itertools
+import json
+import platform
+import tempfile
+import time
+from collections import namedtuple
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.urls import reverse
+from employee import urls as employee_urls
+from employee.models import Employee, EmployeeImportJob
+from tracker import urls as tracker_urls
+from tracker.models import Project, ProjectActivity, ProjectActivityRollup, ReportJob
+from tracker.reports import run_report_job
+from utils.benchmark import seed_dataset, temporary_database, wsgi_request
+from utils.instrumentation import percentile
+
+# build(index) returns the (url, token, json body) of the index-th request to the endpoint
+Endpoint = namedtuple('Endpoint', ['name', 'method', 'build'])
+
+
+# the query counter of the request being timed, copied into the threads the views run in under ASGI
+query_counter = ContextVar('query_counter', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    counter = query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """connection_created receiver adding count_query to the connections of every thread"""
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway SQLite database and drive every endpoint of tracker/urls.py and employee/urls.py '
+            'at a set concurrency, reporting latency percentiles, throughput and sql queries per endpoint as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='number of employees to generate')
+        parser.add_argument('--projects', type=int, default=50, help='number of projects to generate')
+        parser.add_argument('--activities', type=int, default=100000, help='number of activities to generate')
+        parser.add_argument('--members', type=int, default=10, help='members per project')
+        parser.add_argument('--requests', type=int, default=100, help='requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=8, help='requests in flight at once')
+        # sqlite transactions reading before writing fail with 'database is locked' instead of waiting for another writer
+        parser.add_argument('--write-concurrency', type=int, default=1, help='requests in flight at once for the write endpoints')
+        parser.add_argument('--auth-mode', choices=['database', 'stateless'], default=None,
+                            help='JWT_AUTH_MODE the requests are authenticated with, the configured one by default')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--only', nargs='*', default=None, help='url names of the endpoints to run, all by default')
+        parser.add_argument('--output', default='benchmark_results.json', help='file the JSON results are written to, git ignored in the project directory')
+        parser.add_argument('--baseline', default=None, help='JSON results of a previous run to compare with')
+
+    def handle(self, *args, **options):
+        # the reports and employee imports run in the request submitting them, passwords included,
+        # so the time of the jobs is measured rather than left to spawned workers. The tokens outlive the run
+        options['auth_mode'] = options['auth_mode'] or settings.JWT_AUTH_MODE
+        with tempfile.TemporaryDirectory() as reports, override_settings(
+                REPORT_JOBS_WORKERS=0, REPORT_JOBS_DIR=reports, EMPLOYEE_IMPORT_JOBS_WORKERS=0, EMPLOYEE_IMPORT_WORKERS=0,
+                JWT_AUTH_MODE=options['auth_mode'],
+                JWT_ACCESS_TOKEN_LIFETIME=max(settings.JWT_ACCESS_TOKEN_LIFETIME, 24 * 60 * 60)):
+            self.run_benchmark(options)
+
+    def run_benchmark(self, options):
+        with temporary_database() as connection:
+            self.sample = seed_dataset(connection, users=options['users'], projects=options['projects'],
+                                       activities=options['activities'], members=options['members'], seed=options['seed'])
+            ProjectActivityRollup.objects.rebuild()
+            self.prepare(options)
+            endpoints = self.endpoints()
+            self.check_coverage(endpoints)
+            if options['only']:
+                endpoints = [endpoint for endpoint in endpoints if endpoint.name in options['only']]
+
+            application = get_wsgi_application()
+            results = {}
+            connection_created.connect(install_query_counter)
+            try:
+                for endpoint in endpoints:
+                    results[endpoint.name] = self.run_endpoint(application, endpoint, options)
+                    self.report(endpoint.name, results[endpoint.name])
+            finally:
+                connection_created.disconnect(install_query_counter)
+
+        output = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': 'sqlite',
+                'dataset': {key: options[key] for key in ('users', 'projects', 'activities', 'members', 'seed')},
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'write_concurrency': options['write_concurrency'],
+                'auth_mode': options['auth_mode'],
+            },
+            'endpoints': results,
+        }
+        with open(options['output'], 'w') as output_file:
+            json.dump(output, output_file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        if options['baseline']:
+            self.compare(options['baseline'], results)
+
+    def prepare(self, options):
+        """create the rows the write endpoints need and the tokens of the users acting on them"""
+        requests = options['requests']
+        self.tokens = {employee.id: employee.token for employee in Employee.objects.all()}
+        self.admin = self.tokens[1]
+        self.member = self.sample['user']
+        # revoke_tokens revokes the tokens of this user, every request is sent with a new token
+        self.benchmark_user = Employee.objects.create_user('benchmark', 'benchmark@email.com', 'benchmarkpassword')
+        self.refresh_token = Employee.objects.get(pk=self.member).refresh_token
+        # activities are updated and deleted by their owner, each request gets its own activity
+        self.activities = list(ProjectActivity.objects.order_by('id').values_list('id', 'user_id')[:2 * requests])
+        # projects deleted by the benchmark, so the seeded ones stay in place for the other endpoints
+        self.disposable_projects = [
+            project.id for project in Project.objects.bulk_create(
+                Project(title=f'disposable {index}', technology={}) for index in range(requests))
+        ]
+        self.counter = itertools.count()
+        # a done report job polled and downloaded by the report endpoints
+        self.report_job = ReportJob.objects.create(
+            user_id=1, kind=ReportJob.PROJECT_TOTALS, params={'project': self.sample['project']}).id
+        run_report_job(self.report_job)
+        # a done employee import polled by import_job
+        self.import_job = EmployeeImportJob.objects.create(user_id=1, status=EmployeeImportJob.DONE).id
+
+    def endpoints(self):
+        project, member, now = self.sample['project'], self.member, self.sample['now']
+        member_token = self.tokens[member]
+        buckets = urlencode({'interval': 'week', 'start': (now - timedelta(days=365)).date(), 'end': now.date(), 'project': project})
+        start_time = (now - timedelta(hours=2)).isoformat()
+
+        def bulk_body(index):
+            return [{'project': project, 'user': member, 'start_time': start_time, 'end_time': now.isoformat()} for _ in range(100)]
+
+        reads = [
+            ('list_projects', lambda i: (reverse('list_projects'), self.admin, None)),
+            ('list_my_projects', lambda i: (reverse('list_my_projects'), member_token, None)),
+            ('list_a_project', lambda i: (reverse('list_a_project', kwargs={'id': project}), member_token, None)),
+            ('list_activities', lambda i: (reverse('list_activities') + '?page_size=100', member_token, None)),
+            ('current_activities', lambda i: (reverse('current_activities'), member_token, None)),
+            ('total_individual_project_activity_time', lambda i: (
+                reverse('total_individual_project_activity_time', kwargs={'user': member, 'project': project}), member_token, None)),
+            ('total_project_activity_time', lambda i: (
+                reverse('total_project_activity_time', kwargs={'project': project}), self.admin, None)),
+            ('bucketed_activity_time', lambda i: (reverse('bucketed_activity_time') + f'?{buckets}', self.admin, None)),
+            ('export_activities', lambda i: (
+                reverse('export_activities', kwargs={'export_format': 'csv'}) + f'?project={project}', self.admin, None)),
+            ('report_job', lambda i: (reverse('report_job', kwargs={'pk': self.report_job}), self.admin, None)),
+            ('report_result', lambda i: (reverse('report_result', kwargs={'pk': self.report_job}), self.admin, None)),
+            ('import_job', lambda i: (reverse('import_job', kwargs={'pk': self.import_job}), self.admin, None)),
+            ('user', lambda i: (reverse('user'), member_token, None)),
+            ('auth_cache_stats', lambda i: (reverse('auth_cache_stats'), self.admin, None)),
+            ('request_metrics', lambda i: (reverse('request_metrics'), self.admin, None)),
+        ]
+        endpoints = [Endpoint(name, 'GET', build) for name, build in reads]
+        endpoints += [
+            Endpoint('register', 'POST', lambda i: (reverse('register'), None, dict(self.new_employee(), password='password'))),
+            Endpoint('import_employees', 'POST', lambda i: (
+                reverse('import_employees'), self.admin, [dict(self.new_employee(), password='password') for _ in range(10)])),
+            Endpoint('token_refresh', 'POST', lambda i: (reverse('token_refresh'), None, {'refresh': self.refresh_token})),
+            Endpoint('revoke_tokens', 'POST', lambda i: (
+                reverse('revoke_tokens'), Employee.objects.get(pk=self.benchmark_user.pk).token, None)),
+            Endpoint('login', 'POST', lambda i: (reverse('login'), None, {'email': 'benchmark@email.com', 'password': 'benchmarkpassword'})),
+            Endpoint('add_project', 'POST', lambda i: (reverse('add_project'), self.admin, {
+                'title': f'benchmark {i}', 'technology': {'technology': 'python'}, 'members': [member]})),
+            Endpoint('update_project', 'PATCH', lambda i: (
+                reverse('update_project', kwargs={'pk': project}), self.admin, {'description': f'updated {i}'})),
+            Endpoint('add_activity', 'POST', lambda i: (reverse('add_activity'), member_token, {'project': project, 'user': member})),
+            Endpoint('bulk_add_activities', 'POST', lambda i: (reverse('bulk_add_activities'), member_token, bulk_body(i))),
+            Endpoint('submit_report', 'POST', lambda i: (
+                reverse('submit_report'), member_token, {'kind': ReportJob.PROJECT_TOTALS, 'params': {'project': project}})),
+            Endpoint('stop_my_activities', 'POST', lambda i: (reverse('stop_my_activities'), member_token, None)),
+            Endpoint('activity_events_token', 'POST', lambda i: (
+                reverse('activity_events_token', kwargs={'project': project}), member_token, None)),
+            Endpoint('update_a_activity', 'PATCH', lambda i: (
+                reverse('update_a_activity', kwargs={'pk': self.activities[i][0]}), self.tokens[self.activities[i][1]],
+                {'description': f'updated {i}'})),
+            Endpoint('list_update_delete_activity', 'DELETE', lambda i: (
+                reverse('list_update_delete_activity', kwargs={'pk': self.activities[-i - 1][0]}),
+                self.tokens[self.activities[-i - 1][1]], None)),
+            Endpoint('delete_project', 'DELETE', lambda i: (
+                reverse('delete_project', kwargs={'pk': self.disposable_projects[i]}), self.admin, None)),
+        ]
+        return endpoints
+
+    def new_employee(self):
+        """username and email of an employee not registered yet"""
+        number = next(self.counter)
+        return {'username': f'registered{number}', 'email': f'registered{number}@email.com'}
+
+    def url_names(self):
+        return {pattern.name for pattern in tracker_urls.urlpatterns + employee_urls.urlpatterns}
+
+    def check_coverage(self, endpoints):
+        missing = self.url_names() - {endpoint.name for endpoint in endpoints}
+        for name in sorted(missing):
+            self.stderr.write(f'endpoint {name} is not benchmarked')
+
+    def run_endpoint(self, application, endpoint, options):
+        def timed_request(index):
+            url, token, body = endpoint.build(index)
+            payload = json.dumps(body).encode('utf-8') if body is not None else b''
+            counter = [0]
+            query_counter.set(counter)
+            started = time.perf_counter()
+            status, _ = wsgi_request(application, endpoint.method, url, token, payload)
+            elapsed = time.perf_counter() - started
+            query_counter.set(None)
+            return elapsed, status, counter[0]
+
+        concurrency = options['concurrency'] if endpoint.method == 'GET' else options['write_concurrency']
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(executor.map(timed_request, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(sample[0] * 1000 for sample in samples)
+        queries = [sample[2] for sample in samples]
+        errors = [sample[1] for sample in samples if not 200 <= sample[1] < 300]
+        return {
+            'method': endpoint.method,
+            'concurrency': concurrency,
+            'requests': len(samples),
+            'errors': len(errors),
+            'error_statuses': sorted(set(errors)),
+            'throughput_rps': round(len(samples) / elapsed, 2),
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 3),
+                'p95': round(percentile(latencies, 95), 3),
+                'p99': round(percentile(latencies, 99), 3),
+                'mean': round(sum(latencies) / len(latencies), 3),
+                'max': round(latencies[-1], 3),
+            },
+            'queries': {'mean': round(sum(queries) / len(queries), 2), 'max': max(queries)},
+        }
+
+    def report(self, name, result):
+        latency = result['latency_ms']
+        line = (f"{name:45} {result['throughput_rps']:9.1f} req/s  p50 {latency['p50']:9.2f}  p95 {latency['p95']:9.2f}  "
+                f"p99 {latency['p99']:9.2f} ms  {result['queries']['mean']:6.1f} queries")
+        if result['errors']:
+            self.stdout.write(self.style.ERROR(f"{line}  {result['errors']} errors {result['error_statuses']}"))
+        else:
+            self.stdout.write(line)
+
+    def compare(self, baseline_path, results):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)['endpoints']
+        self.stdout.write(self.style.MIGRATE_HEADING(f'compared with {baseline_path} (current / baseline)'))
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            previous = baseline[name]
+            self.stdout.write(
+                f"{name:45} throughput x{result['throughput_rps'] / previous['throughput_rps']:6.2f}  "
+                f"p95 x{result['latency_ms']['p95'] / previous['latency_ms']['p95']:6.2f}  "
+                f"queries {previous['queries']['mean']:6.1f} -> {result['queries']['mean']:6.1f}")
@@ -0,0 +1,80 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from employee.models import Employee
+from tracker.models import ProjectActivityRollup
+from utils.benchmark import asgi_request, seed_dataset, temporary_database, wsgi_request
+
+
+class Command(BaseCommand):
+    help = ('Compare the throughput of the endpoints served over WSGI and over ASGI, under concurrency, '
+            'on a generated SQLite dataset')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--activities', type=int, default=100000, help='number of activities to generate')
+        parser.add_argument('--requests', type=int, default=200, help='requests per endpoint and server')
+        parser.add_argument('--concurrency', type=int, default=16, help='requests in flight at once')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with temporary_database() as connection:
+            sample = seed_dataset(connection, activities=options['activities'], seed=options['seed'])
+            ProjectActivityRollup.objects.rebuild()
+            token = Employee.objects.get(pk=1).token
+            start = sample['now'].date().replace(year=sample['now'].year - 1)
+            endpoints = {
+                'project time per day over a year': f"analytics/activity/buckets?interval=day&start={start}&end={sample['now'].date()}&project={sample['project']}",
+                'project total time': f"analytics/activity/duration/{sample['project']}",
+                'activities page': 'activitys?page_size=100',
+            }
+            wsgi, asgi = get_wsgi_application(), get_asgi_application()
+            for name, path in endpoints.items():
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                runs = [
+                    ('wsgi', self.run_wsgi(wsgi, f'/api/{path}', token, options)),
+                    ('asgi', self.run_asgi(asgi, f'/api/{path}', token, options)),
+                ]
+                for label, (elapsed, latencies) in runs:
+                    latencies.sort()
+                    self.stdout.write(
+                        f'  {label}  {len(latencies) / elapsed:8.1f} req/s  '
+                        f'p50 {statistics.median(latencies) * 1000:8.2f} ms  '
+                        f'p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:8.2f} ms')
+
+    def check_status(self, url, status):
+        if status != 200:
+            raise CommandError(f'GET {url} answered {status}')
+
+    def run_wsgi(self, application, url, token, options):
+        """drive the WSGI application from a pool of threads, like a threaded WSGI server"""
+        def timed_request(_):
+            started = time.perf_counter()
+            status, _ = wsgi_request(application, 'GET', url, token)
+            self.check_status(url, status)
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            latencies = list(executor.map(timed_request, range(options['requests'])))
+        return time.perf_counter() - started, latencies
+
+    def run_asgi(self, application, url, token, options):
+        """drive the ASGI application from a single event loop, like one ASGI worker"""
+        async def timed_request(semaphore):
+            async with semaphore:
+                started = time.perf_counter()
+                status, _ = await asgi_request(application, 'GET', url, token)
+                self.check_status(url, status)
+                return time.perf_counter() - started
+
+        async def run():
+            semaphore = asyncio.Semaphore(options['concurrency'])
+            return await asyncio.gather(*(timed_request(semaphore) for _ in range(options['requests'])))
+
+        started = time.perf_counter()
+        latencies = list(asyncio.run(run()))
+        return time.perf_counter() - started, latencies
@@ -0,0 +1,112 @@
+import os
+import tempfile
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q, Sum
+from employee.models import Employee
+from tracker.models import Project, ProjectActivity
+from utils.analytics import activity_duration_seconds_expression
+from utils.benchmark import seed_dataset
+
+BENCHMARK_ALIAS = 'index_benchmark'
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway SQLite database and compare the query plans and timings '
+            'of the tracker hot queries without and with the ProjectActivity / Project indexes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--activities', type=int, default=200000, help='number of activities to generate')
+        parser.add_argument('--users', type=int, default=200, help='number of employees to generate')
+        parser.add_argument('--projects', type=int, default=50, help='number of projects to generate')
+        parser.add_argument('--repeat', type=int, default=5, help='runs per query, the best one is reported')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connections.settings[BENCHMARK_ALIAS] = dict(connections.settings['default'], NAME=path)
+        try:
+            connection = connections[BENCHMARK_ALIAS]
+            self.create_schema(connection)
+            self.seed(connection, options)
+            before = self.run_queries(options)
+            self.add_indexes(connection)
+            after = self.run_queries(options)
+            self.report(before, after)
+        finally:
+            connections[BENCHMARK_ALIAS].close()
+            del connections[BENCHMARK_ALIAS]
+            del connections.settings[BENCHMARK_ALIAS]
+            os.remove(path)
+
+    def indexed_models(self):
+        return (Project, ProjectActivity)
+
+    def create_schema(self, connection):
+        """create the tables with only the default (primary key and foreign key) indexes"""
+        with connection.schema_editor() as editor:
+            for model in (Employee, Project, ProjectActivity):
+                editor.create_model(model)
+        # the indexes are created when the first editor exits
+        with connection.schema_editor() as editor:
+            for model in self.indexed_models():
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+
+    def add_indexes(self, connection):
+        with connection.schema_editor() as editor:
+            for model in self.indexed_models():
+                for index in model._meta.indexes:
+                    editor.add_index(model, index)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def seed(self, connection, options):
+        self.sample = seed_dataset(connection, users=options['users'], projects=options['projects'],
+                                   activities=options['activities'], seed=options['seed'])
+
+    def queries(self):
+        """the tracker hot queries, as (name, queryset, run) tuples"""
+        user, project, now = self.sample['user'], self.sample['project'], self.sample['now']
+        activities = ProjectActivity.objects.using(BENCHMARK_ALIAS)
+        projects = Project.objects.using(BENCHMARK_ALIAS)
+        day_start = now - timedelta(days=30)
+        cursor_date = now.date() - timedelta(days=365)
+        total = Sum(activity_duration_seconds_expression())
+        return [
+            ('activities of a user, first page', activities.filter(user_id=user).order_by('start_time', 'id')[:100], list),
+            ('time of a user on a project', activities.filter(user_id=user, project_id=project),
+             lambda qs: qs.aggregate(total=total)),
+            ('rollup refresh of a (project, user, day)',
+             activities.filter(project_id=project, user_id=user, end_time__isnull=False,
+                               start_time__gte=day_start, start_time__lt=day_start + timedelta(days=1)),
+             lambda qs: qs.aggregate(total=total)),
+            ('time of a project over a month',
+             activities.filter(project_id=project, start_time__gte=now - timedelta(days=30), start_time__lt=now),
+             lambda qs: qs.aggregate(total=total)),
+            ('running activities of a user', activities.filter(user_id=user, end_time__isnull=True), list),
+            ('running activities of a project', activities.filter(project_id=project, end_time__isnull=True), list),
+            ('projects page after a cursor',
+             projects.filter(Q(start_date__gt=cursor_date) | Q(start_date=cursor_date, id__gt=0)).order_by('start_date', 'id')[:100],
+             list),
+        ]
+
+    def run_queries(self, options):
+        results = {}
+        for name, queryset, run in self.queries():
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                run(queryset.all())
+                timings.append(time.perf_counter() - started)
+            results[name] = {'plan': queryset.explain(), 'ms': min(timings) * 1000}
+        return results
+
+    def report(self, before, after):
+        for name in before:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f"  without indexes {before[name]['ms']:10.3f} ms  {' | '.join(before[name]['plan'].splitlines())}")
+            self.stdout.write(f"  with indexes    {after[name]['ms']:10.3f} ms  {' | '.join(after[name]['plan'].splitlines())}")
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from tracker.models import ProjectActivityRollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per project, user and day activity rollups from scratch'
+
+    def handle(self, *args, **options):
+        created = ProjectActivityRollup.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} activity rollups'))
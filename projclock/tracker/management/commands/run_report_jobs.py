@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from tracker.models import ReportJob
+from tracker.reports import run_report_job
+
+
+class Command(BaseCommand):
+    help = ('Run the pending report jobs in this process, oldest first, e.g. the jobs queued when the web '
+            'process stopped before its workers picked them up')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requeue-running', action='store_true',
+                            help='run again the jobs left running by a worker that died, only when no worker is running')
+
+    def handle(self, *args, **options):
+        if options['requeue_running']:
+            requeued = ReportJob.objects.filter(status=ReportJob.RUNNING).update(status=ReportJob.PENDING, started_at=None)
+            self.stdout.write(f'requeued {requeued} running jobs')
+        # by id through report_job_status_idx, jobs submitted meanwhile are run too
+        last_id, counts = 0, {ReportJob.DONE: 0, ReportJob.FAILED: 0}
+        while True:
+            job_id = ReportJob.objects.filter(status=ReportJob.PENDING, pk__gt=last_id).order_by('pk').values_list(
+                'pk', flat=True).first()
+            if job_id is None:
+                break
+            run_report_job(job_id)
+            status = ReportJob.objects.filter(pk=job_id).values_list('status', flat=True).first()
+            if status in counts:
+                counts[status] += 1
+            last_id = job_id
+        self.stdout.write(self.style.SUCCESS(
+            f'Ran {counts[ReportJob.DONE] + counts[ReportJob.FAILED]} report jobs, {counts[ReportJob.FAILED]} failed'))
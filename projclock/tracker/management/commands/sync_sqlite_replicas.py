@@ -0,0 +1,27 @@
+import sqlite3
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from utils.replicas import get_replicas
+
+
+class Command(BaseCommand):
+    help = ('Copy the default SQLite database over the SQLite files of DATABASE_REPLICAS, '
+            'to try the replica routing locally, run it again to let the replicas catch up')
+
+    def handle(self, *args, **options):
+        replicas = get_replicas()
+        if not replicas:
+            raise CommandError('DATABASE_REPLICAS is empty')
+        source = connections['default']
+        if source.vendor != 'sqlite' or any(connections[alias].vendor != 'sqlite' for alias in replicas):
+            raise CommandError('Only SQLite databases can be copied')
+
+        source.ensure_connection()
+        for alias in replicas:
+            connections[alias].close()
+            destination = sqlite3.connect(connections[alias].settings_dict['NAME'])
+            try:
+                source.connection.backup(destination)
+            finally:
+                destination.close()
+            self.stdout.write(self.style.SUCCESS(f"Copied the default database to {alias} ({connections[alias].settings_dict['NAME']})"))
@@ -1,12 +1,47 @@
-from datetime import datetime, timezone, timedelta, date
-from django.db import models
+from datetime import datetime, timezone, timedelta, date, time
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Coalesce, Lower, TruncDate
+from django.utils import timezone as django_timezone
 from django.utils.functional import cached_property
 from employee.models import Employee
+from utils.analytics import activity_duration_seconds_expression, format_seconds
+from utils.models import IndexableKeyTextTransform, ModelTracker
 # Create your models here.
 
 
+def technology_name_expression():
+    """the lower cased "technology" key of the technology JSON, filter with this very expression to use its index"""
+    return Lower(IndexableKeyTextTransform('technology', 'technology'))
+
+
+class ProjectQuerySet(models.QuerySet):
+
+    def with_members(self, summary=False):
+        """
+        Prefetch the members of the projects in one query and annotate their
+        member_count, the username of the members is only fetched for a summary.
+        The count is a correlated subquery, a join grouped by project would
+        sort every project before the page is cut out of the listing
+        """
+        members = Employee.objects.only('id', 'username') if summary else Employee.objects.only('id')
+        member_count = Project.members.through.objects.filter(project=OuterRef('pk')).order_by().values(
+            'project').annotate(count=Count('*')).values('count')
+        return self.prefetch_related(Prefetch('members', queryset=members)).annotate(
+            member_count=Coalesce(Subquery(member_count), 0))
+
+    def of_member(self, user):
+        """
+        The projects the user is a member of, filtered through a subquery so
+        the projects are neither repeated nor their member_count narrowed to
+        the user by the join
+        """
+        return self.filter(pk__in=Project.members.through.objects.filter(employee=user).values('project_id'))
+
+
 # Create your models here.
-class Project(models.Model):
+class Project(ModelTracker):
     id = models.AutoField(primary_key=True)
     title = models.CharField(max_length=200)
     description = models.TextField(blank=False, null=False, max_length=400, default="")
@@ -14,7 +49,7 @@ class Project(models.Model):
     members = models.ManyToManyField(Employee, related_name='all_members')
     start_date = models.DateField(default=date.today())
     end_date = models.DateField(blank=True, null=True)
-
+    objects = ProjectQuerySet.as_manager()
 
     @property
     def is_completed(self):
@@ -28,9 +63,53 @@ class Project(models.Model):
 
     class Meta:
         ordering = ['start_date']
+        indexes = [
+            # keyset pagination of the project listing
+            models.Index(fields=['start_date', 'id'], name='project_start_date_idx'),
+            # end_date ranges and completed filters of the project listings
+            models.Index(fields=['end_date'], name='project_end_date_idx'),
+            # case insensitive technology filter of the project listings
+            models.Index(technology_name_expression(), name='project_technology_idx'),
+        ]
+
+
+# created with the tables when SINGLE_RUNNING_ACTIVITY is set, the setting is read once when the models are loaded
+SINGLE_RUNNING_ACTIVITY_CONSTRAINT = models.UniqueConstraint(
+    fields=['user'], condition=models.Q(end_time__isnull=True), name='single_running_activity_per_user')
+
+
+class ProjectActivityQuerySet(models.QuerySet):
+
+    def with_duration(self):
+        """
+        Annotate the duration_seconds of every activity, computed by the
+        database, running activities are measured up to the current time
+        """
+        return self.annotate(duration_seconds=activity_duration_seconds_expression())
 
+    def running(self):
+        """the activities without an end_time, read through the partial indexes of the running activities"""
+        return self.filter(end_time__isnull=True)
 
-class ProjectActivity(models.Model):
+    @transaction.atomic
+    def stop(self, end_time=None):
+        """
+        Stop the running activities of the queryset with a single
+        UPDATE ... WHERE end_time IS NULL, an activity stopped in between by
+        another request is left as it is
+
+        Returns:
+            list: the activities stopped, by start_time
+        """
+        end_time = end_time or django_timezone.now()
+        ids = list(self.running().values_list('id', flat=True))
+        if not ids:
+            return []
+        self.model.objects.filter(pk__in=ids, end_time__isnull=True).update(end_time=end_time, updated_at=end_time)
+        return list(self.model.objects.filter(pk__in=ids, end_time=end_time).order_by('start_time', 'id'))
+
+
+class ProjectActivity(ModelTracker):
     id = models.AutoField(primary_key=True)
     description = models.TextField(blank=False, null=False, max_length=400, default="")
     project = models.ForeignKey(to=Project, on_delete=models.CASCADE)
@@ -38,6 +117,7 @@ class ProjectActivity(models.Model):
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(blank=True, null=True)
     # activity_duration = models.DurationField(blank)
+    objects = ProjectActivityQuerySet.as_manager()
 
 
     def __str__(self):
@@ -65,17 +145,187 @@ class ProjectActivity(models.Model):
         """
         return self.end_time is None
 
+    @cached_property
+    def duration_seconds(self):
+        """
+        get the duration of the activity in whole seconds, annotated by
+        ProjectActivity.objects.with_duration() or computed here
+
+        Returns:
+            int: duration of the activity
+        """
+        end_time = datetime.now(timezone.utc) if self.is_running else self.end_time
+        return round((end_time - self.start_time).total_seconds())
+
     @cached_property
     def duration(self):
         """
         get the duration of the activity
 
         Returns:
-            timedelta: duration of the activity
+            string: duration of the activity, 'H:MM:SS'
+        """
+        return format_seconds(self.duration_seconds)
+
+    class Meta:
+        indexes = [
+            # activity listing of a user, paged by (start_time, id)
+            models.Index(fields=['user', 'start_time', 'id'], name='activity_user_start_idx'),
+            # time of a user on a project, rollup refresh of a (project, user, day)
+            models.Index(fields=['user', 'project', 'start_time'], name='activity_user_project_idx'),
+            # time of a project, bucketed analytics over a start_time range
+            models.Index(fields=['project', 'start_time'], name='activity_project_start_idx'),
+            # closed activities ending in or after the range of the bucketed analytics, however early they started
+            models.Index(fields=['project', 'end_time'], condition=models.Q(end_time__isnull=False), name='activity_project_end_idx'),
+            models.Index(fields=['user', 'end_time'], condition=models.Q(end_time__isnull=False), name='activity_user_end_idx'),
+            # running timers, only the few rows with end_time IS NULL are indexed
+            models.Index(fields=['user'], condition=models.Q(end_time__isnull=True), name='activity_running_user_idx'),
+            models.Index(fields=['project', 'user'], condition=models.Q(end_time__isnull=True), name='activity_running_project_idx'),
+        ]
+        # at most one running activity per user, enforced by the database when SINGLE_RUNNING_ACTIVITY is set
+        constraints = [SINGLE_RUNNING_ACTIVITY_CONSTRAINT] if getattr(settings, 'SINGLE_RUNNING_ACTIVITY', False) else []
+
+
+class ManageActivityRollup(models.Manager):
+
+    def refresh(self, project_id, user_id, day):
         """
-        if self.is_running:
-            sec = datetime.now(timezone.utc) - self.start_time
-            return str(timedelta(seconds=round(sec.total_seconds())))
+        Recompute the rollup of one (project, user, day) bucket from the closed
+        activities started on that day, removing the row when nothing is left
+        """
+        day_start = django_timezone.make_aware(datetime.combine(day, time.min))
+        activities = ProjectActivity.objects.filter(
+            project_id=project_id, user_id=user_id, end_time__isnull=False,
+            start_time__gte=day_start, start_time__lt=day_start + timedelta(days=1))
+        seconds = activities.aggregate(total=Sum(activity_duration_seconds_expression()))['total']
+        archived = ArchivedProjectActivity.objects.filter(
+            project_id=project_id, user_id=user_id,
+            start_time__gte=day_start, start_time__lt=day_start + timedelta(days=1)).aggregate(total=Sum('duration_seconds'))['total']
+        if archived is not None:
+            seconds = (seconds or 0) + archived
+        if seconds is None:
+            self.filter(project_id=project_id, user_id=user_id, day=day).delete()
         else:
-            sec = self.end_time - self.start_time
-            return str(timedelta(seconds=round(sec.total_seconds())))
\ No newline at end of file
+            self.update_or_create(project_id=project_id, user_id=user_id, day=day, defaults={'duration_seconds': seconds})
+
+    def refresh_activity(self, activity):
+        """
+        Recompute the rollup bucket the given activity belongs to
+        """
+        self.refresh(activity.project_id, activity.user_id, django_timezone.localtime(activity.start_time).date())
+
+    def refresh_activities(self, activities):
+        """
+        Recompute every rollup bucket touched by the given activities, once per bucket
+        """
+        buckets = {(activity.project_id, activity.user_id, django_timezone.localtime(activity.start_time).date()) for activity in activities}
+        for project_id, user_id, day in buckets:
+            self.refresh(project_id, user_id, day)
+
+    @transaction.atomic
+    def rebuild(self):
+        """
+        Drop every rollup and rebuild them from the closed and archived activities
+
+        Returns:
+            int: number of rollup rows created
+        """
+        self.all().delete()
+        buckets = ProjectActivity.objects.filter(end_time__isnull=False).annotate(day=TruncDate('start_time')).values(
+            'project', 'user', 'day').annotate(total=Sum(activity_duration_seconds_expression())).order_by()
+        totals = {(bucket['project'], bucket['user'], bucket['day']): bucket['total'] for bucket in buckets.iterator()}
+        # the archive may live in another database, its buckets are added here rather than joined
+        archived = ArchivedProjectActivity.objects.annotate(day=TruncDate('start_time')).values(
+            'project_id', 'user_id', 'day').annotate(total=Sum('duration_seconds')).order_by()
+        for bucket in archived.iterator():
+            key = (bucket['project_id'], bucket['user_id'], bucket['day'])
+            totals[key] = totals.get(key, 0) + bucket['total']
+        rollups = self.bulk_create(
+            (self.model(project_id=project_id, user_id=user_id, day=day, duration_seconds=total)
+             for (project_id, user_id, day), total in totals.items()),
+            batch_size=1000)
+        return len(rollups)
+
+
+class ArchivedProjectActivity(models.Model):
+    """
+    A closed activity moved out of ProjectActivity by the archive_activities
+    command, with the whole seconds it lasted. The project and user are plain
+    ids so the archive can live in another database, ACTIVITY_ARCHIVE_DATABASE
+    """
+    id = models.AutoField(primary_key=True)
+    activity_id = models.IntegerField()
+    description = models.TextField(default="")
+    project_id = models.IntegerField()
+    user_id = models.IntegerField()
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    duration_seconds = models.BigIntegerField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.activity_id} : {self.project_id} : {self.user_id} : {self.start_time} : {self.end_time}"
+
+    class Meta:
+        indexes = [
+            # time of a project or of a user on a project, bucketed analytics and rollup refreshes
+            models.Index(fields=['project_id', 'start_time'], name='archive_project_start_idx'),
+            models.Index(fields=['user_id', 'project_id', 'start_time'], name='archive_user_project_idx'),
+            # archived activities crossing the start of the range of the bucketed analytics
+            models.Index(fields=['project_id', 'end_time'], name='archive_project_end_idx'),
+            models.Index(fields=['user_id', 'end_time'], name='archive_user_end_idx'),
+        ]
+
+
+class ProjectActivityRollup(models.Model):
+    """
+    Time spent by a user on a project per day in whole seconds, only closed
+    activities are rolled up, running ones are added when the totals are read
+    """
+    id = models.AutoField(primary_key=True)
+    project = models.ForeignKey(to=Project, on_delete=models.CASCADE)
+    user = models.ForeignKey(to=Employee, on_delete=models.CASCADE)
+    day = models.DateField()
+    duration_seconds = models.BigIntegerField(default=0)
+    objects = ManageActivityRollup()
+
+    def __str__(self):
+        return f"{self.project_id} : {self.user_id} : {self.day} : {format_seconds(self.duration_seconds)}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'user', 'day'], name='unique_project_user_day_rollup'),
+        ]
+
+class ReportJob(ModelTracker):
+    """
+    A report computed in the background by tracker.reports, the client polls
+    its status and downloads the result file once it is done
+    """
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUSES = [(PENDING, 'pending'), (RUNNING, 'running'), (DONE, 'done'), (FAILED, 'failed')]
+    PROJECT_TOTALS, ACTIVITY_EXPORT = 'project_totals', 'activity_export'
+    KINDS = [(PROJECT_TOTALS, 'project totals'), (ACTIVITY_EXPORT, 'activity export')]
+
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(to=Employee, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=30, choices=KINDS)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    # name of the result file in REPORT_JOBS_DIR
+    result_file = models.CharField(max_length=200, blank=True, default='')
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.id} : {self.kind} : {self.user_id} : {self.status}"
+
+    class Meta:
+        indexes = [
+            # pending jobs picked up by the run_report_jobs command
+            models.Index(fields=['status', 'id'], name='report_job_status_idx'),
+        ]
@@ -0,0 +1,11 @@
+from utils.pagination import KeysetPagination
+
+
+class ProjectActivityPagination(KeysetPagination):
+    """walk activities by (start_time, id)"""
+    ordering = ('start_time', 'id')
+
+
+class ProjectPagination(KeysetPagination):
+    """walk projects by (start_date, id)"""
+    ordering = ('start_date', 'id')
@@ -0,0 +1,121 @@
+import heapq
+import json
+import logging
+import os
+from pathlib import Path
+from django.conf import settings
+from django.utils import timezone
+from tracker.models import ArchivedProjectActivity, ProjectActivity, ProjectActivityRollup, ReportJob
+from tracker.serializers import ReportJobSerializer
+from utils.analytics import format_seconds, get_user_activity_seconds
+from utils.export import ACTIVITY_EXPORT_FIELDS, EXPORT_CONTENT_TYPES, activity_records, stream_csv, stream_ndjson
+from utils.jobs import JobRunner
+
+logger = logging.getLogger(__name__)
+
+# the reports are computed out of the web process, REPORT_JOBS_WORKERS processes at most
+report_runner = JobRunner('REPORT_JOBS_WORKERS')
+
+
+def activity_export_rows(params, chunk_size=2000):
+    """
+    The (id, project, user, description, start_time, end_time, duration_seconds)
+    rows of the activities matching the export filters, archived ones
+    included, ordered by start time. Both tables are read in chunks, so
+    memory stays flat whatever the number of rows.
+    """
+    filters = {f'{name}_id': params[name] for name in ('project', 'user') if name in params}
+    if 'start' in params:
+        filters['start_time__gte'] = params['start']
+    if 'end' in params:
+        filters['start_time__lt'] = params['end']
+    rows = ProjectActivity.objects.filter(**filters).with_duration().order_by('start_time', 'id').values_list(
+        'id', 'project', 'user', 'description', 'start_time', 'end_time', 'duration_seconds').iterator(chunk_size=chunk_size)
+    archived = ArchivedProjectActivity.objects.filter(**filters).order_by('start_time', 'activity_id').values_list(
+        'activity_id', 'project_id', 'user_id', 'description', 'start_time', 'end_time', 'duration_seconds').iterator(chunk_size=chunk_size)
+    # both streams are ordered by (start_time, id), merged without loading either
+    return heapq.merge(archived, rows, key=lambda row: (row[4], row[0]))
+
+
+def write_project_totals(params, output):
+    """the time spent on the project, in total and per member, as json"""
+    project = params['project']
+    totals = get_user_activity_seconds(
+        ProjectActivityRollup.objects.filter(project_id=project), ProjectActivity.objects.filter(project_id=project))
+    total = sum(totals.values())
+    json.dump({
+        'project': project,
+        'total_time': format_seconds(total),
+        'total_seconds': total,
+        'users': [
+            {'user': user, 'total_time': format_seconds(seconds), 'total_seconds': seconds}
+            for user, seconds in sorted(totals.items())
+        ],
+    }, output)
+    return 'json', 'application/json'
+
+
+def write_activity_export(params, output):
+    """the activities matching the filters, as csv or newline delimited json"""
+    records = activity_records(activity_export_rows(params))
+    export_format = params['format']
+    content = stream_csv(records, ACTIVITY_EXPORT_FIELDS) if export_format == 'csv' else stream_ndjson(records)
+    output.writelines(content)
+    return export_format, EXPORT_CONTENT_TYPES[export_format]
+
+
+# function writing the result of each kind of job, returning its extension and content type
+REPORT_WRITERS = {
+    ReportJob.PROJECT_TOTALS: write_project_totals,
+    ReportJob.ACTIVITY_EXPORT: write_activity_export,
+}
+
+
+def get_result_path(job):
+    return Path(settings.REPORT_JOBS_DIR) / job.result_file
+
+
+def build_report(job):
+    """
+    Write the result of the job to a file of REPORT_JOBS_DIR, under a
+    temporary name until it is complete
+
+    Returns:
+        tuple: (name of the result file, its content type)
+    """
+    serializer = ReportJobSerializer.params_serializers[job.kind](data=job.params)
+    serializer.is_valid(raise_exception=True)
+    directory = Path(settings.REPORT_JOBS_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    partial = directory / f'{job.id}-{job.kind}.part'
+    try:
+        with open(partial, 'w', newline='', encoding='utf-8') as output:
+            extension, content_type = REPORT_WRITERS[job.kind](serializer.validated_data, output)
+        name = f'{job.id}-{job.kind}.{extension}'
+        os.replace(partial, directory / name)
+    finally:
+        partial.unlink(missing_ok=True)
+    return name, content_type
+
+
+def run_report_job(job_id):
+    """
+    Compute a pending job, run by report_runner in a worker process. The
+    job is claimed with a conditional update so it is never run twice, and
+    a failure is recorded on the job rather than raised in the worker
+    """
+    claimed = ReportJob.objects.filter(pk=job_id, status=ReportJob.PENDING).update(
+        status=ReportJob.RUNNING, started_at=timezone.now(), updated_at=timezone.now())
+    if not claimed:
+        return
+    job = ReportJob.objects.get(pk=job_id)
+    try:
+        result_file, content_type = build_report(job)
+    except Exception as error:
+        logger.exception('report job %s failed', job_id)
+        ReportJob.objects.filter(pk=job_id).update(
+            status=ReportJob.FAILED, error=str(error), finished_at=timezone.now(), updated_at=timezone.now())
+        return
+    ReportJob.objects.filter(pk=job_id).update(
+        status=ReportJob.DONE, result_file=result_file, content_type=content_type, finished_at=timezone.now(),
+        updated_at=timezone.now())
@@ -0,0 +1,28 @@
+from django.conf import settings
+
+
+def archive_database():
+    return getattr(settings, 'ACTIVITY_ARCHIVE_DATABASE', 'default')
+
+
+class ActivityArchiveRouter:
+    """
+    Keep tracker.ArchivedProjectActivity in the ACTIVITY_ARCHIVE_DATABASE,
+    the default database unless the archive is split out, and nothing else
+    there
+    """
+    model_name = 'archivedprojectactivity'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.model_name == self.model_name:
+            return archive_database()
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if model_name == self.model_name:
+            return db == archive_database()
+        if db == archive_database() != 'default':
+            return False
+        return None
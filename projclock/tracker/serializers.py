@@ -1,21 +1,227 @@
+import zoneinfo
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
-from tracker.models import Project, ProjectActivity
+from employee.models import Employee
+from tracker.cache import is_project_member
+from tracker.models import Project, ProjectActivity, ReportJob
+from utils.analytics import BUCKET_INTERVALS, format_seconds
+from utils.export import format_datetime
+from utils.instrumentation import TimedSerializerMixin
 
+MAX_BUCKET_RANGE_DAYS = 3660
+MAX_BULK_ACTIVITIES = 5000
+RUNNING_ACTIVITY_MESSAGE = 'You already have a running activity, stop it before starting another one.'
 
-class ProjectSerializer(serializers.ModelSerializer):
+
+class ProjectSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     is_completed = serializers.ReadOnlyField()
+    member_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Project
-        fields = '__all__'
+        exclude = ('created_at', 'updated_at')
         extra_kwargs = {'title': {'required': False},'description': {'required': False},'technology': {'required': False},'members': {'required': False}}
 
+    def get_member_count(self, project):
+        # annotated by Project.objects.with_members(), created and updated projects count their members
+        if hasattr(project, 'member_count'):
+            return project.member_count
+        return len(project.members.all())
+
+
+class MemberSummarySerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Employee
+        fields = ('id', 'username')
 
 
-class ProjectActivitySerializer(serializers.ModelSerializer):
+class ProjectMemberSummarySerializer(ProjectSerializer):
+    """the project read with the id and username of its members, ?expand=members"""
+    members = MemberSummarySerializer(many=True, read_only=True)
+
+
+
+class ProjectActivitySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     is_running = serializers.ReadOnlyField()
     duration = serializers.ReadOnlyField()
+    duration_seconds = serializers.ReadOnlyField()
     
     class Meta:
         model = ProjectActivity
-        fields = '__all__'
\ No newline at end of file
+        exclude = ('created_at', 'updated_at')
+
+    def validate(self, data):
+        # the unique running index still guards against two requests starting activities at once
+        if getattr(settings, 'SINGLE_RUNNING_ACTIVITY', False):
+            end_time = data['end_time'] if 'end_time' in data else getattr(self.instance, 'end_time', None)
+            user = data.get('user', getattr(self.instance, 'user', None))
+            if end_time is None and user is not None:
+                running = ProjectActivity.objects.running().filter(user=user)
+                if self.instance is not None:
+                    running = running.exclude(pk=self.instance.pk)
+                if running.exists():
+                    raise serializers.ValidationError({'end_time': [RUNNING_ACTIVITY_MESSAGE]})
+        return data
+
+
+class ProjectActivityValuesSerializer(TimedSerializerMixin, serializers.BaseSerializer):
+    """
+    Serialize the values() rows of activities with the output of
+    ProjectActivitySerializer, without its per field machinery. Only the
+    fields asked for are serialized and only the columns they need fetched,
+    the rows come from ProjectActivity.objects.with_duration().
+    """
+    # output fields, in the order of ProjectActivitySerializer, and the columns they are computed from
+    field_columns = {
+        'id': ('id',),
+        'is_running': ('end_time',),
+        'duration': ('duration_seconds',),
+        'duration_seconds': ('duration_seconds',),
+        'description': ('description',),
+        'start_time': ('start_time',),
+        'end_time': ('end_time',),
+        'project': ('project_id',),
+        'user': ('user_id',),
+    }
+
+    def __init__(self, instance=None, fields=None, **kwargs):
+        super().__init__(instance, **kwargs)
+        if fields is None:
+            self.selected = tuple(self.field_columns)
+        else:
+            unknown = sorted(set(fields) - set(self.field_columns))
+            if unknown:
+                raise serializers.ValidationError({'fields': [f"Unknown fields: {', '.join(unknown)}."]})
+            self.selected = tuple(field for field in self.field_columns if field in fields)
+
+    def get_columns(self, *required):
+        """the columns to fetch for the selected fields, plus the required ones"""
+        columns = dict.fromkeys(required)
+        for field in self.selected:
+            columns.update(dict.fromkeys(self.field_columns[field]))
+        return tuple(columns)
+
+    def to_representation(self, rows):
+        formatters = {
+            'id': lambda row: row['id'],
+            'is_running': lambda row: row['end_time'] is None,
+            'duration': lambda row: format_seconds(row['duration_seconds']),
+            'duration_seconds': lambda row: row['duration_seconds'],
+            'description': lambda row: row['description'],
+            'start_time': lambda row: format_datetime(row['start_time']),
+            'end_time': lambda row: format_datetime(row['end_time']),
+            'project': lambda row: row['project_id'],
+            'user': lambda row: row['user_id'],
+        }
+        selected = [(field, formatters[field]) for field in self.selected]
+        return [{field: format(row) for field, format in selected} for row in rows]
+
+
+class ProjectActivityBulkItemSerializer(serializers.Serializer):
+    """
+    one activity of a bulk upload, the project and user are plain ids so the
+    membership of the whole batch can be checked with a single query
+    """
+    project = serializers.IntegerField(min_value=1)
+    user = serializers.IntegerField(min_value=1)
+    description = serializers.CharField(max_length=400, required=False, allow_blank=True, default='')
+    start_time = serializers.DateTimeField(required=False)
+    end_time = serializers.DateTimeField(required=False, allow_null=True, default=None)
+
+    def validate(self, data):
+        if data['end_time'] is None:
+            return data
+        # without a start_time the activity is stamped with the current time when it is created
+        if data.get('start_time') is None and data['end_time'] < timezone.now():
+            raise serializers.ValidationError('end_time can not be in the past without a start_time')
+        if data.get('start_time') and data['end_time'] < data['start_time']:
+            raise serializers.ValidationError('end_time can not be before start_time')
+        return data
+
+
+class ActivityBucketQuerySerializer(serializers.Serializer):
+    interval = serializers.ChoiceField(choices=BUCKET_INTERVALS, default='day')
+    start = serializers.DateField()
+    end = serializers.DateField()
+    tz = serializers.CharField(default='UTC')
+    project = serializers.IntegerField(required=False)
+    user = serializers.IntegerField(required=False)
+
+    def validate_tz(self, value):
+        try:
+            return zoneinfo.ZoneInfo(value)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            raise serializers.ValidationError(f'Unknown timezone {value}')
+
+    def validate(self, data):
+        if data['start'] > data['end']:
+            raise serializers.ValidationError('start must be on or before end')
+        if (data['end'] - data['start']).days > MAX_BUCKET_RANGE_DAYS:
+            raise serializers.ValidationError(f'The date range can not be longer than {MAX_BUCKET_RANGE_DAYS} days')
+        return data
+
+
+class ActivityExportQuerySerializer(serializers.Serializer):
+    project = serializers.IntegerField(required=False)
+    user = serializers.IntegerField(required=False)
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if data.get('start') and data.get('end') and data['start'] > data['end']:
+            raise serializers.ValidationError('start must be on or before end')
+        return data
+
+
+class ActivityExportJobSerializer(ActivityExportQuerySerializer):
+    format = serializers.ChoiceField(choices=['csv', 'ndjson'], default='csv')
+
+
+class ProjectTotalsJobSerializer(serializers.Serializer):
+    project = serializers.IntegerField()
+
+    def validate_project(self, value):
+        if not Project.objects.filter(pk=value).exists():
+            raise serializers.ValidationError(f'Unknown project {value}')
+        return value
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    """
+    A report job, the params are validated by the serializer of its kind and
+    stored the way that serializer represents them. Staff report on anything,
+    other users export their own activities and total the projects they are
+    members of
+    """
+    params_serializers = {
+        ReportJob.PROJECT_TOTALS: ProjectTotalsJobSerializer,
+        ReportJob.ACTIVITY_EXPORT: ActivityExportJobSerializer,
+    }
+
+    class Meta:
+        model = ReportJob
+        fields = ('id', 'kind', 'params', 'status', 'error', 'created_at', 'started_at', 'finished_at')
+        read_only_fields = ('status', 'error', 'created_at', 'started_at', 'finished_at')
+        extra_kwargs = {'params': {'required': False}}
+
+    def validate(self, data):
+        user = self.context['request'].user
+        params = data.get('params') or {}
+        if not isinstance(params, dict):
+            raise serializers.ValidationError({'params': ['Expected an object of parameters.']})
+        params = dict(params)
+        if data['kind'] == ReportJob.ACTIVITY_EXPORT and not user.is_staff:
+            params.setdefault('user', user.id)
+        serializer = self.params_serializers[data['kind']](data=params)
+        if not serializer.is_valid():
+            raise serializers.ValidationError({'params': serializer.errors})
+        if (data['kind'] == ReportJob.ACTIVITY_EXPORT and not user.is_staff
+                and serializer.validated_data['user'] != user.id):
+            raise serializers.ValidationError({'params': ['You can only export your own activities.']})
+        if (data['kind'] == ReportJob.PROJECT_TOTALS and not user.is_staff
+                and not is_project_member(user.id, serializer.validated_data['project'])):
+            raise serializers.ValidationError({'params': ['You are not a member of this project.']})
+        data['params'] = serializer.data
+        return data
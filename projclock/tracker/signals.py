@@ -0,0 +1,96 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from employee.models import Employee
+from tracker.cache import bump_project_versions, invalidate_project_membership, invalidate_user_membership
+from tracker.models import ArchivedProjectActivity, Project, ReportJob
+from tracker.reports import get_result_path
+
+
+@receiver(m2m_changed, sender=Project.members.through)
+def invalidate_changed_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drop the cached memberships touched by a change of Project.members, from
+    either side of the relation
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        invalidate_user_membership(instance.pk)
+    else:
+        invalidate_project_membership(instance.pk)
+
+
+def change_projects(project_ids):
+    """
+    Bump the versions and the updated_at of projects whose members changed
+    without saving the project
+    """
+    project_ids = list(project_ids)
+    Project.objects.filter(pk__in=project_ids).update(updated_at=timezone.now())
+    bump_project_versions(project_ids)
+
+
+@receiver(m2m_changed, sender=Project.members.through)
+def change_membership_projects(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Mark the projects whose members changed as changed, from either side of
+    the relation, the projects of a cleared employee are read before the clear
+    """
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            change_projects([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        change_projects(pk_set)
+    elif action == 'pre_clear':
+        change_projects(instance.all_members.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_project(sender, instance, **kwargs):
+    """
+    Drop the cached memberships of a saved or deleted project, a new project
+    can reuse the id of a deleted one, and bump its version
+    """
+    invalidate_project_membership(instance.pk)
+    bump_project_versions([instance.pk])
+
+
+@receiver(pre_delete, sender=Employee)
+def change_deleted_member_projects(sender, instance, **kwargs):
+    """
+    Deleting an employee removes it from the members of its projects without
+    an m2m_changed signal, mark those projects as changed
+    """
+    change_projects(instance.all_members.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Employee)
+def change_renamed_member_projects(sender, instance, created, update_fields, **kwargs):
+    """
+    The member summaries of the projects show the username of their members,
+    mark the projects of a saved employee as changed unless its username was
+    left out of the update
+    """
+    if created or (update_fields is not None and 'username' not in update_fields):
+        return
+    change_projects(instance.all_members.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Employee)
+def delete_archived_activities(sender, instance, **kwargs):
+    """
+    The archived activities only hold the ids of their project and user, they
+    may live in another database, delete them with their project or user
+    """
+    field = 'project_id' if sender is Project else 'user_id'
+    ArchivedProjectActivity.objects.filter(**{field: instance.pk}).delete()
+
+
+@receiver(post_delete, sender=ReportJob)
+def delete_report_result(sender, instance, **kwargs):
+    """remove the result file of a deleted report job, the jobs of deleted users included"""
+    if instance.result_file:
+        get_result_path(instance).unlink(missing_ok=True)
@@ -1,12 +1,47 @@
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework import status
-from tracker.models import Project
+from datetime import date, datetime, timedelta, timezone
+import asyncio
+import json
+import re
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from io import StringIO
+from employee.models import Employee
+from tracker.models import (ArchivedProjectActivity, Project, ProjectActivity, ProjectActivityRollup, ReportJob,
+                            SINGLE_RUNNING_ACTIVITY_CONSTRAINT)
+from tracker.reports import get_result_path, run_report_job
+from utils.jobs import JobRunner
+from tracker.cache import get_project_versions, is_project_member, membership_cache, project_response_cache
+from tracker.filters import ProjectActivityFilter, ProjectFilter
+from tracker.serializers import ProjectActivitySerializer, RUNNING_ACTIVITY_MESSAGE
+from projclock.asgi import application
+from utils.benchmark import asgi_request
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import Sum
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
 from django.urls import reverse
+from django.utils.http import http_date
+from employee import urls as employee_urls
+from tracker import urls as tracker_urls
 
 
 class TestProjectHelper(APITestCase):
     """a class that contains helper method to be used by other classes"""
 
+    def setUp(self):
+        # cached responses outlive the rolled back data of the previous test
+        project_response_cache.clear()
+
     def authenticate_admin(self):
         """
         a function to create a new user and authenticate it.
@@ -174,6 +209,129 @@ class TestProjectUserCase(TestProjectHelper):
         response = self.client.delete(reverse('delete_project', kwargs={'pk': response.data['id']}), format='json')
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
+    def test_project_reads_are_served_from_the_cache(self):
+        """a second read of an unchanged project should not query the database"""
+        self.authenticate_admin()
+        project_id = self.create_project().data['id']
+        self.client.get(reverse('list_a_project', kwargs={'id': project_id}))
+        self.client.get(reverse('list_projects'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('list_a_project', kwargs={'id': project_id}))
+            self.assertEqual(response.data[0]['title'], 'Test Project')
+            response = self.client.get(reverse('list_projects'))
+            self.assertEqual(len(response.data['results']), 1)
+
+    def test_unchanged_project_is_answered_not_modified(self):
+        """the ETag of a project should validate until the project or its members change"""
+        self.authenticate_admin()
+        project_id = self.create_project().data['id']
+        response = self.client.get(reverse('list_a_project', kwargs={'id': project_id}))
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+
+        response = self.client.get(reverse('list_a_project', kwargs={'id': project_id}), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        member = Employee.objects.create_user('member', 'member@user.com', 'password')
+        Project.objects.get(pk=project_id).members.add(member)
+        response = self.client.get(reverse('list_a_project', kwargs={'id': project_id}), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['members'], [1, member.id])
+
+    def test_project_changes_are_never_served_stale(self):
+        """updates, deletions and membership changes should bump the versions of the cached reads"""
+        self.authenticate_admin()
+        project_id = self.create_project().data['id']
+        self.client.get(reverse('list_a_project', kwargs={'id': project_id}))
+        self.client.get(reverse('list_my_projects'))
+
+        self.client.patch(reverse('update_project', kwargs={'pk': project_id}), {'title': 'Renamed'}, format='json')
+        response = self.client.get(reverse('list_a_project', kwargs={'id': project_id}))
+        self.assertEqual(response.data[0]['title'], 'Renamed')
+
+        Project.objects.get(pk=project_id).members.clear()
+        response = self.client.get(reverse('list_my_projects'))
+        self.assertEqual(response.data, [])
+        Employee.objects.get(username='admin').all_members.add(project_id)
+        response = self.client.get(reverse('list_my_projects'))
+        self.assertEqual([project['id'] for project in response.data], [project_id])
+
+        member = Employee.objects.create_user('member', 'member@user.com', 'password')
+        Project.objects.get(pk=project_id).members.add(member)
+        self.client.get(reverse('list_a_project', kwargs={'id': project_id}))
+        member.delete()
+        response = self.client.get(reverse('list_a_project', kwargs={'id': project_id}))
+        self.assertEqual(response.data[0]['members'], [1])
+
+        self.client.delete(reverse('delete_project', kwargs={'pk': project_id}))
+        response = self.client.get(reverse('list_a_project', kwargs={'id': project_id}))
+        self.assertEqual(response.data, [])
+
+    def test_project_versions_are_shared_between_processes(self):
+        """a project changed by another server process should bump the versions this process reads"""
+        versions = get_project_versions(1)
+        subprocess.run(
+            [sys.executable, 'manage.py', 'shell', '-c',
+             'from tracker.cache import bump_project_versions; bump_project_versions([1])'],
+            cwd=settings.BASE_DIR, check=True, capture_output=True)
+        bumped = get_project_versions(1)
+        self.assertGreater(bumped[0], versions[0])
+        self.assertGreater(bumped[1], versions[1])
+
+    def test_project_listings_cost_constant_queries(self):
+        """listing more projects should not run more queries, the members are prefetched"""
+        self.authenticate_admin()
+        admin = Employee.objects.get(username='admin')
+        members = [Employee.objects.create_user(f'member{index}', f'member{index}@user.com', 'password') for index in range(3)]
+
+        def count_queries(url):
+            project_response_cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+
+        urls = [reverse('list_projects'), reverse('list_my_projects'), reverse('list_projects') + '?expand=members']
+        # the first request also loads the user into the authentication cache
+        self.client.get(reverse('user'))
+        project = Project.objects.create(title='first', technology={})
+        project.members.add(admin, *members)
+        counts = [count_queries(url) for url in urls]
+        for index in range(5):
+            Project.objects.create(title=f'project {index}', technology={}).members.add(admin, *members)
+        self.assertEqual([count_queries(url) for url in urls], counts)
+
+    def test_my_projects_lists_each_project_once_with_its_member_count(self):
+        self.authenticate_admin()
+        admin = Employee.objects.get(username='admin')
+        member = Employee.objects.create_user('member', 'member@user.com', 'password')
+        Project.objects.create(title='shared', technology={}).members.add(admin, member)
+        Project.objects.create(title='other', technology={}).members.add(member)
+        response = self.client.get(reverse('list_my_projects'))
+        self.assertEqual([(project['title'], project['member_count']) for project in response.data], [('shared', 2)])
+        self.assertEqual(response.data[0]['members'], [admin.id, member.id])
+
+    def test_member_summary_is_embedded_on_request(self):
+        """?expand=members should embed the id and username of the members, and follow renames"""
+        self.authenticate_admin()
+        project_id = self.create_project().data['id']
+        url = reverse('list_a_project', kwargs={'id': project_id})
+        response = self.client.get(url, {'expand': 'members'})
+        self.assertEqual(response.data[0]['members'], [{'id': 1, 'username': 'admin'}])
+        self.assertEqual(response.data[0]['member_count'], 1)
+        self.assertEqual(self.client.get(url).data[0]['members'], [1])
+
+        admin = Employee.objects.get(username='admin')
+        admin.username = 'renamed'
+        admin.save()
+        # the tokens name their user
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {admin.token}")
+        response = self.client.get(url, {'expand': 'members'})
+        self.assertEqual(response.data[0]['members'], [{'id': 1, 'username': 'renamed'}])
+
+        response = self.client.get(url, {'expand': 'owner'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     
 class TestProjectActivityUserCase(TestProjectHelper):
     """
@@ -210,7 +368,7 @@ class TestProjectActivityUserCase(TestProjectHelper):
         self.create_project_activity()
         response = self.client.get(reverse('list_activities'), format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        response.data = dict(response.data[0])
+        response.data = dict(response.data['results'][0])
         self.assertIsInstance(response.data, dict)
 
     def test_should_delete_activity_when_user_is_activity_owner(self):
@@ -236,3 +394,949 @@ class TestProjectActivityUserCase(TestProjectHelper):
         }
         response = self.client.patch(reverse('update_a_activity', kwargs={'pk': response.data['id']}), update_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_activities_are_walked_with_cursor(self):
+        """test case to test if following the cursors returns every activity once in order"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        self.create_project(single=False)
+        self.authenticate_user()
+        start_time = datetime(2022, 1, 1, tzinfo=timezone.utc)
+        # activities sharing a start time must still be paged by id
+        for index in range(5):
+            activity = ProjectActivity.objects.create(project_id=1, user_id=1)
+            ProjectActivity.objects.filter(id=activity.id).update(start_time=start_time + timedelta(hours=index // 2))
+        ids = []
+        url = reverse('list_activities') + '?page_size=2'
+        while url:
+            response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            ids.extend(activity['id'] for activity in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(ids, list(ProjectActivity.objects.order_by('start_time', 'id').values_list('id', flat=True)))
+
+    def test_invalid_cursor_is_rejected(self):
+        """test case to test if a tampered cursor returns a 404"""
+        self.authenticate_user()
+        response = self.client.get(reverse('list_activities') + '?cursor=notacursor', format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_create_activities_for_member_projects(self):
+        """test case to test if a member can upload many activities at once with their recorded times"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        self.create_project(single=False)
+        self.authenticate_user()
+        request_data = [
+            {'project': 1, 'user': 1, 'description': 'first', 'start_time': '2022-01-01T08:00:00Z', 'end_time': '2022-01-01T10:00:00Z'},
+            {'project': 1, 'user': 1, 'description': 'second', 'start_time': '2022-01-02T08:00:00Z'},
+        ]
+        response = self.client.post(reverse('bulk_add_activities'), request_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([activity['description'] for activity in response.data], ['first', 'second'])
+        self.assertEqual(ProjectActivity.objects.get(description='second').start_time, datetime(2022, 1, 2, 8, tzinfo=timezone.utc))
+        self.assertEqual(ProjectActivityRollup.objects.get().duration_seconds, 2 * 3600)
+
+    def test_bulk_create_reports_errors_per_activity(self):
+        """test case to test if a batch with an invalid activity is rejected with the error at its index"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        self.create_project(single=False)
+        self.authenticate_user()
+        request_data = [
+            {'project': 1, 'user': 1},
+            {'project': 2, 'user': 1},
+            {'project': 1, 'user': 2},
+            {'project': 1},
+            {'project': 1, 'user': 1, 'end_time': '2022-01-01T10:00:00Z'},
+        ]
+        response = self.client.post(reverse('bulk_add_activities'), request_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.data['errors']
+        self.assertEqual(errors[0], {})
+        self.assertIn('project', errors[1])
+        self.assertIn('user', errors[2])
+        self.assertIn('user', errors[3])
+        # the start time would default to now, after the end time
+        self.assertEqual(errors[4]['non_field_errors'], ['end_time can not be in the past without a start_time'])
+        self.assertFalse(ProjectActivity.objects.exists())
+
+    def test_removed_member_can_not_create_activity(self):
+        """test case to test if the cached membership is dropped when the project members change"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        self.create_project(single=False)
+        self.authenticate_user()
+        self.assertEqual(self.create_project_activity().status_code, status.HTTP_201_CREATED)
+        self.authenticate_admin()
+        self.client.patch(reverse('update_project', kwargs={'pk': 1}), {'members': [2]}, format='json')
+        self.authenticate_user()
+        self.assertEqual(self.create_project_activity().status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_membership_cached_before_the_commit_is_dropped_on_commit(self):
+        """a membership read by another request before the change commits should not stay cached"""
+        self.authenticate_admin()
+        project = Project.objects.get(pk=self.create_project().data['id'])
+        with self.captureOnCommitCallbacks(execute=True):
+            project.members.remove(1)
+            # another request reads the committed membership meanwhile
+            membership_cache.get((1, project.pk), lambda key: True)
+        self.assertFalse(is_project_member(1, project.pk))
+
+    def test_unchanged_activities_are_answered_not_modified(self):
+        """a client sending back the ETag of unchanged activities should get a 304 from a single query"""
+        self.authenticate_admin()
+        project_id = self.create_project().data['id']
+        end_time = datetime.now(timezone.utc) + timedelta(hours=1)
+        activity = ProjectActivity.objects.create(project_id=project_id, user_id=1, end_time=end_time)
+        response = self.client.get(reverse('list_activities'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('list_activities'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        self.client.patch(reverse('update_a_activity', kwargs={'pk': activity.id}), {'description': 'changed'}, format='json')
+        response = self.client.get(reverse('list_activities'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['description'], 'changed')
+
+        etag = response['ETag']
+        ProjectActivity.objects.create(project_id=project_id, user_id=1, end_time=end_time)
+        ProjectActivity.objects.filter(pk=activity.id).delete()
+        response = self.client.get(reverse('list_activities'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deleted_activity_is_not_answered_not_modified(self):
+        """a client revalidating with If-Modified-Since only should get the list without the deleted activity"""
+        self.authenticate_admin()
+        project_id = self.create_project().data['id']
+        end_time = datetime.now(timezone.utc) + timedelta(hours=1)
+        kept, deleted = (ProjectActivity.objects.create(project_id=project_id, user_id=1, end_time=end_time) for _ in range(2))
+        response = self.client.get(reverse('list_activities'))
+        self.assertEqual(len(response.data['results']), 2)
+        self.client.delete(reverse('list_update_delete_activity', kwargs={'pk': deleted.id}))
+        since = http_date(datetime.now(timezone.utc).timestamp() + 60)
+        response = self.client.get(reverse('list_activities'), HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([activity['id'] for activity in response.data['results']], [kept.id])
+
+    def test_running_activities_are_not_validated(self):
+        """the duration of a running activity changes, the list should always be sent"""
+        self.authenticate_admin()
+        project_id = self.create_project().data['id']
+        ProjectActivity.objects.create(project_id=project_id, user_id=1)
+        response = self.client.get(reverse('list_activities'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_current_activities_lists_the_running_ones(self):
+        """the current timer should only return the running activities of the caller"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        self.create_project(single=False)
+        self.authenticate_user()
+        running = self.create_project_activity().data['id']
+        closed = self.create_project_activity().data['id']
+        ProjectActivity.objects.filter(pk=closed).update(end_time=datetime.now(timezone.utc))
+        ProjectActivity.objects.create(project_id=1, user_id=2)
+        response = self.client.get(reverse('current_activities'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([activity['id'] for activity in response.data], [running])
+        self.assertTrue(response.data[0]['is_running'])
+
+    def test_current_activities_use_the_running_index(self):
+        plan = ProjectActivity.objects.running().filter(user=1).explain()
+        self.assertIn('activity_running_user_idx', plan)
+
+    def test_stop_my_activities_stops_them_all_with_one_update(self):
+        """stopping should close every running activity of the caller and roll it up"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        self.create_project(single=False)
+        self.authenticate_user()
+        ids = [self.create_project_activity().data['id'] for _ in range(2)]
+        other = ProjectActivity.objects.create(project_id=1, user_id=2)
+        ProjectActivity.objects.filter(pk__in=ids).update(start_time=datetime.now(timezone.utc) - timedelta(hours=1))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('stop_my_activities'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([activity['id'] for activity in response.data], ids)
+        self.assertEqual([activity['duration_seconds'] for activity in response.data], [3600, 3600])
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "tracker_projectactivity"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"end_time" IS NULL', updates[0])
+
+        self.assertFalse(ProjectActivity.objects.running().filter(user=1).exists())
+        self.assertTrue(ProjectActivity.objects.get(pk=other.pk).is_running)
+        self.assertEqual(ProjectActivityRollup.objects.get().duration_seconds, 2 * 3600)
+        response = self.client.post(reverse('stop_my_activities'))
+        self.assertEqual(response.data, [])
+
+    @override_settings(SINGLE_RUNNING_ACTIVITY=True)
+    def test_single_running_activity_per_user(self):
+        """with SINGLE_RUNNING_ACTIVITY a second running activity should be rejected until the first is stopped"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        self.create_project(single=False)
+        self.authenticate_user()
+        self.assertEqual(self.create_project_activity().status_code, status.HTTP_201_CREATED)
+        response = self.create_project_activity()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('end_time', response.data)
+        response = self.client.post(reverse('bulk_add_activities'), [
+            {'project': 1, 'user': 1, 'start_time': '2022-01-01T08:00:00Z', 'end_time': '2022-01-01T10:00:00Z'},
+            {'project': 1, 'user': 1},
+        ], format='json')
+        self.assertEqual(response.data['errors'], [{}, {'end_time': [RUNNING_ACTIVITY_MESSAGE]}])
+
+        self.client.post(reverse('stop_my_activities'))
+        self.assertEqual(self.create_project_activity().status_code, status.HTTP_201_CREATED)
+
+    def test_single_running_activity_index_refuses_a_concurrent_start(self):
+        """two requests passing the serializer check at once should be stopped by the unique partial index"""
+        self.authenticate_admin()
+        project_id = self.create_project().data['id']
+        # the tests build the tables without SINGLE_RUNNING_ACTIVITY, add its index as the table creation would
+        with connection.cursor() as cursor:
+            cursor.execute(str(SINGLE_RUNNING_ACTIVITY_CONSTRAINT.create_sql(ProjectActivity, connection.schema_editor())))
+        ProjectActivity.objects.create(project_id=project_id, user_id=1)
+        ProjectActivity.objects.create(project_id=project_id, user_id=1, end_time=datetime.now(timezone.utc))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ProjectActivity.objects.create(project_id=project_id, user_id=1)
+        self.assertEqual(ProjectActivity.objects.running().filter(user=1).count(), 1)
+
+    def test_activity_listing_matches_the_model_serializer(self):
+        """the values() serialization of the listing should give the output of ProjectActivitySerializer"""
+        self.authenticate_admin()
+        project_id = self.create_project().data['id']
+        end_time = datetime.now(timezone.utc) + timedelta(hours=1, microseconds=1500)
+        ProjectActivity.objects.create(project_id=project_id, user_id=1, description='closed', end_time=end_time)
+        ProjectActivity.objects.create(project_id=project_id, user_id=1, description='other closed', end_time=end_time)
+        response = self.client.get(reverse('list_activities'))
+        expected = ProjectActivitySerializer(ProjectActivity.objects.filter(user=1).order_by('start_time', 'id'), many=True).data
+        self.assertEqual(json.loads(response.content)['results'], json.loads(json.dumps(expected)))
+        self.assertEqual(list(response.data['results'][0]), list(expected[0]))
+
+    def test_activity_listing_sparse_fieldsets(self):
+        """?fields= should only fetch and return the fields asked for, in the usual order"""
+        self.authenticate_admin()
+        project_id = self.create_project().data['id']
+        for _ in range(2):
+            ProjectActivity.objects.create(project_id=project_id, user_id=1, end_time=datetime.now(timezone.utc))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('list_activities'), {'fields': 'duration,id', 'page_size': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data['results'][0]), ['id', 'duration'])
+        self.assertNotIn('description', queries[-1]['sql'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(list(response.data['results'][0]), ['id', 'duration'])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(reverse('list_activities'), {'fields': 'id,title'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['fields'], ['Unknown fields: title.'])
+
+
+class TestProjectAnalyticsUseCase(TestProjectHelper):
+    """
+    test case to test the project analytics endpoints
+
+    """
+    def create_closed_activity(self, project_id, user_id, hours, start_time=datetime(2022, 1, 1, tzinfo=timezone.utc)):
+        """method to create a finished activity lasting the given hours"""
+        activity = ProjectActivity.objects.create(project_id=project_id, user_id=user_id, description='Closed Activity')
+        ProjectActivity.objects.filter(id=activity.id).update(start_time=start_time, end_time=start_time + timedelta(hours=hours))
+        activity.refresh_from_db()
+        ProjectActivityRollup.objects.refresh_activity(activity)
+        return activity
+
+    def test_total_time_of_project_without_activities_is_zero(self):
+        """an empty project should report zero time instead of failing"""
+        self.authenticate_admin()
+        response = self.create_project()
+        response = self.client.get(reverse('total_project_activity_time', kwargs={'project': response.data['id']}), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_time'], '0:00:00')
+
+    def test_total_time_sums_all_project_activities(self):
+        """the project total should add up the activities of every member"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        project = self.create_project(single=False).data['id']
+        self.create_closed_activity(project, 1, 2)
+        self.create_closed_activity(project, 2, 3)
+        response = self.client.get(reverse('total_project_activity_time', kwargs={'project': project}), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'total_time': '5:00:00', 'total_seconds': 5 * 3600, 'project': project})
+
+    def test_individual_time_only_counts_user_activities(self):
+        """the individual total should only add up the activities of the given user"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        project = self.create_project(single=False).data['id']
+        self.create_closed_activity(project, 1, 2)
+        self.create_closed_activity(project, 2, 3)
+        response = self.client.get(reverse('total_individual_project_activity_time', kwargs={'user': 1, 'project': project}), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'total_time': '2:00:00', 'total_seconds': 2 * 3600, 'user': 1, 'project': project})
+
+    def test_closing_activity_updates_rollup(self):
+        """closing an activity through the api should roll up its time"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        self.create_project(single=False)
+        self.authenticate_user()
+        response = self.create_project_activity()
+        self.assertFalse(ProjectActivityRollup.objects.exists())
+        end_time = datetime.now(timezone.utc) + timedelta(hours=1)
+        self.client.patch(reverse('update_a_activity', kwargs={'pk': response.data['id']}), {'end_time': end_time.isoformat()}, format='json')
+        rollup = ProjectActivityRollup.objects.get(project_id=1, user_id=1)
+        self.assertGreaterEqual(rollup.duration_seconds, 59 * 60)
+
+    def test_deleting_activity_removes_rollup(self):
+        """deleting the only activity of a day should remove its rollup"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        project = self.create_project(single=False).data['id']
+        activity = self.create_closed_activity(project, 1, 2)
+        self.authenticate_user()
+        self.assertTrue(ProjectActivityRollup.objects.exists())
+        self.client.delete(reverse('list_update_delete_activity', kwargs={'pk': activity.id}), format='json')
+        self.assertFalse(ProjectActivityRollup.objects.exists())
+
+    def test_rebuild_command_recreates_rollups(self):
+        """the rebuild command should recreate the rollups from the activities"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        project = self.create_project(single=False).data['id']
+        self.create_closed_activity(project, 1, 2)
+        self.create_closed_activity(project, 1, 1)
+        self.create_closed_activity(project, 2, 3)
+        ProjectActivityRollup.objects.all().delete()
+        call_command('rebuild_activity_rollups', stdout=StringIO())
+        self.assertEqual(ProjectActivityRollup.objects.count(), 2)
+        self.assertEqual(ProjectActivityRollup.objects.get(user_id=1).duration_seconds, 3 * 3600)
+
+    def test_buckets_split_activities_crossing_midnight(self):
+        """an activity running over midnight should be split between both days"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        project = self.create_project(single=False).data['id']
+        self.create_closed_activity(project, 1, 1, datetime(2022, 1, 1, 10, tzinfo=timezone.utc))
+        self.create_closed_activity(project, 1, 4, datetime(2022, 1, 1, 22, tzinfo=timezone.utc))
+        query = {'interval': 'day', 'start': '2022-01-01', 'end': '2022-01-03', 'project': project}
+        response = self.client.get(reverse('bucketed_activity_time'), query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([bucket['total_seconds'] for bucket in response.data['buckets']], [3 * 3600, 2 * 3600, 0])
+        self.assertEqual(response.data['buckets'][0]['start'], '2022-01-01T00:00:00+00:00')
+
+    def test_buckets_use_requested_timezone_and_interval(self):
+        """weekly buckets should start on monday midnight of the requested timezone"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        project = self.create_project(single=False).data['id']
+        # sunday 23:00 UTC is already monday in Berlin
+        self.create_closed_activity(project, 1, 2, datetime(2022, 1, 2, 23, tzinfo=timezone.utc))
+        query = {'interval': 'week', 'start': '2021-12-27', 'end': '2022-01-09', 'tz': 'Europe/Berlin', 'user': 1}
+        response = self.client.get(reverse('bucketed_activity_time'), query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([bucket['start'] for bucket in response.data['buckets']], ['2021-12-27T00:00:00+01:00', '2022-01-03T00:00:00+01:00'])
+        self.assertEqual([bucket['total_seconds'] for bucket in response.data['buckets']], [0, 2 * 3600])
+
+    def test_buckets_count_activities_started_before_the_range(self):
+        """activities started before the range should be split into its first buckets, running ones however old"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        project = self.create_project(single=False).data['id']
+        self.create_closed_activity(project, 1, 4, datetime(2021, 12, 31, 22, tzinfo=timezone.utc))
+        running = ProjectActivity.objects.create(project_id=project, user_id=2)
+        ProjectActivity.objects.filter(id=running.id).update(start_time=datetime(2021, 10, 1, tzinfo=timezone.utc))
+        query = {'interval': 'day', 'start': '2022-01-01', 'end': '2022-01-02', 'project': project}
+        response = self.client.get(reverse('bucketed_activity_time'), query)
+        self.assertEqual([bucket['total_seconds'] for bucket in response.data['buckets']], [26 * 3600, 24 * 3600])
+
+    def test_buckets_split_long_activities_however_early_they_started(self):
+        """a stopped 40 days timer should count in the buckets it covers, as in the totals"""
+        self.authenticate_admin()
+        project = self.create_project().data['id']
+        self.create_closed_activity(project, 1, 40 * 24, datetime(2021, 11, 24, tzinfo=timezone.utc))
+        query = {'interval': 'day', 'start': '2022-01-01', 'end': '2022-01-02', 'project': project}
+        response = self.client.get(reverse('bucketed_activity_time'), query)
+        self.assertEqual([bucket['total_seconds'] for bucket in response.data['buckets']], [24 * 3600, 24 * 3600])
+
+    def test_buckets_of_outsiders_are_limited_to_their_own_time(self):
+        """users should not read the time series of projects they are not members of or of other users"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        project = self.create_project().data['id']
+        self.create_closed_activity(project, 1, 2)
+        outsider = Employee.objects.create_user('outsider', 'outsider@user.com', 'outsider')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {outsider.token}")
+        query = {'start': '2022-01-01', 'end': '2022-01-01'}
+        response = self.client.get(reverse('bucketed_activity_time'), dict(query, user=1))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(reverse('bucketed_activity_time'), dict(query, project=project, user=1))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(reverse('bucketed_activity_time'), dict(query, project=project))
+        self.assertEqual(response.data['user'], outsider.id)
+        self.assertEqual(response.data['buckets'][0]['total_seconds'], 0)
+
+    def test_buckets_reject_invalid_query(self):
+        """unknown intervals, timezones and reversed ranges should be rejected"""
+        self.authenticate_admin()
+        for query in ({'interval': 'year', 'start': '2022-01-01', 'end': '2022-01-02'},
+                      {'tz': 'Mars/Olympus', 'start': '2022-01-01', 'end': '2022-01-02'},
+                      {'start': '2022-01-02', 'end': '2022-01-01'}):
+            response = self.client.get(reverse('bucketed_activity_time'), query)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_durations_are_whole_seconds_from_listing_to_totals(self):
+        """the totals should add up the duration_seconds listed for each activity"""
+        self.authenticate_admin()
+        project = self.create_project().data['id']
+        start_time = datetime(2022, 1, 1, tzinfo=timezone.utc)
+        for index in range(2):
+            activity = ProjectActivity.objects.create(project_id=project, user_id=1)
+            ProjectActivity.objects.filter(id=activity.id).update(
+                start_time=start_time + timedelta(minutes=index), end_time=start_time + timedelta(minutes=index, seconds=1.4))
+        ProjectActivityRollup.objects.rebuild()
+        listed = self.client.get(reverse('list_activities')).data['results']
+        self.assertEqual([(item['duration'], item['duration_seconds']) for item in listed], [('0:00:01', 1)] * 2)
+        activity.refresh_from_db()
+        self.assertEqual(ProjectActivity.objects.with_duration().get(id=activity.id).duration_seconds, activity.duration_seconds)
+
+        response = self.client.get(reverse('total_project_activity_time', kwargs={'project': project}))
+        self.assertEqual(response.data['total_seconds'], 2)
+        self.assertEqual(response.data['total_time'], '0:00:02')
+        response = self.client.get(reverse('bucketed_activity_time'), {'interval': 'day', 'start': '2022-01-01', 'end': '2022-01-01'})
+        self.assertEqual(response.data['buckets'][0]['total_seconds'], 2)
+
+    def test_archived_activities_are_counted_by_the_analytics(self):
+        """archiving should move old closed activities out of the activity table without changing any total"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        project = self.create_project(single=False).data['id']
+        for day in range(1, 6):
+            self.create_closed_activity(project, 1, 1, start_time=datetime(2022, 1, day, 23, tzinfo=timezone.utc))
+        recent = self.create_closed_activity(project, 2, 3, start_time=datetime.now(timezone.utc) - timedelta(days=3))
+        running = ProjectActivity.objects.create(project_id=project, user_id=1)
+        buckets_url = reverse('bucketed_activity_time')
+        buckets_params = {'interval': 'day', 'start': '2022-01-01', 'end': '2022-01-06', 'project': project}
+        totals = [
+            self.client.get(reverse('total_project_activity_time', kwargs={'project': project})).data['total_seconds'],
+            self.client.get(buckets_url, buckets_params).data['buckets'],
+        ]
+
+        out = StringIO()
+        call_command('archive_activities', days=30, batch_size=2, stdout=out)
+        self.assertIn('Archived 5 activities', out.getvalue())
+        self.assertEqual(sorted(ProjectActivity.objects.values_list('id', flat=True)), [recent.id, running.id])
+        self.assertEqual(ArchivedProjectActivity.objects.count(), 5)
+        self.assertEqual(ArchivedProjectActivity.objects.aggregate(Sum('duration_seconds'))['duration_seconds__sum'], 5 * 3600)
+
+        response = self.client.get(reverse('total_project_activity_time', kwargs={'project': project}))
+        # the running activity may have grown by a second meanwhile
+        self.assertAlmostEqual(response.data['total_seconds'], totals[0], delta=1)
+        self.assertEqual(self.client.get(buckets_url, buckets_params).data['buckets'], totals[1])
+        # a bucket holding archived activities is refreshed with them
+        self.create_closed_activity(project, 1, 1, start_time=datetime(2022, 1, 1, 8, tzinfo=timezone.utc))
+        self.assertEqual(ProjectActivityRollup.objects.get(day=date(2022, 1, 1)).duration_seconds, 2 * 3600)
+        call_command('rebuild_activity_rollups', stdout=StringIO())
+        self.assertEqual(ProjectActivityRollup.objects.get(day=date(2022, 1, 1)).duration_seconds, 2 * 3600)
+
+        lines = b''.join(self.client.get(reverse('export_activities', kwargs={'export_format': 'csv'}),
+                                         {'user': 1, 'end': '2022-01-02T00:00:00Z'}).streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([line.split(',')[4] for line in lines[1:]], ['2022-01-01T08:00:00Z', '2022-01-01T23:00:00Z'])
+
+        Project.objects.get(pk=project).delete()
+        self.assertFalse(ArchivedProjectActivity.objects.exists())
+
+    def test_archive_dry_run_moves_nothing(self):
+        self.authenticate_admin()
+        project = self.create_project().data['id']
+        self.create_closed_activity(project, 1, 1)
+        out = StringIO()
+        call_command('archive_activities', before=datetime(2023, 1, 1), dry_run=True, stdout=out)
+        self.assertIn('1 activities closed before 2023-01-01', out.getvalue())
+        self.assertEqual(ProjectActivity.objects.count(), 1)
+
+    def test_export_streams_filtered_activities_as_csv(self):
+        """the csv export should stream the activities matching the filters"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        project = self.create_project(single=False).data['id']
+        self.create_closed_activity(project, 1, 2)
+        self.create_closed_activity(project, 2, 3)
+        response = self.client.get(reverse('export_activities', kwargs={'export_format': 'csv'}), {'user': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines, [
+            'id,project,user,description,start_time,end_time,is_running,duration,duration_seconds',
+            f'1,{project},1,Closed Activity,2022-01-01T00:00:00Z,2022-01-01T02:00:00Z,False,2:00:00,7200',
+        ])
+
+    def test_export_streams_activities_as_ndjson(self):
+        """the ndjson export should match the activity listing fields"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        project = self.create_project(single=False).data['id']
+        self.create_closed_activity(project, 1, 2)
+        self.create_closed_activity(project, 2, 3, datetime(2022, 2, 1, tzinfo=timezone.utc))
+        query = {'start': '2022-01-15T00:00:00Z'}
+        response = self.client.get(reverse('export_activities', kwargs={'export_format': 'ndjson'}), query)
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['duration'], '3:00:00')
+        self.assertEqual(records[0]['end_time'], '2022-02-01T03:00:00Z')
+        response = self.client.get(reverse('export_activities', kwargs={'export_format': 'xml'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestReportJobsUseCase(TestProjectHelper):
+    """test case to test the report jobs, computed in the submitting request as REPORT_JOBS_WORKERS is 0"""
+
+    def setUp(self):
+        super().setUp()
+        self.reports = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(REPORT_JOBS_WORKERS=0, REPORT_JOBS_DIR=self.reports))
+
+    def login(self, email, password):
+        response = self.client.post(reverse("login"), {'email': email, 'password': password}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['token']}")
+
+    def create_closed_activity(self, project_id, user_id, hours):
+        start_time = datetime(2022, 1, 1, tzinfo=timezone.utc)
+        activity = ProjectActivity.objects.create(project_id=project_id, user_id=user_id, description='Closed Activity')
+        ProjectActivity.objects.filter(id=activity.id).update(start_time=start_time, end_time=start_time + timedelta(hours=hours))
+        activity.refresh_from_db()
+        ProjectActivityRollup.objects.refresh_activity(activity)
+
+    def test_project_totals_report_is_polled_and_downloaded(self):
+        """a submitted report should be accepted, done and its json result downloadable"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        project = self.create_project(single=False).data['id']
+        self.create_closed_activity(project, 1, 2)
+        self.create_closed_activity(project, 2, 3)
+        response = self.client.post(reverse('submit_report'), {'kind': 'project_totals', 'params': {'project': project}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], ReportJob.DONE)
+        response = self.client.get(reverse('report_job', kwargs={'pk': response.data['id']}))
+        self.assertEqual(response.data['status'], ReportJob.DONE)
+        response = self.client.get(reverse('report_result', kwargs={'pk': response.data['id']}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        result = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(result['total_seconds'], 5 * 3600)
+        self.assertEqual(result['users'], [
+            {'user': 1, 'total_time': '2:00:00', 'total_seconds': 7200},
+            {'user': 2, 'total_time': '3:00:00', 'total_seconds': 10800},
+        ])
+
+    def test_activity_export_report_of_a_user_is_limited_to_their_activities(self):
+        """non staff users should only export their own activities and see their own jobs"""
+        self.authenticate_user()
+        self.authenticate_admin()
+        project = self.create_project(single=False).data['id']
+        self.create_closed_activity(project, 1, 2)
+        self.create_closed_activity(project, 2, 3)
+        admin_job = self.client.post(reverse('submit_report'), {'kind': 'project_totals', 'params': {'project': project}}, format='json')
+        self.login('test@user.com', 'testpassword')
+        response = self.client.post(reverse('submit_report'), {'kind': 'activity_export', 'params': {'user': 2}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('submit_report'), {'kind': 'activity_export', 'params': {'format': 'ndjson'}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['params'], {'user': 1, 'format': 'ndjson'})
+        response = self.client.get(reverse('report_result', kwargs={'pk': response.data['id']}))
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual([record['user'] for record in records], [1])
+        response = self.client.get(reverse('report_job', kwargs={'pk': admin_job.data['id']}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(reverse('submit_report'), {'kind': 'timesheet', 'params': {}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_pending_jobs_are_run_by_the_command(self):
+        """a pending job should have no result until run, a failing job should record its error"""
+        self.authenticate_admin()
+        project = self.create_project().data['id']
+        job = ReportJob.objects.create(user_id=1, kind=ReportJob.PROJECT_TOTALS, params={'project': project})
+        broken = ReportJob.objects.create(user_id=1, kind=ReportJob.ACTIVITY_EXPORT, params={'format': 'xml'})
+        response = self.client.get(reverse('report_result', kwargs={'pk': job.id}))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        out = StringIO()
+        with self.assertLogs('tracker.reports', 'ERROR'):
+            call_command('run_report_jobs', stdout=out)
+        self.assertIn('Ran 2 report jobs, 1 failed', out.getvalue())
+        broken.refresh_from_db()
+        self.assertEqual(broken.status, ReportJob.FAILED)
+        self.assertIn('format', broken.error)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.DONE)
+        response = self.client.get(reverse('report_result', kwargs={'pk': job.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # a job is claimed once, running it again does nothing
+        run_report_job(job.id)
+        path = get_result_path(job)
+        self.assertTrue(path.exists())
+        job.delete()
+        self.assertFalse(path.exists())
+
+
+class TestReportJobWorkersUseCase(APITransactionTestCase):
+    """
+    test case to test the report jobs run by spawned worker processes, the
+    test database lives in memory so the workers get a copy of it in a file
+    """
+
+    def setUp(self):
+        self.admin = Employee.objects.create_user('admin', 'admin@user.com', 'admin', is_staff=True)
+        self.project = Project.objects.create(title='Reported', technology={})
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(REPORT_JOBS_WORKERS=1))
+
+    def tearDown(self):
+        # the workers wrote the results in the REPORT_JOBS_DIR of the settings
+        for job in ReportJob.objects.using('workers').exclude(result_file=''):
+            get_result_path(job).unlink(missing_ok=True)
+        connections['workers'].close()
+        del connections['workers']
+        del connections.settings['workers']
+
+    def copy_database(self):
+        """copy the test database to the file the workers use, read back through the workers alias"""
+        path = os.path.join(self.directory, 'workers.sqlite3')
+        connection.ensure_connection()
+        destination = sqlite3.connect(path)
+        try:
+            connection.connection.backup(destination)
+        finally:
+            destination.close()
+        connections.settings['workers'] = dict(connections.settings['default'], NAME=path)
+        return {'default': connections.settings['workers']}
+
+    def wait_for_status(self, job, expected):
+        for _ in range(300):
+            job_status = ReportJob.objects.using('workers').filter(pk=job.pk).values_list('status', flat=True).get()
+            if job_status == expected:
+                return
+            time.sleep(0.1)
+        self.fail(f'job {job.pk} is {job_status}, not {expected}')
+
+    def test_jobs_are_run_by_worker_processes_once_committed(self):
+        """a job should be handed to a worker on commit, and a dead worker replaced by a new pool"""
+        jobs = [ReportJob.objects.create(user=self.admin, kind=ReportJob.PROJECT_TOTALS, params={'project': self.project.id})
+                for _ in range(2)]
+        runner = JobRunner('REPORT_JOBS_WORKERS', databases=self.copy_database())
+        self.addCleanup(runner.shutdown)
+
+        with transaction.atomic():
+            runner.submit(run_report_job, jobs[0].id)
+            self.assertIsNone(runner._executor)
+        self.wait_for_status(jobs[0], ReportJob.DONE)
+        self.assertTrue(get_result_path(ReportJob.objects.using('workers').get(pk=jobs[0].pk)).exists())
+        # run by a worker, the test database of this process is untouched
+        self.assertEqual(ReportJob.objects.get(pk=jobs[0].pk).status, ReportJob.PENDING)
+
+        executor = runner.get_executor()
+        for process in list(executor._processes.values()):
+            process.kill()
+        for _ in range(300):
+            if executor._broken:
+                break
+            time.sleep(0.1)
+        runner.submit(run_report_job, jobs[1].id)
+        self.wait_for_status(jobs[1], ReportJob.DONE)
+        self.assertIsNot(runner.get_executor(), executor)
+
+
+class TestReadReplicasUseCase(APITransactionTestCase):
+    """test case to test the routing of the analytics and listings to a read only SQLite replica"""
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = dict(connections.settings['default'], NAME=os.path.join(self.directory.name, 'replica.sqlite3'))
+        replicas = override_settings(DATABASE_REPLICAS=['replica'])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+
+        self.user = Employee.objects.create_user('member', 'member@user.com', 'password')
+        self.project = Project.objects.create(title='Replicated', technology={})
+        self.project.members.add(self.user)
+        self.add_activity('synced')
+        call_command('sync_sqlite_replicas', stdout=StringIO())
+        # written after the copy, the replica lags behind the primary
+        self.add_activity('not synced')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.user.token}")
+
+    def tearDown(self):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        self.directory.cleanup()
+        cache.clear()
+
+    def add_activity(self, description):
+        start_time = datetime(2022, 1, 1, tzinfo=timezone.utc)
+        ProjectActivity.objects.create(project=self.project, user=self.user, description=description)
+        ProjectActivity.objects.filter(description=description).update(start_time=start_time, end_time=start_time + timedelta(hours=1))
+
+    def listed(self):
+        response = self.client.get(reverse('list_activities'), {'fields': 'description'})
+        return [activity['description'] for activity in response.data['results']]
+
+    def test_reads_go_to_the_replica_until_the_user_writes(self):
+        self.assertEqual(self.listed(), ['synced'])
+        response = self.client.get(reverse('bucketed_activity_time'),
+                                   {'start': '2022-01-01', 'end': '2022-01-01', 'project': self.project.id})
+        self.assertEqual(response.data['buckets'][0]['total_seconds'], 3600)
+
+        response = self.client.post(reverse('add_activity'), {'project': self.project.id, 'user': self.user.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(ProjectActivity.objects.using('replica').count(), 1)
+        # the writer reads its own writes from the primary
+        self.assertEqual(len(self.listed()), 3)
+
+        cache.delete(f'replica-sticky:{self.user.id}')
+        self.assertEqual(self.listed(), ['synced'])
+
+    def test_writes_in_another_process_keep_the_reads_on_the_primary(self):
+        """the next read of the writer may be served by another server process"""
+        subprocess.run(
+            [sys.executable, 'manage.py', 'shell', '-c',
+             f'from utils.replicas import mark_primary_sticky; mark_primary_sticky({self.user.id})'],
+            cwd=settings.BASE_DIR, check=True, capture_output=True)
+        self.assertEqual(self.listed(), ['synced', 'not synced'])
+
+    def test_cached_project_reads_stay_on_the_primary(self):
+        """the project reads are cached by version, a lagging replica would be cached until the next change"""
+        Project.objects.create(title='After the copy', technology={}).members.add(self.user)
+        response = self.client.get(reverse('list_my_projects'))
+        self.assertEqual([project['title'] for project in response.data], ['Replicated', 'After the copy'])
+
+
+class TestActivityEventsUseCase(APITransactionTestCase):
+    """
+    test case to test the server sent events of the ASGI application, the
+    stream authenticates from a worker thread so the data has to be committed
+    """
+    def setUp(self):
+        self.member = Employee.objects.create_user('member', 'member@user.com', 'member')
+        self.outsider = Employee.objects.create_user('outsider', 'outsider@user.com', 'outsider')
+        self.project = Project.objects.create(title='Test Project', technology={'technology': 'Python'})
+        self.project.members.add(self.member)
+
+    def test_member_receives_activity_events(self):
+        """starting and stopping an activity should be pushed to the project stream"""
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.member.token}")
+
+        async def scenario():
+            messages = asyncio.Queue()
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            scope = {'type': 'http', 'method': 'GET', 'path': f'/api/events/project/{self.project.id}', 'query_string': b'',
+                     'headers': [(b'authorization', f'Bearer {self.member.token}'.encode())]}
+            stream = asyncio.ensure_future(application(scope, receive, messages.put))
+            start = await asyncio.wait_for(messages.get(), 5)
+            self.assertEqual(start['status'], 200)
+            await asyncio.wait_for(messages.get(), 5)  # the connected comment
+
+            request_data = {'project': self.project.id, 'user': self.member.id, 'description': 'Live Activity'}
+            response = await sync_to_async(self.client.post, thread_sensitive=False)(reverse('add_activity'), request_data, format='json')
+            started = (await asyncio.wait_for(messages.get(), 5))['body'].decode('utf-8')
+            end_time = datetime.now(timezone.utc).isoformat()
+            await sync_to_async(self.client.patch, thread_sensitive=False)(
+                reverse('update_a_activity', kwargs={'pk': response.data['id']}), {'end_time': end_time}, format='json')
+            stopped = (await asyncio.wait_for(messages.get(), 5))['body'].decode('utf-8')
+
+            disconnect.set()
+            await asyncio.wait_for(stream, 5)
+            return started, stopped
+
+        started, stopped = asyncio.run(scenario())
+        self.assertTrue(started.startswith('event: start\n'))
+        self.assertEqual(json.loads(started.split('data: ', 1)[1])['description'], 'Live Activity')
+        self.assertTrue(stopped.startswith('event: stop\n'))
+        self.assertFalse(json.loads(stopped.split('data: ', 1)[1])['is_running'])
+
+    def test_stream_requires_project_member(self):
+        """the stream should refuse missing tokens and users outside the project"""
+        url = f'/api/events/project/{self.project.id}'
+        status_code, _ = asyncio.run(asgi_request(application, 'GET', url))
+        self.assertEqual(status_code, status.HTTP_401_UNAUTHORIZED)
+        status_code, _ = asyncio.run(asgi_request(application, 'GET', url, self.outsider.token))
+        self.assertEqual(status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_browser_stream_authenticates_with_a_stream_token(self):
+        """an EventSource, which can not send headers, should connect with a stream token of the project"""
+        url = f'/api/events/project/{self.project.id}'
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.outsider.token}")
+        response = self.client.post(reverse('activity_events_token', kwargs={'project': self.project.id}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.member.token}")
+        response = self.client.post(reverse('activity_events_token', kwargs={'project': self.project.id}))
+        self.assertEqual(response.data['expires_in'], settings.JWT_STREAM_TOKEN_LIFETIME)
+
+        status_code, body = asyncio.run(asgi_request(application, 'GET', f"{url}?token={response.data['token']}"))
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertTrue(body.startswith(b': connected'))
+        # the token of another project, or an access token in the query string, are refused
+        other = Project.objects.create(title='Other Project', technology={})
+        other.members.add(self.member)
+        status_code, _ = asyncio.run(asgi_request(application, 'GET', f'/api/events/project/{other.id}?token={response.data["token"]}'))
+        self.assertEqual(status_code, status.HTTP_403_FORBIDDEN)
+        status_code, _ = asyncio.run(asgi_request(application, 'GET', f'{url}?token={self.member.token}'))
+        self.assertEqual(status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TestListingFiltersUseCase(TestProjectHelper):
+    """test case to test the filters of the activity and project listings, and the plans of their queries"""
+
+    # a value of every filter of tracker.filters, a new filter needs an entry to be checked
+    activity_filters = {
+        'start_time': {'start_time_after': '2022-01-01T00:00:00Z', 'start_time_before': '2022-02-01T00:00:00Z'},
+        'end_time': {'end_time_after': '2022-01-01T00:00:00Z', 'end_time_before': '2022-02-01T00:00:00Z'},
+        'project': {'project': 1},
+        'running': {'running': 'false'},
+    }
+    project_filters = {
+        'start_date': {'start_date_after': '2022-01-01', 'start_date_before': '2022-12-31'},
+        'end_date': {'end_date_after': '2022-01-01', 'end_date_before': '2022-12-31'},
+        'completed': {'completed': 'true'},
+        'technology': {'technology': 'python'},
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate_user()
+        self.authenticate_admin()
+        self.create_project(single=False)
+        Project.objects.create(title='Go Project', technology={'technology': 'Go'}, start_date='2022-03-01',
+                               end_date='2022-06-01').members.add(1, 2)
+        ProjectActivity.objects.bulk_create([
+            ProjectActivity(project_id=1, user_id=1, description='january', end_time=datetime(2022, 1, 10, 10, tzinfo=timezone.utc)),
+            ProjectActivity(project_id=2, user_id=1, description='march', end_time=datetime(2022, 3, 10, 10, tzinfo=timezone.utc)),
+            ProjectActivity(project_id=2, user_id=1, description='running'),
+            ProjectActivity(project_id=1, user_id=2, description='other user'),
+        ])
+        for description, day in (('january', datetime(2022, 1, 10, 8, tzinfo=timezone.utc)),
+                                 ('march', datetime(2022, 3, 10, 8, tzinfo=timezone.utc))):
+            ProjectActivity.objects.filter(description=description).update(start_time=day)
+
+    def get_results(self, name, params):
+        project_response_cache.clear()
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results'] if isinstance(response.data, dict) else response.data
+
+    def test_activities_are_filtered(self):
+        self.authenticate_user()
+        cases = [
+            ({'start_time_after': '2022-01-01T00:00:00Z', 'start_time_before': '2022-02-01T00:00:00Z'}, ['january']),
+            ({'end_time_before': '2022-04-01T00:00:00Z'}, ['january', 'march']),
+            ({'project': 2}, ['march', 'running']),
+            ({'running': 'true'}, ['running']),
+            ({'running': 'false', 'project': 2}, ['march']),
+        ]
+        for params, expected in cases:
+            results = self.get_results('list_activities', dict(params, fields='description'))
+            self.assertEqual([activity['description'] for activity in results], expected, params)
+        response = self.client.get(reverse('list_activities'), {'start_time_after': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_projects_are_filtered(self):
+        cases = [
+            ({'start_date_after': '2022-01-01'}, ['Go Project']),
+            ({'completed': 'true'}, ['Go Project']),
+            ({'completed': 'false'}, ['Test Project']),
+            ({'technology': 'python'}, ['Test Project']),
+            ({'end_date_before': '2022-12-31'}, ['Go Project']),
+        ]
+        for name in ('list_projects', 'list_my_projects'):
+            for params, expected in cases:
+                self.assertEqual([project['title'] for project in self.get_results(name, params)], expected, params)
+        response = self.client.get(reverse('list_projects'), {'start_date_after': '2022-13-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def assertIndexedPlans(self, name, params, table, indexed=True):
+        """
+        every query of the listing on the table should search an index, or walk
+        the index of the keyset order without sorting the whole table. The
+        validators of a listing not narrowed by an indexed filter aggregate
+        every row, only its page query is checked
+        """
+        project_response_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse(name), params).status_code, status.HTTP_200_OK)
+        statements = [query['sql'] for query in queries if query['sql'].startswith('SELECT') and f'FROM "{table}"' in query['sql']
+                      and (indexed or 'ORDER BY' in query['sql'])]
+        self.assertTrue(statements)
+        for sql in statements:
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = '\n'.join(row[-1] for row in cursor.fetchall())
+            access = [line for line in plan.splitlines() if re.search(rf'(SCAN|SEARCH) {table}\b', line)]
+            for line in access:
+                self.assertRegex(line, rf'SEARCH {table} |SCAN {table} USING (COVERING )?INDEX', f'{params}\n{sql}\n{plan}')
+            if any(line.startswith('SCAN') for line in access):
+                self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan, f'{params}\n{sql}\n{plan}')
+
+    def test_activity_filters_use_indexes(self):
+        self.assertEqual(set(ProjectActivityFilter.base_filters), set(self.activity_filters))
+        self.authenticate_user()
+        for params in [{}] + list(self.activity_filters.values()):
+            self.assertIndexedPlans('list_activities', params, 'tracker_projectactivity')
+
+    def test_project_filters_use_indexes(self):
+        self.assertEqual(set(ProjectFilter.base_filters), set(self.project_filters))
+        self.assertIndexedPlans('list_projects', {}, 'tracker_project', indexed=False)
+        self.assertIndexedPlans('list_my_projects', {}, 'tracker_project')
+        for name in ('list_projects', 'list_my_projects'):
+            for params in self.project_filters.values():
+                self.assertIndexedPlans(name, params, 'tracker_project')
+
+
+class TestIndexBenchmarkUseCase(APITestCase):
+    """test case to test the index benchmark command"""
+
+    def test_benchmark_reports_plans_using_the_indexes(self):
+        """the plans after adding the indexes should use them"""
+        out = StringIO()
+        call_command('benchmark_indexes', activities=300, users=5, projects=3, repeat=1, stdout=out)
+        self.assertIn('activity_user_start_idx', out.getvalue())
+        self.assertIn('activity_running_user_idx', out.getvalue())
+
+
+class TestApiBenchmarkUseCase(APITestCase):
+    """test case to test the api benchmark command"""
+
+    def test_benchmark_drives_every_endpoint(self):
+        """every endpoint should be benchmarked without errors and written to the json results"""
+        # the command swaps the default database, run it in its own process to keep the test database untouched
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            subprocess.run(
+                [sys.executable, 'manage.py', 'benchmark_api', '--users', '5', '--projects', '3', '--members', '3',
+                 '--activities', '300', '--requests', '3', '--concurrency', '2', '--output', output],
+                cwd=settings.BASE_DIR, check=True, capture_output=True)
+            with open(output) as results_file:
+                results = json.load(results_file)
+        url_names = {pattern.name for pattern in tracker_urls.urlpatterns + employee_urls.urlpatterns}
+        self.assertEqual(set(results['endpoints']), url_names)
+        for name, result in results['endpoints'].items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertEqual(result['requests'], 3)
+            self.assertLessEqual(result['latency_ms']['p50'], result['latency_ms']['p99'])
+        self.assertEqual(results['endpoints']['list_activities']['queries']['mean'], 2)
@@ -12,10 +12,20 @@ urlpatterns = [
     path('project/delete/<int:pk>', views.DeleteProjectApiview.as_view(), name='delete_project'),
     ############# ProjectActivity #############
     path('create/activity', views.CreateProjectActivityApiview.as_view(), name='add_activity'),
+    path('create/activities', views.BulkCreateProjectActivityApiview.as_view(), name='bulk_add_activities'),
     path('activitys', views.RetriveProjectsActivitiesApiView.as_view(), name='list_activities'),
+    path('activity/current', views.RetriveCurrentActivitiesApiView.as_view(), name='current_activities'),
+    path('activity/stop', views.StopMyActivitiesApiView.as_view(), name='stop_my_activities'),
     path('activity/update/<int:pk>', views.UpdateProjectActivityApiview.as_view(), name='update_a_activity'),
     path('activity/delete/<int:pk>', views.DestroyProjectActivityApiview.as_view(), name='list_update_delete_activity'),
     path('analytics/activity/duration/<int:user>/<int:project>', views.GetIndividualProjectActivityTime.as_view(), name='total_individual_project_activity_time'),
     path('analytics/activity/duration/<int:project>', views.GetTotalProjectActivityTime.as_view(), name='total_project_activity_time'),
+    path('export/activities/<str:export_format>', views.ExportProjectActivitiesApiView.as_view(), name='export_activities'),
+    path('analytics/activity/buckets', views.GetBucketedProjectActivityTime.as_view(), name='bucketed_activity_time'),
+    path('project/<int:project>/events/token', views.ActivityEventsTokenApiView.as_view(), name='activity_events_token'),
+    ############# Report jobs #############
+    path('reports', views.SubmitReportJobApiView.as_view(), name='submit_report'),
+    path('reports/<int:pk>', views.RetriveReportJobApiView.as_view(), name='report_job'),
+    path('reports/<int:pk>/result', views.ReportJobResultApiView.as_view(), name='report_result'),
 
 ]
\ No newline at end of file
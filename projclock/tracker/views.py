@@ -1,16 +1,57 @@
-from django.db.models import F
-from django.db.models.functions import Coalesce, Now
-from rest_framework.generics import (CreateAPIView, DestroyAPIView, ListAPIView, UpdateAPIView)
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import serializers, status
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.generics import (CreateAPIView, DestroyAPIView, GenericAPIView, ListAPIView, RetrieveAPIView, UpdateAPIView)
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
-from tracker.serializers import (ProjectSerializer, ProjectActivitySerializer)
-from tracker.models import Project, ProjectActivity
+from tracker.serializers import (ProjectSerializer, ProjectMemberSummarySerializer, ProjectActivitySerializer, ProjectActivityBulkItemSerializer,
+                                 ProjectActivityValuesSerializer, ActivityBucketQuerySerializer, ActivityExportQuerySerializer,
+                                 ReportJobSerializer, MAX_BULK_ACTIVITIES, RUNNING_ACTIVITY_MESSAGE)
+from tracker.filters import ProjectActivityFilter, ProjectFilter
+from tracker.models import ArchivedProjectActivity, Project, ProjectActivity, ProjectActivityRollup, ReportJob
+from tracker.pagination import ProjectPagination, ProjectActivityPagination
+from tracker.events import publish_activity_event
+from tracker.reports import activity_export_rows, get_result_path, report_runner, run_report_job
+from tracker.cache import ProjectResponseCacheMixin, is_project_member, project_response_key
 from employee.permissions import IsOwner, IsProjectMember, IsCurrentUser, IsProjectActive
-from utils.analytics import get_total_project_activity_time, get_individual_project_activity_time
+from utils.analytics import get_total_project_activity_time, get_individual_project_activity_time, get_bucketed_activity_time
+from utils.conditional import ConditionalListMixin
+from utils.export import ACTIVITY_EXPORT_FIELDS, EXPORT_CONTENT_TYPES, activity_records, stream_csv, stream_ndjson
+from utils.replicas import ReplicaReadMixin
 
 ########################### Project ###########################
 
+class ProjectReadMixin(ProjectResponseCacheMixin):
+    """
+    Project reads prefetch the members of the projects and annotate their
+    count, a page costs the same queries whatever its size.
+    ?expand=members embeds the id and username of every member instead of its id
+    """
+    expandable = ('members',)
+    expand = frozenset()
+
+    def list(self, request, *args, **kwargs):
+        expand = {name.strip() for name in request.query_params.get('expand', '').split(',') if name.strip()}
+        unknown = sorted(expand - set(self.expandable))
+        if unknown:
+            raise serializers.ValidationError({'expand': [f"Unknown expansions: {', '.join(unknown)}."]})
+        self.expand = frozenset(expand)
+        return super().list(request, *args, **kwargs)
+
+    def get_serializer_class(self):
+        if 'members' in self.expand:
+            return ProjectMemberSummarySerializer
+        return ProjectSerializer
+
+    def get_projects(self):
+        return Project.objects.with_members(summary='members' in self.expand)
+
+
 class CreateProjectApiview(CreateAPIView):
     """Create a new project object, and return the created object.
     permission_classes = "IsAuthenticated" :user is logged in , "IsAdminUser" : user is admin
@@ -51,7 +92,7 @@ class CreateProjectApiview(CreateAPIView):
         return serializer.save()
 
 
-class RetriveMyProjectsApiView(ListAPIView):
+class RetriveMyProjectsApiView(ProjectReadMixin, ListAPIView):
     """Retrive all projects that the logged in user is a member of.
     permission_classes = "IsAuthenticated" :user is logged in
     Get: /api/projects
@@ -66,45 +107,77 @@ class RetriveMyProjectsApiView(ListAPIView):
     },
     "start_date": "2022-01-01",
     "end_date": null,
-    "members": [1, 4, 2]
+    "members": [1, 4, 2],
+    "member_count": 3
     }
+    with ?expand=members the members are {"id": 1, "username": "a"}
+    filtered by tracker.filters.ProjectFilter, e.g. ?start_date_after=2022-01-01&completed=false&technology=python
 
     Error Response:{
          "status_code": 401,
             "detail": "You do not have permission to perform this action." """
     serializer_class = ProjectSerializer
     permission_classes = (IsAuthenticated,) # protect the endpoint
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = ProjectFilter
+    date_dependent = True # is_completed
 
     
     def get_queryset(self):
-        return Project.objects.filter(members=self.request.user)
+        return self.get_projects().of_member(self.request.user)
 
-class RetriveProjectsApiView(ListAPIView):
+    def get_response_cache_key(self):
+        # the filters and expansions are in the query string
+        return project_response_key('my_projects', self.request.user.pk, self.request.get_full_path())
+
+class RetriveProjectsApiView(ProjectReadMixin, ListAPIView):
     """
     Retrive all projects.
     permission_classes = "IsAuthenticated" :user is logged in, "IsAdminUser" : user is admin
+    Results are paged by (start_date, id), follow "next" to get the next page
+    Endpoint GET api/projects?page_size=100&cursor=<cursor from the previous page>&expand=members
+    filtered by tracker.filters.ProjectFilter, e.g. ?start_date_after=2022-01-01&completed=false&technology=python
+    The response carries an ETag, send it back in If-None-Match to get a 304 Not Modified while the
+    projects are unchanged
+    Response{
+        "first": "http://host/api/projects",
+        "next": "http://host/api/projects?cursor=WyIyMDIyLTAxLTAxIiwgM10%3D",
+        "results": [...]
+        }
     
     Error Response:{
             "status_code": 403,
     """
     serializer_class = ProjectSerializer
     permission_classes = (IsAuthenticated, IsAdminUser) # protect the endpoint
+    pagination_class = ProjectPagination
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = ProjectFilter
+    date_dependent = True # is_completed
 
     
     def get_queryset(self):
-        return Project.objects.all()
+        return self.get_projects()
+
+    def get_response_cache_key(self):
+        # the page links are absolute urls
+        return project_response_key('projects', self.request.build_absolute_uri())
     
-class RetriveOneProjectApiview(ListAPIView):
+class RetriveOneProjectApiview(ProjectReadMixin, ListAPIView):
     """
     Retrive one project.
     permission_classes = "IsAuthenticated" :user is logged in, "IsAdminUser" : user is admin
     """
     serializer_class = ProjectSerializer
     permission_classes = (IsAuthenticated, ) # protect the endpoint
+    date_dependent = True # is_completed
 
     
     def get_queryset(self):
-        return Project.objects.filter(id=self.kwargs['id'])
+        return self.get_projects().filter(id=self.kwargs['id'])
+
+    def get_response_cache_key(self):
+        return project_response_key('project', *sorted(self.expand), project_id=self.kwargs['id'])
 
 
 class UpdateProjectApiview(UpdateAPIView):
@@ -173,23 +246,165 @@ class CreateProjectActivityApiview(CreateAPIView):
 
 
     def perform_create(self, serializer):
-        data = self.request.data
-        project = Project.objects.filter(id=data['project']).prefetch_related('members')
-        self.check_object_permissions(self.request, project)
-        return serializer.save()
+        self.check_object_permissions(self.request, serializer.validated_data['project'])
+        activity = serializer.save()
+        if not activity.is_running:
+            ProjectActivityRollup.objects.refresh_activity(activity)
+        publish_activity_event('start' if activity.is_running else 'create', activity)
+        return activity
+
+class BulkCreateProjectActivityApiview(GenericAPIView):
+    """
+    Create many project activities at once, used by clients syncing activities recorded offline.
+    permission_classes = "IsAuthenticated" :user is logged in, every activity must belong to the current user
+    and to a project the user is a member of, checked for the whole batch with a single query.
+    The batch is inserted in one transaction, if any activity is invalid nothing is created.
+    Endpoint POST api/create/activities
+    Request body:[
+        {"user": 1, "project": 3, "description": "payment endpoint", "start_time": "2022-01-01T08:00:00Z", "end_time": "2022-01-01T10:00:00Z"},
+        {"user": 1, "project": 4, "start_time": "2022-01-01T10:00:00Z"}
+    ]
+    Response: the created activities, in the order they were sent
+
+    Error Response:{
+        "errors": [
+            {},
+            {"project": ["You are not a member or part of the team working on this project, so you cant create an activity for it."]}
+        ]
+        }
+    """
+    serializer_class = ProjectActivityBulkItemSerializer
+    permission_classes = (IsAuthenticated,) # protect the endpoint
 
-class RetriveProjectsActivitiesApiView(ListAPIView):
+    def post(self, request, *args, **kwargs):
+        if not isinstance(request.data, list) or not request.data:
+            return Response({'detail': 'Expected a non empty list of activities'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > MAX_BULK_ACTIVITIES:
+            return Response({'detail': f'At most {MAX_BULK_ACTIVITIES} activities can be sent at once'}, status=status.HTTP_400_BAD_REQUEST)
+
+        items, errors = [], []
+        for data in request.data:
+            serializer = self.get_serializer(data=data)
+            items.append(serializer.validated_data if serializer.is_valid() else None)
+            errors.append(serializer.errors)
+
+        project_ids = {item['project'] for item in items if item is not None}
+        member_of = set(Project.members.through.objects.filter(
+            project_id__in=project_ids, employee_id=request.user.id).values_list('project_id', flat=True))
+        for index, item in enumerate(items):
+            if item is None:
+                continue
+            if item['user'] != request.user.id:
+                errors[index] = {'user': [IsCurrentUser.message]}
+            elif item['project'] not in member_of:
+                errors[index] = {'project': [IsProjectMember.message]}
+        if getattr(settings, 'SINGLE_RUNNING_ACTIVITY', False):
+            running = ProjectActivity.objects.running().filter(user=request.user).exists()
+            for index, item in enumerate(items):
+                if item is None or errors[index] or item['end_time'] is not None:
+                    continue
+                if running:
+                    errors[index] = {'end_time': [RUNNING_ACTIVITY_MESSAGE]}
+                running = True
+        if any(errors):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        activities = self.perform_bulk_create(items)
+        return Response(ProjectActivitySerializer(activities, many=True).data, status=status.HTTP_201_CREATED)
+
+    @transaction.atomic
+    def perform_bulk_create(self, items):
+        activities = [
+            ProjectActivity(project_id=item['project'], user_id=item['user'], description=item['description'], end_time=item['end_time'])
+            for item in items
+        ]
+        activities = ProjectActivity.objects.bulk_create(activities, batch_size=500)
+        # start_time is auto_now_add so bulk_create stamped every row with the current time,
+        # put back the recorded start times with a batched UPDATE
+        recorded = []
+        for activity, item in zip(activities, items):
+            if item.get('start_time') is not None:
+                activity.start_time = item['start_time']
+                recorded.append(activity)
+        ProjectActivity.objects.bulk_update(recorded, ['start_time'], batch_size=500)
+        ProjectActivityRollup.objects.refresh_activities(activity for activity in activities if not activity.is_running)
+        for activity in activities:
+            publish_activity_event('start' if activity.is_running else 'create', activity)
+        return activities
+
+class RetriveProjectsActivitiesApiView(ReplicaReadMixin, ConditionalListMixin, ListAPIView):
     """
     Retrive all project activities by current user
     permission_classes = "IsAuthenticated" :user is logged in
+    Results are paged by (start_time, id), follow "next" to get the next page
+    Endpoint GET api/activitys?page_size=100&cursor=<cursor from the previous page>&fields=id,duration
+    fields is an optional comma separated list of the fields to return, all of them by default
+    filtered by tracker.filters.ProjectActivityFilter, e.g. ?start_time_after=2022-01-01T00:00:00Z&project=3&running=false
+    The response carries an ETag unless an activity is running, send it back in If-None-Match to get
+    a 304 Not Modified while the activities are unchanged
+    Read from a replica of DATABASE_REPLICAS, unless the user wrote in the last REPLICA_STICKY_SECONDS
     """
     serializer_class = ProjectActivitySerializer
     permission_classes = (IsAuthenticated,) # protect the endpoint
+    pagination_class = ProjectActivityPagination
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = ProjectActivityFilter
 
 
     def get_queryset(self):
         return ProjectActivity.objects.filter(user=self.request.user)
 
+    def get_validator_aggregates(self):
+        return {'running': Count('pk', filter=Q(end_time__isnull=True))}
+
+    def is_representation_stable(self, state):
+        # the duration of a running activity grows with every request
+        return not state['running']
+
+    def list(self, request, *args, **kwargs):
+        fields = [field.strip() for field in request.query_params.get('fields', '').split(',') if field.strip()]
+        self.values_serializer = ProjectActivityValuesSerializer(fields=fields or None)
+        return super().list(request, *args, **kwargs)
+
+    def get_list_response(self, request, *args, **kwargs):
+        # rows are fetched with values() and serialized without the model serializer, the pagination needs start_time and id
+        queryset = self.filter_queryset(self.get_queryset()).with_duration().values(
+            *self.values_serializer.get_columns('start_time', 'id'))
+        self.values_serializer.instance = self.paginate_queryset(queryset)
+        return self.get_paginated_response(self.values_serializer.data)
+
+class RetriveCurrentActivitiesApiView(ListAPIView):
+    """
+    Retrive the running activities of the logged in user, read through the
+    partial index of the running activities however long the history is
+    permission_classes = "IsAuthenticated" :user is logged in
+    Endpoint GET api/activity/current
+    Response: [{"id": 4, "is_running": true, "duration": "0:12:03", "duration_seconds": 723, ...}], empty when clocked out
+    """
+    serializer_class = ProjectActivitySerializer
+    permission_classes = (IsAuthenticated,) # protect the endpoint
+    pagination_class = None
+
+    def get_queryset(self):
+        return ProjectActivity.objects.running().filter(user=self.request.user).order_by('start_time', 'id')
+
+class StopMyActivitiesApiView(APIView):
+    """
+    Stop every running activity of the logged in user at once, with a single
+    UPDATE ... WHERE end_time IS NULL
+    permission_classes = "IsAuthenticated" :user is logged in
+    Endpoint POST api/activity/stop
+    Response: the stopped activities, empty when nothing was running
+    """
+    permission_classes = (IsAuthenticated,) # protect the endpoint
+
+    def post(self, request, *args, **kwargs):
+        activities = ProjectActivity.objects.filter(user=request.user).stop()
+        ProjectActivityRollup.objects.refresh_activities(activities)
+        for activity in activities:
+            publish_activity_event('stop', activity)
+        return Response(ProjectActivitySerializer(activities, many=True).data)
+
 class UpdateProjectActivityApiview(UpdateAPIView):
     """
     Update a project activity object, and return the updated object.
@@ -200,7 +415,17 @@ class UpdateProjectActivityApiview(UpdateAPIView):
     queryset = ProjectActivity.objects.all()
     fields = ['description', 'end_time']
     def perform_update(self, serializer):
-        return serializer.save()
+        previous = ProjectActivity.objects.get(id=serializer.instance.id)
+        activity = serializer.save()
+        # refresh both buckets in case the activity moved to another project, user or day
+        ProjectActivityRollup.objects.refresh_activity(previous)
+        ProjectActivityRollup.objects.refresh_activity(activity)
+        if previous.project_id != activity.project_id:
+            publish_activity_event('delete', previous)
+            publish_activity_event('start' if activity.is_running else 'create', activity)
+        else:
+            publish_activity_event('stop' if previous.is_running and not activity.is_running else 'update', activity)
+        return activity
 
 class DestroyProjectActivityApiview(DestroyAPIView):
     """
@@ -212,15 +437,19 @@ class DestroyProjectActivityApiview(DestroyAPIView):
     queryset = ProjectActivity.objects.all()
 
     def perform_destroy(self, instance):
-        return instance.delete()
+        publish_activity_event('delete', instance)
+        deleted = instance.delete()
+        ProjectActivityRollup.objects.refresh_activity(instance)
+        return deleted
 
-class GetIndividualProjectActivityTime(APIView):
+class GetIndividualProjectActivityTime(ReplicaReadMixin, APIView):
 
     """
     Retrive the total time spent on a project by a user.
     permission_classes = "IsAuthenticated" :user is logged in, "IsOwner" : user is the owner of the project activity or "IsAdminUser" : user is admin
     Response{
         "total_time": "8 days, 11:08:10",
+        "total_seconds": 731290,
         "user": 1
         }
     """
@@ -228,17 +457,18 @@ class GetIndividualProjectActivityTime(APIView):
     permission_classes = (IsAuthenticated, IsOwner|IsAdminUser) # protect the endpoint
 
     def get(self, request, *args, **kwargs):
-        activities = ProjectActivity.objects.filter(user=self.kwargs['user'], project_id=self.kwargs['project']).annotate(end_or_now=Coalesce('end_time', Now())).annotate(duration=F('end_or_now')-F('start_time'))
-        serializer = ProjectActivitySerializer(activities, many=True)
-        return Response(get_individual_project_activity_time(serializer.data))
+        rollups = ProjectActivityRollup.objects.filter(user=self.kwargs['user'], project_id=self.kwargs['project'])
+        activities = ProjectActivity.objects.filter(user=self.kwargs['user'], project_id=self.kwargs['project'])
+        return Response(get_individual_project_activity_time(rollups, activities, self.kwargs['user'], self.kwargs['project']))
 
-class GetTotalProjectActivityTime(APIView):
+class GetTotalProjectActivityTime(ReplicaReadMixin, APIView):
     """
     Retrive the total time spent on a project by all users.
     permission_classes = "IsAuthenticated" :user is logged in, "IsAdminUser" : user is admin
     
     Response{
         "total_time": "30 days, 11:08:10",
+        "total_seconds": 2632090,
         "project": 1
         }
     """
@@ -246,7 +476,165 @@ class GetTotalProjectActivityTime(APIView):
     permission_classes = (IsAuthenticated, IsOwner|IsAdminUser) # protect the endpoint
 
     def get(self, request, *args, **kwargs):
-        activities = ProjectActivity.objects.filter(project_id=self.kwargs['project']).annotate(end_or_now=Coalesce('end_time', Now())).annotate(duration=F('end_or_now')-F('start_time'))
-        serializer = ProjectActivitySerializer(activities, many=True)
-        
-        return Response(get_total_project_activity_time(serializer.data))
\ No newline at end of file
+        rollups = ProjectActivityRollup.objects.filter(project_id=self.kwargs['project'])
+        activities = ProjectActivity.objects.filter(project_id=self.kwargs['project'])
+        return Response(get_total_project_activity_time(rollups, activities, self.kwargs['project']))
+
+class GetBucketedProjectActivityTime(ReplicaReadMixin, APIView):
+    """
+    Retrive the time spent per day, week or month over a date range, for a project, a user or both.
+    permission_classes = "IsAuthenticated" :user is logged in, admins read any time series, other users read the
+    time of the projects they are members of and their own time, user defaults to them without a project they are member of
+    Endpoint GET api/analytics/activity/buckets?interval=week&start=2022-01-01&end=2022-01-31&tz=Europe/Berlin&project=1&user=1
+    interval is one of day, week (starting on monday) or month and defaults to day, tz defaults to UTC
+
+    Response{
+        "interval": "week",
+        "timezone": "Europe/Berlin",
+        "project": 1,
+        "user": 1,
+        "buckets": [
+            {"start": "2021-12-27T00:00:00+01:00", "total_seconds": 7200, "total_time": "2:00:00"},
+            ...
+        ]
+        }
+    """
+    serializer_class = ActivityBucketQuerySerializer
+    permission_classes = (IsAuthenticated,) # protect the endpoint
+
+    def get(self, request, *args, **kwargs):
+        serializer = ActivityBucketQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        if not request.user.is_staff and not ('project' in params and is_project_member(request.user.id, params['project'])):
+            if params.setdefault('user', request.user.id) != request.user.id:
+                raise PermissionDenied('You can only read your own time or the time of the projects you are a member of.')
+        filters = {f'{name}_id': params[name] for name in ('project', 'user') if name in params}
+        buckets = get_bucketed_activity_time(
+            ProjectActivity.objects.filter(**filters), params['interval'], params['start'], params['end'], params['tz'],
+            archived=ArchivedProjectActivity.objects.filter(**filters))
+        return Response({
+            'interval': params['interval'],
+            'timezone': str(params['tz']),
+            'project': params.get('project'),
+            'user': params.get('user'),
+            'buckets': buckets,
+        })
+
+class ExportProjectActivitiesApiView(APIView):
+    """
+    Stream every activity matching the filters as csv or newline delimited json, ordered by start time.
+    Rows are read from the database in chunks and written out as they come, so memory stays flat
+    whatever the number of exported activities. Archived activities are exported with the others.
+    permission_classes = "IsAuthenticated" :user is logged in, "IsAdminUser" : user is admin
+    Endpoint GET api/export/activities/csv?project=1&user=2&start=2022-01-01T00:00:00Z&end=2022-02-01T00:00:00Z
+    Endpoint GET api/export/activities/ndjson
+    all the filters are optional, start and end filter on the activity start time
+
+    Response (csv):
+        id,project,user,description,start_time,end_time,is_running,duration,duration_seconds
+        1,3,1,developing payment endpoint,2021-12-31T17:26:46.826450Z,2021-12-31T19:26:46.826450Z,False,2:00:00,7200
+    """
+    serializer_class = ActivityExportQuerySerializer
+    permission_classes = (IsAuthenticated, IsAdminUser) # protect the endpoint
+    fields = ACTIVITY_EXPORT_FIELDS
+    content_types = EXPORT_CONTENT_TYPES
+    chunk_size = 2000
+
+    def get(self, request, *args, **kwargs):
+        export_format = self.kwargs['export_format']
+        if export_format not in self.content_types:
+            raise Http404
+        serializer = ActivityExportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        records = activity_records(activity_export_rows(params, chunk_size=self.chunk_size))
+        if export_format == 'csv':
+            content = stream_csv(records, self.fields)
+        else:
+            content = stream_ndjson(records)
+        response = StreamingHttpResponse(content, content_type=self.content_types[export_format])
+        response['Content-Disposition'] = f'attachment; filename="activities.{export_format}"'
+        return response
+
+class ActivityEventsTokenApiView(APIView):
+    """
+    Issue the token of the activity events stream of a project, for browsers whose EventSource can not send an
+    Authorization header. It is sent in the query string, so it only lives JWT_STREAM_TOKEN_LIFETIME seconds,
+    connect right away: GET api/events/project/1?token=<token>
+    permission_classes = "IsAuthenticated" :user is logged in, a member of the project or an admin
+    Endpoint POST api/project/1/events/token
+    Response{
+        "token": "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9...",
+        "expires_in": 60
+        }
+    """
+    permission_classes = (IsAuthenticated,) # protect the endpoint
+
+    def post(self, request, *args, **kwargs):
+        project_id = self.kwargs['project']
+        if not (request.user.is_staff or is_project_member(request.user.id, project_id)):
+            raise PermissionDenied('You are not a member of this project.')
+        return Response({'token': request.user.stream_token(project_id), 'expires_in': settings.JWT_STREAM_TOKEN_LIFETIME})
+
+########################### Report jobs ###########################
+class ReportJobMixin:
+    """the report jobs of the logged in user, staff see every job"""
+    serializer_class = ReportJobSerializer
+    permission_classes = (IsAuthenticated,) # protect the endpoint
+
+    def get_queryset(self):
+        if self.request.user.is_staff:
+            return ReportJob.objects.all()
+        return ReportJob.objects.filter(user=self.request.user)
+
+class SubmitReportJobApiView(ReportJobMixin, CreateAPIView):
+    """
+    Submit a report computed in the background, out of the web workers, and poll it with report_job.
+    Staff report on anything, other users export their own activities and total the projects they are members of.
+    permission_classes = "IsAuthenticated" :user is logged in
+    Endpoint POST api/reports
+    Request{"kind": "project_totals", "params": {"project": 1}}
+    Request{"kind": "activity_export", "params": {"format": "ndjson", "project": 1, "start": "2022-01-01T00:00:00Z"}}
+    the params of an activity export are the filters of export_activities, plus format (csv or ndjson)
+
+    Response (202){"id": 7, "kind": "project_totals", "params": {"project": 1}, "status": "pending", ...}
+    """
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+    def perform_create(self, serializer):
+        job = serializer.save(user=self.request.user)
+        # queued once the job is committed, or run right away when REPORT_JOBS_WORKERS is 0
+        report_runner.submit(run_report_job, job.id)
+        job.refresh_from_db()
+
+class RetriveReportJobApiView(ReportJobMixin, RetrieveAPIView):
+    """
+    Retrive the status of a report job, one of pending, running, done or failed (with the error).
+    permission_classes = "IsAuthenticated" :user is logged in and submitted the job, or is admin
+    Endpoint GET api/reports/7
+    Response{"id": 7, "kind": "project_totals", "params": {"project": 1}, "status": "done", "error": "", ...}
+    """
+
+class ReportJobResultApiView(ReportJobMixin, RetrieveAPIView):
+    """
+    Download the result of a done report job, json for project totals, csv or ndjson for an activity export.
+    permission_classes = "IsAuthenticated" :user is logged in and submitted the job, or is admin
+    Endpoint GET api/reports/7/result
+    Response (409) while the job is not done
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        job = self.get_object()
+        if job.status != ReportJob.DONE:
+            return Response({'detail': f'The report is {job.status}, it has no result.', 'status': job.status},
+                            status=status.HTTP_409_CONFLICT)
+        path = get_result_path(job)
+        if not path.exists():
+            raise Http404
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=job.result_file, content_type=job.content_type)
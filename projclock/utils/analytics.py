@@ -1,31 +1,192 @@
-import operator
-from functools import reduce
-from datetime import timedelta
+from bisect import bisect_right
+from itertools import chain
+from datetime import date, datetime, time, timedelta
+from django.db.models import BigIntegerField, DateTimeField, DurationField, ExpressionWrapper, F, Func, Q, Sum
+from django.db.models.functions import Coalesce, Now, Trunc
+from django.utils import timezone
 
+BUCKET_INTERVALS = ('day', 'week', 'month')
 
-def get_total_project_activity_time(activity_data):
+
+def activity_duration_expression():
+    """
+    Build the sql expression for the duration of an activity, running
+    activities are measured up to the current time
+    """
+    return ExpressionWrapper(Coalesce('end_time', Now()) - F('start_time'), output_field=DurationField())
+
+
+class DurationSeconds(Func):
+    """
+    Round a duration expression to whole seconds, durations are microseconds
+    on SQLite and MySQL and intervals on PostgreSQL
+    """
+    output_field = BigIntegerField()
+    template = 'CAST(ROUND(%(expressions)s / 1000000.0) AS INTEGER)'
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='CAST(ROUND(%(expressions)s / 1000000.0) AS SIGNED)', **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='CAST(ROUND(EXTRACT(EPOCH FROM %(expressions)s)) AS BIGINT)', **extra_context)
+
+
+def activity_duration_seconds_expression():
+    """
+    Build the sql expression for the duration of an activity in whole
+    seconds, the value of ProjectActivity.duration_seconds
+    """
+    return DurationSeconds(activity_duration_expression())
+
+
+def format_seconds(seconds):
+    """
+    Format whole seconds like ProjectActivity.duration, 'H:MM:SS'
+    """
+    return str(timedelta(seconds=seconds))
+
+
+def get_activity_seconds(activities):
+    """
+    Sum the duration of the given activities in whole seconds with a single sql SUM
+
+    Returns:
+        int: total seconds, zero when there are no activities
+    """
+    return activities.aggregate(total=Sum(activity_duration_seconds_expression()))['total'] or 0
+
+
+def get_rollup_seconds(rollups, activities):
+    """
+    Sum the rolled up seconds of closed activities and add the running
+    activities, which are not rolled up yet, at read time
+
+    Returns:
+        int: total seconds, zero when there is nothing tracked
+    """
+    closed = rollups.aggregate(total=Sum('duration_seconds'))['total'] or 0
+    return closed + get_activity_seconds(activities.filter(end_time__isnull=True))
+
+
+def get_total_project_activity_time(rollups, activities, project):
     """
     Get total project activity time
     """
-    sec_list = [ activity['duration'] for activity in activity_data]
-    total_sec = reduce(operator.add, sec_list)
+    total = get_rollup_seconds(rollups, activities)
     activities = {
-        'total_time': str(timedelta(seconds=round(total_sec.total_seconds()))),
-        'project': activity_data[0]['project'],
+        'total_time': format_seconds(total),
+        'total_seconds': total,
+        'project': project,
     }
     return activities
-    
 
-def get_individual_project_activity_time(activity_data):
+
+def get_individual_project_activity_time(rollups, activities, user, project):
     """
-    Get total project activity time
+    Get total project activity time of a single user
     """
-    sec_list = [ activity['duration'] for activity in activity_data]
-    total_sec = reduce(operator.add, sec_list)
+    total = get_rollup_seconds(rollups, activities)
     activities = {
-        'total_time': str(timedelta(seconds=round(total_sec.total_seconds()))),
-        'user': activity_data[0]['user'],
-        'project': activity_data[0]['project'],
+        'total_time': format_seconds(total),
+        'total_seconds': total,
+        'user': user,
+        'project': project,
     }
     return activities
-    
\ No newline at end of file
+
+
+def get_user_activity_seconds(rollups, activities):
+    """
+    Sum the rolled up seconds of closed activities per user and add the
+    running activities of each user, one grouped query each
+
+    Returns:
+        dict: total seconds keyed by user id
+    """
+    totals = dict(rollups.order_by().values_list('user').annotate(total=Sum('duration_seconds')))
+    running = activities.filter(end_time__isnull=True).order_by().values_list('user').annotate(
+        total=Sum(activity_duration_seconds_expression()))
+    for user, seconds in running:
+        totals[user] = totals.get(user, 0) + (seconds or 0)
+    return totals
+
+
+def get_bucket_boundaries(interval, start, end, tzinfo):
+    """
+    Get the aware datetimes delimiting the day, week or month buckets
+    covering the dates from start to end (inclusive) in the given timezone
+
+    Returns:
+        list: len(buckets) + 1 boundaries, each bucket is [boundaries[i], boundaries[i + 1])
+    """
+    if interval == 'week':
+        start = start - timedelta(days=start.weekday())
+    elif interval == 'month':
+        start = start.replace(day=1)
+    boundaries = []
+    current = start
+    while True:
+        boundaries.append(datetime.combine(current, time.min, tzinfo=tzinfo))
+        if current > end:
+            return boundaries
+        if interval == 'day':
+            current = current + timedelta(days=1)
+        elif interval == 'week':
+            current = current + timedelta(weeks=1)
+        else:
+            current = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+
+
+def get_bucketed_activity_time(activities, interval, start, end, tzinfo, archived=None):
+    """
+    Get the time spent on the given activities per day, week or month, adding
+    the archived activities matching the same filters when given
+
+    Activities contained in a single bucket, which is nearly all of them, are
+    summed in whole seconds with a sql GROUP BY on the truncated start time,
+    only activities crossing a bucket boundary are fetched and split between
+    the buckets, each piece rounded so the pieces add up to the activity.
+
+    Returns:
+        list: one {'start', 'total_seconds', 'total_time'} dict per bucket, empty buckets included
+    """
+    boundaries = get_bucket_boundaries(interval, start, end, tzinfo)
+    range_start, range_end = boundaries[0], boundaries[-1]
+    edges = [boundary.timestamp() for boundary in boundaries]
+    totals = [0] * (len(boundaries) - 1)
+    now = timezone.now().timestamp()
+
+    # the archive may live in another database, it is summed on its own
+    for queryset in (activities, archived) if archived is not None else (activities,):
+        queryset = queryset.annotate(
+            bucket=Trunc('start_time', interval, tzinfo=tzinfo),
+            end_bucket=Trunc(Coalesce('end_time', Now()), interval, output_field=DateTimeField(), tzinfo=tzinfo))
+
+        single_bucket = queryset.filter(bucket=F('end_bucket'), start_time__gte=range_start, start_time__lt=range_end)
+        for row in single_bucket.values('bucket').annotate(total=Sum(activity_duration_seconds_expression())).order_by():
+            totals[bisect_right(edges, row['bucket'].timestamp()) - 1] += row['total']
+
+        # the closed activities ending after the start of the range are read through the end time indexes,
+        # however long they last, the running ones through the running partial indexes
+        crossing = queryset.filter(~Q(bucket=F('end_bucket')), end_time__gt=range_start, start_time__lt=range_end)
+        running = queryset.filter(~Q(bucket=F('end_bucket')), end_time__isnull=True, start_time__lt=range_end)
+        rows = chain(*(part.values_list('start_time', 'end_time').order_by().iterator(chunk_size=2000) for part in (crossing, running)))
+        for start_time, end_time in rows:
+            origin = start_time.timestamp()
+            begin = max(origin, edges[0])
+            finish = min(end_time.timestamp() if end_time is not None else now, edges[-1])
+            index = max(bisect_right(edges, begin) - 1, 0)
+            while begin < finish:
+                split = min(edges[index + 1], finish)
+                totals[index] += round(split - origin) - round(begin - origin)
+                begin = split
+                index += 1
+
+    return [
+        {
+            'start': boundaries[index].isoformat(),
+            'total_seconds': total,
+            'total_time': format_seconds(total),
+        }
+        for index, total in enumerate(totals)
+    ]
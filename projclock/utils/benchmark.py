@@ -0,0 +1,170 @@
+import io
+import os
+import random
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+from django.core.management import call_command
+from django.db import connections, transaction
+from employee.models import Employee
+from tracker.models import Project, ProjectActivity
+
+
+@contextmanager
+def temporary_database():
+    """
+    Point the default database at a throwaway SQLite file with every table
+    created, so benchmarks never touch the development database. Concurrent
+    writers wait up to 30 seconds for the SQLite lock instead of 5.
+    """
+    handle, path = tempfile.mkstemp(suffix='.sqlite3')
+    os.close(handle)
+    settings_dict = connections.settings['default']
+    original, original_options = settings_dict['NAME'], settings_dict.get('OPTIONS', {})
+    connections['default'].close()
+    settings_dict['NAME'] = path
+    settings_dict['OPTIONS'] = dict(original_options, timeout=30)
+    try:
+        call_command('migrate', run_syncdb=True, verbosity=0, interactive=False)
+        yield connections['default']
+    finally:
+        connections['default'].close()
+        settings_dict['NAME'], settings_dict['OPTIONS'] = original, original_options
+        os.remove(path)
+
+
+def seed_dataset(connection, users=200, projects=50, activities=200000, members=10, seed=42):
+    """
+    Insert generated employees, projects, memberships and activities with
+    executemany, start_time is auto_now_add so bulk_create would overwrite
+    the generated times. Employee 1 is staff, about one percent of the
+    activities are running timers.
+
+    Returns:
+        dict: a sample 'user' and 'project' (the user is a member of it) and the 'now' the data was generated at
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    user_ids = range(1, users + 1)
+    project_ids = range(1, projects + 1)
+
+    employees = [
+        (user, '!', f'user{user}', f'user{user}@email.com', user == 1, True, False, False, now, now, now)
+        for user in user_ids
+    ]
+    project_rows = [
+        (project, f'project {project}', '', '{}', (now - timedelta(days=rng.randrange(730))).date(), None, now, now)
+        for project in project_ids
+    ]
+    memberships = {project: rng.sample(user_ids, min(members, users)) for project in project_ids}
+    activity_rows = []
+    for activity in range(1, activities + 1):
+        project = rng.choice(project_ids)
+        start_time = now - timedelta(seconds=rng.randrange(730 * 86400))
+        end_time = None if rng.random() < 0.01 else start_time + timedelta(seconds=rng.randrange(60, 8 * 3600))
+        activity_rows.append((activity, '', project, rng.choice(memberships[project]), start_time, end_time, start_time, end_time or start_time))
+
+    ops = connection.ops
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {Employee._meta.db_table} (id, password, username, email, is_staff, is_active, '
+            'is_superuser, email_verified, token_version, date_joined, created_at, updated_at) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 0, %s, %s, %s)',
+            [row[:8] + tuple(ops.adapt_datetimefield_value(value) for value in row[8:]) for row in employees])
+        cursor.executemany(
+            f'INSERT INTO {Project._meta.db_table} (id, title, description, technology, start_date, end_date, created_at, updated_at) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s, %s)',
+            [row[:4] + (ops.adapt_datefield_value(row[4]), None) + tuple(ops.adapt_datetimefield_value(value) for value in row[6:])
+             for row in project_rows])
+        cursor.executemany(
+            f'INSERT INTO {Project.members.through._meta.db_table} (project_id, employee_id) VALUES (%s, %s)',
+            [(project, user) for project, users in memberships.items() for user in users])
+        cursor.executemany(
+            f'INSERT INTO {ProjectActivity._meta.db_table} (id, description, project_id, user_id, start_time, end_time, created_at, updated_at) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s, %s)',
+            [row[:4] + tuple(ops.adapt_datetimefield_value(value) for value in row[4:]) for row in activity_rows])
+        cursor.execute('ANALYZE')
+
+    project = rng.choice(project_ids)
+    return {'user': memberships[project][0], 'project': project, 'now': now}
+
+
+def wsgi_request(application, method, url, token=None, body=b'', content_type='application/json'):
+    """
+    Call a WSGI application in process
+
+    Returns:
+        tuple: (status code, response body)
+    """
+    parts = urlsplit(url)
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'CONTENT_TYPE': content_type,
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if token:
+        environ['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    status = []
+    result = application(environ, lambda status_line, headers, exc_info=None: status.append(status_line))
+    try:
+        content = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return int(status[0].split(' ', 1)[0]), content
+
+
+async def asgi_request(application, method, url, token=None, body=b'', content_type='application/json'):
+    """
+    Call an ASGI application in process
+
+    Returns:
+        tuple: (status code, response body)
+    """
+    parts = urlsplit(url)
+    headers = [(b'host', b'localhost'), (b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())]
+    if token:
+        headers.append((b'authorization', f'Bearer {token}'.encode()))
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': parts.path,
+        'raw_path': parts.path.encode(),
+        'query_string': parts.query.encode(),
+        'headers': headers,
+        'server': ('localhost', 80),
+        'client': ('127.0.0.1', 0),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        return {'type': 'http.disconnect'}
+
+    response = {'status': None, 'body': []}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            response['body'].append(message.get('body', b''))
+
+    await application(scope, receive, send)
+    return response['status'], b''.join(response['body'])
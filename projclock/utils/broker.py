@@ -0,0 +1,86 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+
+class Subscription:
+    """
+    Events of one topic delivered to one subscriber, read from the event loop
+    the subscription was made on
+    """
+
+    def __init__(self, broker, topic, loop, maxsize):
+        self.broker = broker
+        self.topic = topic
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def deliver(self, event):
+        """
+        Queue the event, a subscriber too slow to keep up is marked as
+        overflowed instead of silently missing events
+        """
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """
+    In process publish/subscribe broker, events can be published from any
+    thread (sync views) and are handed to the subscribers' event loops.
+    Only subscribers of the same process receive the events.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic):
+        """
+        Subscribe to a topic, must be called from a running event loop
+        """
+        subscription = Subscription(self, topic, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscriptions[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.topic)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.topic]
+
+    def subscriber_count(self, topic):
+        with self._lock:
+            return len(self._subscriptions.get(topic, ()))
+
+    def publish(self, topic, event):
+        """
+        Fan the event out to every subscriber of the topic
+
+        Returns:
+            int: number of subscribers the event was handed to
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(topic, ()))
+        delivered = 0
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+                delivered += 1
+            except RuntimeError:
+                # the event loop of the subscriber is closed
+                self.unsubscribe(subscription)
+        return delivered
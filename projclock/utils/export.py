@@ -0,0 +1,68 @@
+import csv
+import json
+from datetime import timezone
+from utils.analytics import format_seconds
+
+# fields of the exported activities, the same as the activity listing
+ACTIVITY_EXPORT_FIELDS = ['id', 'project', 'user', 'description', 'start_time', 'end_time', 'is_running', 'duration', 'duration_seconds']
+EXPORT_CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+class Echo:
+    """
+    File like object whose write returns the written value, so csv.writer
+    can produce one line at a time for a streaming response
+    """
+
+    def write(self, value):
+        return value
+
+
+def format_datetime(value):
+    """
+    Format a datetime the way the rest framework DateTimeField does, in utc
+    with a trailing Z
+    """
+    if value is None:
+        return None
+    value = value.astimezone(timezone.utc).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def activity_records(rows):
+    """
+    Turn (id, project, user, description, start_time, end_time, duration_seconds)
+    tuples into export records, the same fields as the activity listing
+    """
+    for id, project, user, description, start_time, end_time, duration_seconds in rows:
+        yield {
+            'id': id,
+            'project': project,
+            'user': user,
+            'description': description,
+            'start_time': format_datetime(start_time),
+            'end_time': format_datetime(end_time),
+            'is_running': end_time is None,
+            'duration': format_seconds(duration_seconds),
+            'duration_seconds': duration_seconds,
+        }
+
+
+def stream_csv(records, fields):
+    """
+    Yield the records as csv lines, starting with the header
+    """
+    writer = csv.DictWriter(Echo(), fieldnames=fields)
+    yield writer.writeheader()
+    for record in records:
+        yield writer.writerow(record)
+
+
+def stream_ndjson(records):
+    """
+    Yield the records as newline delimited json
+    """
+    for record in records:
+        yield json.dumps(record) + '\n'
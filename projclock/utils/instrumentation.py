@@ -0,0 +1,172 @@
+import math
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# metrics of the request being served, the context is copied into the threads the views run in under ASGI
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """sql queries, database time and serializer time of one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.statements = Counter()
+        self.serializing = False
+
+    def repeated_statements(self, threshold):
+        """the identical sql statements run at least threshold times, the mark of an N+1 query"""
+        return {sql: count for sql, count in self.statements.items() if count >= threshold}
+
+
+def record_query(execute, sql, params, many, context):
+    """execute wrapper adding the query to the metrics of the current request"""
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - started
+        metrics.queries += 1
+        # the sql keeps its placeholders, so the same query with other parameters counts as identical
+        metrics.statements[sql] += 1
+
+
+def install_query_recorder(sender=None, connection=None, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedSerializerMixin:
+    """
+    serializer mixin adding the time spent in to_representation to the
+    metrics of the current request, the queries it runs count as database time
+    """
+
+    def to_representation(self, instance):
+        metrics = current_metrics.get()
+        if metrics is None or metrics.serializing:
+            return super().to_representation(instance)
+        metrics.serializing = True
+        db_time = metrics.db_time
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializing = False
+            metrics.serializer_time += time.perf_counter() - started - (metrics.db_time - db_time)
+
+
+def percentile(values, percent):
+    """nearest rank percentile of sorted values"""
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+class RouteStats:
+    """
+    Thread safe rolling aggregates of the last window requests of every url name
+    """
+    # repeated statements kept per route for the N+1 report
+    MAX_REPEATED_STATEMENTS = 10
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._samples = {}
+        self._repeated = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, total, metrics, repeated):
+        sample = (total, metrics.db_time, metrics.serializer_time, metrics.queries, bool(repeated))
+        with self._lock:
+            self._samples.setdefault(route, deque(maxlen=self.window)).append(sample)
+            if repeated:
+                statements = self._repeated.setdefault(route, OrderedDict())
+                for sql, count in repeated.items():
+                    statements[sql] = max(count, statements.pop(sql, 0))
+                while len(statements) > self.MAX_REPEATED_STATEMENTS:
+                    statements.popitem(last=False)
+
+    def summary(self):
+        """one aggregate per route, times in milliseconds"""
+        with self._lock:
+            routes = {route: list(samples) for route, samples in self._samples.items()}
+            repeated = {route: dict(statements) for route, statements in self._repeated.items()}
+        summary = []
+        for route, samples in routes.items():
+            count = len(samples)
+            totals = sorted(sample[0] for sample in samples)
+            summary.append({
+                'route': route,
+                'requests': count,
+                'mean_ms': round(sum(totals) / count * 1000, 3),
+                'p95_ms': round(percentile(totals, 95) * 1000, 3),
+                'max_ms': round(totals[-1] * 1000, 3),
+                'mean_db_ms': round(sum(sample[1] for sample in samples) / count * 1000, 3),
+                'mean_serializer_ms': round(sum(sample[2] for sample in samples) / count * 1000, 3),
+                'mean_queries': round(sum(sample[3] for sample in samples) / count, 2),
+                'max_queries': max(sample[3] for sample in samples),
+                'n_plus_one_requests': sum(sample[4] for sample in samples),
+                'repeated_queries': [
+                    {'sql': sql, 'count': repeats}
+                    for sql, repeats in sorted(repeated.get(route, {}).items(), key=lambda item: -item[1])
+                ],
+            })
+        return summary
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._repeated.clear()
+
+
+route_stats = RouteStats(window=getattr(settings, 'REQUEST_METRICS_WINDOW', 1000))
+
+
+class RequestMetricsMiddleware:
+    """
+    Record the sql query count, database time, serializer time and view time
+    of every request, report them in a Server-Timing header and add them to
+    the rolling aggregates of the url name. Identical sql run
+    REQUEST_METRICS_N_PLUS_ONE_THRESHOLD times or more in one request is
+    flagged as an N+1 query. The body of streaming responses is produced
+    after the middleware returns, its queries are not recorded.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'REQUEST_METRICS_N_PLUS_ONE_THRESHOLD', 5)
+        connection_created.connect(install_query_recorder, dispatch_uid='install_query_recorder')
+
+    def __call__(self, request):
+        # connections opened before the middleware was created
+        for connection in connections.all():
+            install_query_recorder(connection=connection)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        total = time.perf_counter() - started
+
+        repeated = metrics.repeated_statements(self.threshold)
+        response['Server-Timing'] = (
+            f'db;dur={metrics.db_time * 1000:.3f};desc="{metrics.queries} queries", '
+            f'serializer;dur={metrics.serializer_time * 1000:.3f}, '
+            f'view;dur={total * 1000:.3f}'
+        )
+        if repeated:
+            response['Server-Timing'] += f', n-plus-one;desc="{len(repeated)} repeated queries"'
+        if request.resolver_match is not None:
+            route_stats.record(request.resolver_match.view_name, total, metrics, repeated)
+        return response
@@ -0,0 +1,94 @@
+import copy
+import multiprocessing
+import threading
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import django
+from django.conf import settings
+from django.db import connections, transaction
+
+
+def initialize_worker(databases):
+    """
+    set Django up in a freshly spawned worker process, DJANGO_SETTINGS_MODULE
+    is inherited and the databases are those of the process starting the pool
+    """
+    settings.DATABASES = databases
+    django.setup()
+
+
+def run_and_close(func, *args):
+    """run a job in a worker process and close the connections it opened"""
+    try:
+        return func(*args)
+    finally:
+        connections.close_all()
+
+
+class JobRunner:
+    """
+    Run jobs in a pool of worker processes without any broker: the jobs are
+    rows of a table and the pool is handed their id once the transaction
+    creating them is committed. The processes are spawned rather than forked,
+    so they never share the database connections of the web process, they
+    connect to its DATABASES, or to the given databases, as they are when the
+    pool starts, e.g. a default database swapped by a benchmark. The setting
+    naming the number of workers is read at every submit, 0 runs the jobs
+    right away in the calling thread, for tests and debugging.
+    """
+
+    def __init__(self, workers_setting, default_workers=2, databases=None):
+        self.workers_setting = workers_setting
+        self.default_workers = default_workers
+        self.databases = databases
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def workers(self):
+        return getattr(settings, self.workers_setting, self.default_workers)
+
+    def get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                databases = self.databases if self.databases is not None else settings.DATABASES
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=initialize_worker, initargs=(copy.deepcopy(databases),))
+            return self._executor
+
+    def _submit(self, func, *args):
+        try:
+            self.get_executor().submit(run_and_close, func, *args)
+        except BrokenProcessPool:
+            # a worker died, the pool refuses new jobs, start a new one
+            self.shutdown(wait=False)
+            self.get_executor().submit(run_and_close, func, *args)
+
+    def submit(self, func, *args):
+        if not self.workers:
+            func(*args)
+            return
+        transaction.on_commit(lambda: self._submit(func, *args))
+
+    def map(self, func, iterable, chunksize=1):
+        """
+        Run func over the iterable in the worker processes and wait for the
+        results, in order, or run it in the calling thread when there are no
+        workers
+        """
+        if not self.workers:
+            return [func(item) for item in iterable]
+        try:
+            return list(self.get_executor().map(partial(run_and_close, func), iterable, chunksize=chunksize))
+        except BrokenProcessPool:
+            # the next call starts a new pool
+            self.shutdown(wait=False)
+            raise
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
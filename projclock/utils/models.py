@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.fields.json import KeyTextTransform, compile_json_path
 
 
 class ModelTracker(models.Model):
@@ -7,4 +8,17 @@ class ModelTracker(models.Model):
 
     class Meta:
         abstract = True
-        ordering = ('-created_at',)
\ No newline at end of file
+        ordering = ('-created_at',)
+
+
+class IndexableKeyTextTransform(KeyTextTransform):
+    """
+    KeyTextTransform writing the JSON path in the SQL on SQLite rather than
+    binding it as a parameter, SQLite only uses an index on an expression
+    when the query repeats it without parameters
+    """
+
+    def as_sqlite(self, compiler, connection):
+        lhs, params, key_transforms = self.preprocess_lhs(compiler, connection)
+        json_path = compile_json_path(key_transforms).replace("'", "''").replace('%', '%%')
+        return f"JSON_EXTRACT({lhs}, '{json_path}')", tuple(params)
@@ -0,0 +1,94 @@
+import json
+from base64 import b64decode, b64encode
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward only keyset (cursor) pagination ordered by (field, tie breaker).
+
+    The cursor holds the (field, tie breaker) values of the last row of the
+    page, the next page is fetched with
+        WHERE field > value OR (field = value AND tie_breaker > last)
+    so every page costs the same index range scan however deep the client
+    walks, unlike OFFSET paging. Rows inserted behind the cursor never shift
+    the pages that follow it.
+    """
+    ordering = ('id', 'pk')
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        field, tie_breaker = self.ordering
+        self.field = queryset.model._meta.get_field(field)
+
+        queryset = queryset.order_by(field, tie_breaker)
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            value, last = cursor
+            queryset = queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, f'{tie_breaker}__gt': last}))
+
+        # fetch one extra row to know whether there is a next page
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        self.has_next = len(results) > self.page_size
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(request.query_params[self.page_size_query_param], strict=True, cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            value, last = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            return self.field.to_python(value), int(last)
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj):
+        field, tie_breaker = self.ordering
+        if isinstance(obj, dict):
+            # a values() row, which must hold the ordering columns
+            obj = self.field.model(**{self.field.attname: obj[field], tie_breaker: obj[tie_breaker]})
+        position = [self.field.value_to_string(obj), getattr(obj, tie_breaker)]
+        return b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_first_link(self):
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'first': self.get_first_link(),
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'first': {'type': 'string', 'nullable': True},
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,98 @@
+import random
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+# database the reads of the current request go to, None for the primary,
+# the context is copied into the threads the views run in under ASGI
+read_database = ContextVar('read_database', default=None)
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def sticky_key(user_id):
+    return f'replica-sticky:{user_id}'
+
+
+def mark_primary_sticky(user_id):
+    """
+    send the reads of the user to the primary for REPLICA_STICKY_SECONDS, so
+    they see their own writes. The marker is kept in the django cache shared
+    by the server processes, any of them may answer the next request
+    """
+    cache.set(sticky_key(user_id), True, timeout=getattr(settings, 'REPLICA_STICKY_SECONDS', 5))
+
+
+def is_primary_sticky(user_id):
+    return cache.get(sticky_key(user_id)) is not None
+
+
+class ReplicaRouter:
+    """
+    Send the reads of the views using ReplicaReadMixin to a read only
+    replica, DATABASE_REPLICAS, everything else to the primary. No table is
+    created on the replicas, they are copies of the primary
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # rows read from a replica are rows of the primary
+        databases = {'default', *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    View mixin reading the data of a read only endpoint from a random
+    replica. The authentication and permission checks are done on the
+    primary before, and users who wrote in the last REPLICA_STICKY_SECONDS
+    keep reading from the primary, the replicas may lag behind it. The body
+    of a streaming response is read after the view returns, from the primary.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        replicas = get_replicas()
+        if replicas and not is_primary_sticky(request.user.pk):
+            self.read_database_token = read_database.set(random.choice(replicas))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, 'read_database_token', None)
+        if token is not None:
+            read_database.reset(token)
+            self.read_database_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class PrimaryStickinessMiddleware:
+    """
+    Make the user of every successful write request read from the primary
+    for REPLICA_STICKY_SECONDS, the rest framework authentication sets the
+    user of the request while the view runs
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, 'user', None)
+        if (request.method not in SAFE_METHODS and response.status_code < 400
+                and user is not None and user.is_authenticated and get_replicas()):
+            mark_primary_sticky(user.pk)
+        return response